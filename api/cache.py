@@ -0,0 +1,163 @@
+"""
+    Versioned response cache for catalog reads.
+
+    Every cached response is stored under a key that embeds the current version of the models it
+    was built from, so a write never has to find and delete the entries it invalidates: bumping a
+    version from the model's save/delete signals (see api/signals.py) makes every older key
+    unreachable and the entries simply expire.
+
+    Three kinds of version are kept per model:
+      - the model version, bumped on every write, keys list responses;
+      - one version per object, bumped when that row is saved or deleted, keys detail responses;
+      - a bulk version, bumped by set-based writes (UPDATE / bulk_create) that don't go through
+        the signals, which also keys detail responses.
+
+    Versions start from a fresh timestamp whenever the cache has lost them, so an evicted version
+    can never resurrect entries written under an older one.
+"""
+import hashlib
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+STATS_HITS_KEY = "catalog:stats:hits"
+STATS_MISSES_KEY = "catalog:stats:misses"
+
+
+def get_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def get_timeout():
+    return getattr(settings, "CATALOG_CACHE_TIMEOUT", 300)
+
+
+def version_key(model, pk=None, bulk=False):
+    key = f"catalog:version:{model._meta.label_lower}"
+    if bulk:
+        return key + ":bulk"
+    if pk is not None:
+        return f"{key}:{pk}"
+    return key
+
+
+def get_versions(keys):
+    cache = get_cache()
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            cache.add(key, time.time_ns(), timeout=None)
+            versions[key] = cache.get(key)
+    return [versions[key] for key in keys]
+
+
+def _bump(keys):
+    cache = get_cache()
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def bump_version(model, pk=None):
+    """
+        Invalidate every cached response built from `model`, or only those built from the row `pk`
+        (plus the lists). Call it without `pk` after set-based writes that bypass the signals.
+
+        Inside a transaction the versions are bumped again on commit, so a response cached by a
+        concurrent reader from the not-yet-committed state can't outlive the commit.
+    """
+    keys = [version_key(model)]
+    keys.append(version_key(model, pk=pk) if pk is not None else version_key(model, bulk=True))
+    _bump(keys)
+    if not transaction.get_autocommit():
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def record_hit(hit):
+    cache = get_cache()
+    key = STATS_HITS_KEY if hit else STATS_MISSES_KEY
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 0, timeout=None)
+        cache.incr(key)
+
+
+def get_stats():
+    cache = get_cache()
+    hits = cache.get(STATS_HITS_KEY, 0)
+    misses = cache.get(STATS_MISSES_KEY, 0)
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_rate": round(hits / total, 4) if total else None}
+
+
+def reset_stats():
+    get_cache().delete_many([STATS_HITS_KEY, STATS_MISSES_KEY])
+
+
+def cached_value(name, dependencies, compute):
+    """
+        `compute()`, cached under `name` and the current versions of `dependencies`, a list of
+        (model, pk) pairs where a None pk stands for every row of the model.
+    """
+    keys = [version_key(model) if pk is None else version_key(model, pk=pk) for model, pk in dependencies]
+    key = f"catalog:value:{name}:" + hashlib.md5(str(get_versions(keys)).encode("utf-8")).hexdigest()
+    cache = get_cache()
+    value = cache.get(key)
+    record_hit(value is not None)
+    if value is None:
+        value = compute()
+        cache.set(key, value, timeout=get_timeout())
+    return value
+
+
+def response_key(request, models, pk=None):
+    if pk is not None:
+        model = models[0]
+        keys = [version_key(model, pk=pk), version_key(model, bulk=True)]
+    else:
+        keys = [version_key(model) for model in models]
+    versions = get_versions(keys)
+    query = sorted(request.query_params.lists())
+    raw = f"{request.get_host()}|{request.path}|{query}|{versions}"
+    return "catalog:response:" + hashlib.md5(raw.encode("utf-8")).hexdigest()
+
+
+def cached_response(*models, per_object=True):
+    """
+        Cache the successful responses of an APIView `get` handler.
+
+        `models` are the models the response is built from; when the handler is called with a `pk`
+        the entry is keyed on that object of the first model only, unless `per_object` is False
+        (the response embeds other rows too) and it's keyed on the model versions like a list.
+    """
+
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            cache = get_cache()
+            key = response_key(request, models, pk=kwargs.get("pk") if per_object else None)
+            data = cache.get(key)
+            if data is not None:
+                record_hit(True)
+                response = Response(data, status=status.HTTP_200_OK)
+                response["X-Cache"] = "HIT"
+                return response
+
+            record_hit(False)
+            response = handler(self, request, *args, **kwargs)
+            if response.status_code == status.HTTP_200_OK and isinstance(response, Response):
+                cache.set(key, response.data, timeout=get_timeout())
+            response["X-Cache"] = "MISS"
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,380 @@
+"""
+    Write-behind store for hot carts.
+
+    Carts take far more writes than anything else, and most of them are soon overwritten (the
+    same product added again, a quantity changed twice). With CART_STORE["BACKEND"] set, a user's
+    cart (its id, status, items and a version) is loaded once into a cache and add-to-cart only
+    mutates that copy, under a short per-cart lock. The changed items are flushed to `Carts` and
+    `CartItems` in one transaction later: when the oldest unflushed change is older than
+    "FLUSH_LAG" seconds, when a cart collects "MAX_PENDING" unflushed items, at checkout, or by
+    the flush_carts command (run it periodically to bound the lag of idle carts).
+
+    Backends:
+      - "api.cart_store.LocalCartStore" keeps carts in process memory, for tests and single
+        process deployments;
+      - "api.cart_store.CacheCartStore" keeps them in the CART_STORE["CACHE_ALIAS"] cache, shared
+        by every worker (use a cache that doesn't evict, e.g. Redis without maxmemory eviction).
+
+    Durability: with "DURABILITY": "write-through" every mutation is flushed before the request
+    returns and the store only saves the reads. With "write-behind" (the default) the unflushed
+    changes of a cart are lost if the cache loses it, at most FLUSH_LAG seconds of them when the
+    flushes keep up. While a cart is held by the store its items must be written through the store.
+"""
+import logging
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework.fields import DateTimeField
+
+from .cache import bump_version
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "BACKEND": None,
+    "CACHE_ALIAS": "default",
+    "DURABILITY": "write-behind",
+    "FLUSH_LAG": 5,
+    "MAX_PENDING": 50,
+    "ASYNC": True,
+    "MAX_WORKERS": 2,
+    "LOCK_TIMEOUT": 5,
+    "DIRTY_SHARDS": 16,
+}
+
+DIRTY_KEY = "carts:dirty"
+
+_stores = {}
+_executor = None
+
+
+def get_setting(name):
+    return getattr(settings, "CART_STORE", {}).get(name, DEFAULTS[name])
+
+
+def get_cart_store():
+    """
+        The configured store, or None when carts are written straight to the database.
+    """
+    backend = get_setting("BACKEND")
+    if not backend:
+        return None
+    if backend not in _stores:
+        _stores[backend] = import_string(backend)()
+    return _stores[backend]
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=get_setting("MAX_WORKERS"), thread_name_prefix="cart-flush")
+    return _executor
+
+
+class CartStore:
+    """
+        Cart state kept in a Django cache. A cart's state is a dict:
+            {"id", "user", "status", "version", "items": {product title: item}, "dirty": [titles], "dirty_since"}
+        where an item is {"id" (None until flushed), "price", "quantity", "created_at"} and a
+        quantity of 0 marks an item removed but not flushed yet.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def cart_key(self, user_id):
+        return f"carts:user:{user_id}"
+
+    @contextmanager
+    def lock(self, key):
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + get_setting("LOCK_TIMEOUT")
+        while not self.cache.add(f"{key}:lock", token, timeout=get_setting("LOCK_TIMEOUT")):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Timed out waiting for the lock of {key}")
+            time.sleep(0.002)
+        try:
+            yield
+        finally:
+            if self.cache.get(f"{key}:lock") == token:
+                self.cache.delete(f"{key}:lock")
+
+    def load(self, user_id):
+        from src.cart.models import Carts, CartItems
+
+        key = self.cart_key(user_id)
+        state = self.cache.get(key)
+        if state is not None:
+            return state
+        cart = Carts.objects.filter(created_by=user_id).values("id", "status").first()
+        if cart is None:
+            return None
+        items = CartItems.objects.filter(cart_id=cart["id"]).values_list("id", "product_id", "price", "quantity", "created_at")
+        state = {
+            "id": cart["id"],
+            "user": user_id,
+            "status": cart["status"],
+            "version": 0,
+            "items": {
+                title: {"id": pk, "price": price, "quantity": quantity, "created_at": DateTimeField().to_representation(created_at)}
+                for pk, title, price, quantity, created_at in items
+            },
+            "dirty": [],
+            "dirty_since": None,
+        }
+        # a concurrent load may have won, and mutated its copy since
+        if not self.cache.add(key, state, timeout=None):
+            state = self.cache.get(key, state)
+        return state
+
+    def get(self, user_id):
+        """
+            The cart state of a user, None when they have no cart.
+        """
+        return self.load(user_id)
+
+    def mutate(self, user_id, changes):
+        """
+            Apply {product title: (price, quantity delta or None, new quantity or None)} to the cart
+            of `user_id`, returns its new state (None when the user has no cart).
+        """
+        from src.cart.models import Carts
+
+        key = self.cart_key(user_id)
+        with self.lock(key):
+            state = self.load(user_id)
+            if state is None:
+                return None
+            now = DateTimeField().to_representation(timezone.now())
+            for title, (price, delta, quantity) in changes.items():
+                item = state["items"].setdefault(title, {"id": None, "price": price, "quantity": 0, "created_at": now})
+                item["quantity"] = max(0, item["quantity"] + delta if quantity is None else quantity)
+                item["price"] = price
+                item["created_at"] = now
+                if title not in state["dirty"]:
+                    state["dirty"].append(title)
+            state["version"] += 1
+            if state["dirty_since"] is None:
+                state["dirty_since"] = time.time()
+                self.mark_dirty(user_id, state["dirty_since"])
+            self.cache.set(key, state, timeout=None)
+        bump_version(Carts, pk=state["id"])
+
+        if get_setting("DURABILITY") == "write-through":
+            state = self.flush(user_id)
+        elif len(state["dirty"]) >= get_setting("MAX_PENDING") or time.time() - state["dirty_since"] >= get_setting("FLUSH_LAG"):
+            self.schedule_flush(user_id)
+        return state
+
+    def add_items(self, user_id, quantities, prices):
+        return self.mutate(user_id, {title: (prices[title], quantity, None) for title, quantity in quantities.items()})
+
+    def set_quantity(self, user_id, title, quantity, price):
+        return self.mutate(user_id, {title: (price, 0, quantity)})
+
+    def dirty_key(self, user_id):
+        return f"{DIRTY_KEY}:{user_id}"
+
+    def shard_key(self, shard):
+        return f"{DIRTY_KEY}:shard:{shard}"
+
+    def mark_dirty(self, user_id, since):
+        # one marker per cart, written under the cart's lock; the shard listing the dirty carts is
+        # only written the first time a cart gets dirty, its entries outlive the markers until pruned
+        self.cache.set(self.dirty_key(user_id), since, timeout=None)
+        shard = self.shard_key(user_id % get_setting("DIRTY_SHARDS"))
+        if user_id not in (self.cache.get(shard) or set()):
+            with self.lock(shard):
+                users = self.cache.get(shard) or set()
+                users.add(user_id)
+                self.cache.set(shard, users, timeout=None)
+
+    def mark_clean(self, user_id):
+        self.cache.delete(self.dirty_key(user_id))
+
+    def dirty_markers(self, users):
+        markers = self.cache.get_many([self.dirty_key(user_id) for user_id in users])
+        return {user_id: markers[self.dirty_key(user_id)] for user_id in users if self.dirty_key(user_id) in markers}
+
+    def prune(self, shard):
+        """
+            Drop the users of a shard whose carts are clean again.
+        """
+        with self.lock(shard):
+            users = self.cache.get(shard) or set()
+            clean = users - set(self.dirty_markers(users))
+            if not clean:
+                return
+            self.cache.set(shard, users - clean, timeout=None)
+            # a cart dirtied meanwhile may have seen itself still listed: list it back
+            relisted = set(self.dirty_markers(clean))
+            if relisted:
+                self.cache.set(shard, (users - clean) | relisted, timeout=None)
+
+    def dirty_carts(self):
+        """
+            {user id: time of the oldest unflushed change} of the carts waiting for a flush.
+        """
+        dirty = {}
+        for shard in map(self.shard_key, range(get_setting("DIRTY_SHARDS"))):
+            users = self.cache.get(shard) or set()
+            markers = self.dirty_markers(users)
+            dirty.update(markers)
+            if len(markers) < len(users):
+                self.prune(shard)
+        return dirty
+
+    def schedule_flush(self, user_id):
+        if not get_setting("ASYNC"):
+            self.flush(user_id)
+            return
+        get_executor().submit(self._flush_in_thread, user_id)
+
+    def _flush_in_thread(self, user_id):
+        close_old_connections()
+        try:
+            self.flush(user_id)
+        except Exception:
+            logger.exception("Flushing the cart of user %s failed", user_id)
+        finally:
+            close_old_connections()
+
+    def flush(self, user_id):
+        """
+            Write the unflushed items of a user's cart to the database in one transaction and return
+            the flushed state.
+        """
+        with self.lock(self.cart_key(user_id)):
+            return self._flush_locked(user_id)
+
+    def _flush_locked(self, user_id):
+        from src.cart.models import CartItems, touch_cart
+
+        key = self.cart_key(user_id)
+        state = self.cache.get(key)
+        if state is None or not state["dirty"]:
+            self.mark_clean(user_id)
+            return state
+
+        items = {title: state["items"][title] for title in state["dirty"]}
+        kept = {title: item for title, item in items.items() if item["quantity"] > 0}
+        removed = [title for title, item in items.items() if item["quantity"] == 0]
+        with transaction.atomic():
+            if kept:
+                CartItems.objects.bulk_create(
+                    [
+                        CartItems(cart_id_id=state["id"], product_id_id=title, price=item["price"], quantity=item["quantity"])
+                        for title, item in kept.items()
+                    ],
+                    update_conflicts=True,
+                    unique_fields=["cart_id", "product_id"],
+                    update_fields=["price", "quantity", "created_at"],
+                )
+            if removed:
+                CartItems.objects.filter(cart_id=state["id"], product_id__in=removed).delete()
+            touch_cart(state["id"])
+            if any(item["id"] is None for item in kept.values()):
+                ids = CartItems.objects.filter(cart_id=state["id"], product_id__in=list(kept)).values_list("product_id", "id")
+                for title, pk in ids:
+                    kept[title]["id"] = pk
+
+        current = self.cache.get(key)
+        if current is None or current["version"] != state["version"]:
+            # the lock expired during a slow flush and the cart changed (or was dropped) meanwhile:
+            # keep that newer state, still dirty, its next flush rewrites the same rows
+            logger.warning("The cart of user %s changed while it was being flushed", user_id)
+            return current
+        for title in removed:
+            del state["items"][title]
+        state["dirty"], state["dirty_since"] = [], None
+        self.cache.set(key, state, timeout=None)
+        self.mark_clean(user_id)
+        return state
+
+    def flush_all(self, max_age=0):
+        """
+            Flush the carts whose oldest unflushed change is at least `max_age` seconds old,
+            returns how many were flushed.
+        """
+        flushed = 0
+        now = time.time()
+        for user_id, since in self.dirty_carts().items():
+            if now - since >= max_age:
+                self.flush(user_id)
+                flushed += 1
+        return flushed
+
+    def forget(self, user_id, locked=False):
+        """
+            Drop the state of a user's cart without flushing it (the cart is being deleted), `locked`
+            when the caller already holds the cart's lock (see `holding`).
+        """
+        if locked:
+            self._forget_locked(user_id)
+            return
+        with self.lock(self.cart_key(user_id)):
+            self._forget_locked(user_id)
+
+    @contextmanager
+    def holding(self, user_ids):
+        """
+            Hold the locks of the carts of `user_ids` while their rows are written around the store,
+            taken in order so two holders can't deadlock. Yields the ids of the users whose carts
+            have unflushed changes.
+        """
+        with ExitStack() as stack:
+            for user_id in sorted(set(user_ids)):
+                stack.enter_context(self.lock(self.cart_key(user_id)))
+            states = self.cache.get_many([self.cart_key(user_id) for user_id in user_ids])
+            yield {state["user"] for state in states.values() if state["dirty"]}
+
+    def _forget_locked(self, user_id):
+        self.cache.delete(self.cart_key(user_id))
+        self.mark_clean(user_id)
+
+    def checkout(self, user_id, place_order):
+        """
+            Flush a user's cart, call `place_order()` and drop the cart's state, all under its lock
+            so no add lands between the flush and the order. Returns what `place_order` returns; the
+            state is kept when it raises.
+        """
+        with self.lock(self.cart_key(user_id)):
+            self._flush_locked(user_id)
+            result = place_order()
+            self._forget_locked(user_id)
+        return result
+
+    def render_items(self, state, titles=None):
+        """
+            The items of `state` (or only `titles`) shaped like CartItemsSerializer's output.
+        """
+        titles = state["items"] if titles is None else titles
+        return [
+            {
+                "id": state["items"][title]["id"],
+                "product_id": title,
+                "cart_id": state["id"],
+                "quantity": state["items"][title]["quantity"],
+                "created_at": state["items"][title]["created_at"],
+            }
+            for title in titles
+            if state["items"][title]["quantity"] > 0
+        ]
+
+
+class LocalCartStore(CartStore):
+    def __init__(self):
+        super().__init__(LocMemCache("cart-store", {"TIMEOUT": None, "OPTIONS": {"MAX_ENTRIES": 10**9}}))
+
+
+class CacheCartStore(CartStore):
+    def __init__(self):
+        super().__init__(caches[get_setting("CACHE_ALIAS")])
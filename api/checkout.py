@@ -0,0 +1,49 @@
+"""
+    Checkout: a user's cart becomes order lines in one transaction.
+
+    The cart row is locked first (SELECT ... FOR UPDATE), so of two racing checkouts of the same
+    cart the second waits for the first to commit and then finds it already ordered. The items are
+    read joined to their products, which snapshots the prices the customer pays, and written as
+    the lines of a new order with one multi-row statement. The number of statements doesn't
+    depend on the size of the cart.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from src.cart.models import Carts, CartItems
+from src.order.models import Orders, OrderLines
+
+
+class CheckoutError(Exception):
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+def checkout(user):
+    """
+        Turn the cart of `user` into a new order, empty it and mark it "ordered". Returns
+        (order, lines), raises CheckoutError("...", "no_cart" | "empty" | "ordered").
+    """
+    with transaction.atomic():
+        cart = Carts.objects.select_for_update().filter(created_by=user).first()
+        if cart is None:
+            raise CheckoutError(f"User '{user}' has no cart", "no_cart")
+        if cart.status == "ordered":
+            raise CheckoutError("This cart has already been checked out", "ordered")
+        items = list(CartItems.objects.filter(cart_id=cart).values_list("product_id", "quantity", "product_id__effective_price"))
+        if not items:
+            raise CheckoutError("The cart is empty", "empty")
+
+        # the stored totals are known here, no need to sum the lines back
+        order = Orders.objects.create(
+            user=user,
+            total=sum(price * quantity for _, quantity, price in items),
+            item_count=sum(quantity for _, quantity, _ in items),
+        )
+        lines = OrderLines.objects.bulk_create(
+            [OrderLines(order=order, product_id=title, price=price, quantity=quantity) for title, quantity, price in items]
+        )
+        CartItems.objects.filter(cart_id=cart).delete()
+        Carts.objects.filter(id=cart.id).update(status="ordered", updated_at=timezone.now())
+    return order, lines
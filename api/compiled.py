@@ -0,0 +1,182 @@
+"""
+    Compiled read path for list endpoints.
+
+    A ModelSerializer walks every field of every row through DRF's field machinery (attribute
+    lookup, SkipField handling, per-field dispatch). For plain column fields that work is the same
+    for every row, so it is done once here: each serializer field is resolved to the column it
+    reads and a converter producing exactly what the field's `to_representation` would, and rows
+    are fetched with `.values()` and turned into dicts in a single tight loop. No model instances
+    are built.
+
+    Serializers with fields that need the instance (method fields, nested or many-to-many
+    relations, dotted sources) don't compile and keep using the regular path. Enabled with the
+    API_COMPILED_SERIALIZERS setting.
+"""
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.utils import timezone
+from rest_framework import ISO_8601, fields, relations
+from rest_framework.serializers import BaseSerializer
+from rest_framework.settings import api_settings
+
+# field classes whose to_representation is a plain type cast, matched exactly so subclasses that
+# override it go through their own method
+CASTS = {
+    fields.IntegerField: int,
+    fields.FloatField: float,
+    fields.CharField: str,
+    fields.EmailField: str,
+    fields.SlugField: str,
+    fields.URLField: str,
+    fields.ReadOnlyField: None,
+    relations.PrimaryKeyRelatedField: None,
+}
+
+
+def is_enabled():
+    return getattr(settings, "API_COMPILED_SERIALIZERS", False)
+
+
+def file_url_converter(model_field, request):
+    storage = model_field.storage
+
+    def convert(name):
+        if not name:
+            return None
+        url = storage.url(name)
+        return request.build_absolute_uri(url) if request is not None else url
+
+    return convert
+
+
+def datetime_converter(field):
+    """
+        DateTimeField.to_representation with the output timezone looked up once instead of per value.
+    """
+    output_format = getattr(field, "format", api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, "timezone") else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if isinstance(value, str) or timezone.is_naive(value):
+            return field.to_representation(value)
+        value = value.astimezone(field_timezone).isoformat()
+        return value[:-6] + "Z" if value.endswith("+00:00") else value
+
+    return convert
+
+
+def get_converter(field, model_field, request):
+    """
+        A callable giving `field.to_representation` of a raw column value, None for the identity,
+        or raises TypeError when the field can't be compiled.
+    """
+    field_type = type(field)
+    if field_type in CASTS:
+        if field_type is relations.PrimaryKeyRelatedField and field.pk_field is not None:
+            raise TypeError(field)
+        return CASTS[field_type]
+    if field_type is relations.SlugRelatedField and getattr(model_field, "to_fields", None) == [field.slug_field]:
+        # a foreign key to the slug column already holds the value the field would fetch
+        return None
+    if field_type is fields.DateTimeField:
+        return datetime_converter(field)
+    if isinstance(field, fields.FileField):
+        if not getattr(field, "use_url", api_settings.UPLOADED_FILES_USE_URL):
+            return None
+        return file_url_converter(model_field, request)
+    if isinstance(field, (relations.RelatedField, relations.ManyRelatedField, fields.SerializerMethodField, BaseSerializer)):
+        raise TypeError(field)
+    return field.to_representation
+
+
+class CompiledSerializer:
+    def __init__(self, columns):
+        # (output key, values() key, converter or None)
+        self.columns = columns
+
+    @property
+    def sources(self):
+        return [source for _, source, _ in self.columns]
+
+    def values(self, queryset):
+        return queryset.values(*self.sources)
+
+    def to_representation(self, rows):
+        columns = self.columns
+        data = []
+        for row in rows:
+            item = {}
+            for key, source, convert in columns:
+                value = row[source]
+                item[key] = value if convert is None or value is None else convert(value)
+            data.append(item)
+        return data
+
+
+def compile_serializer(serializer_class, request):
+    """
+        Compile `serializer_class` (with the request's sparse fieldset applied), or None when one of
+        its fields needs a model instance.
+    """
+    serializer = serializer_class(context={"request": request})
+    opts = serializer.Meta.model._meta
+    columns = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if field.source == "*" or "." in field.source:
+            return None
+        try:
+            model_field = opts.get_field(field.source)
+        except FieldDoesNotExist:
+            return None
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        try:
+            converter = get_converter(field, model_field, request)
+        except TypeError:
+            return None
+        columns.append((name, field.source, converter))
+    return CompiledSerializer(columns)
+
+
+def serialize_page(paginator, queryset, serializer_class, request, view=None, continuations=()):
+    """
+        Paginate `queryset` and serialize the page, through the compiled path when it's enabled and
+        the serializer compiles. `continuations` are querysets with the same columns whose rows
+        follow `queryset`'s (see KeysetPagination.paginate_querysets).
+    """
+    compiled = compile_serializer(serializer_class, request) if is_enabled() else None
+    querysets = [queryset, *continuations]
+    if compiled is None:
+        querysets = [serializer_class.prepare_queryset(queryset, request) for queryset in querysets]
+        page = paginator.paginate_querysets(querysets, request, view=view)
+        return serializer_class(page, many=True, context={"request": request}).data
+    page = paginator.paginate_querysets([compiled.values(queryset) for queryset in querysets], request, view=view)
+    return compiled.to_representation(page)
+
+
+def serialize_queryset(queryset, serializer_class, request):
+    """
+        Serialize a whole (already limited) queryset, through the compiled path when possible.
+    """
+    compiled = compile_serializer(serializer_class, request) if is_enabled() else None
+    if compiled is None:
+        queryset = serializer_class.prepare_queryset(queryset, request)
+        return serializer_class(queryset, many=True, context={"request": request}).data
+    return compiled.to_representation(compiled.values(queryset))
+
+
+def serialize_instances(instances, serializer_class, request):
+    """
+        Serialize already fetched model instances, through the compiled path when possible so
+        relations are rendered from their column values without fetching the related rows.
+    """
+    compiled = compile_serializer(serializer_class, request) if is_enabled() else None
+    if compiled is None:
+        return serializer_class(instances, many=True, context={"request": request}).data
+    opts = serializer_class.Meta.model._meta
+    attnames = [(source, opts.get_field(source).attname) for source in compiled.sources]
+    return compiled.to_representation([{source: getattr(instance, attname) for source, attname in attnames} for instance in instances])
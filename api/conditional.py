@@ -0,0 +1,72 @@
+"""
+    Conditional GET (ETag / Last-Modified / 304) for catalog endpoints.
+
+    Validators are built from `updated_at`: the row's own for detail views, and max(updated_at) plus
+    the row count for lists (deletes lower the count, every other write moves the max), so the
+    whole check is one aggregate query and a 304 is answered without serializing anything. Writes
+    that bypass save() (bulk updates, the image derivatives) must set updated_at themselves.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(request, *parts):
+    # the query string is part of the tag, the same rows paginate/filter into different bodies
+    raw = "|".join(str(part) for part in (request.path, sorted(request.query_params.lists()), *parts))
+    return "W/" + quote_etag(hashlib.md5(raw.encode("utf-8")).hexdigest())
+
+
+def list_validators(request, queryset, related=()):
+    """
+        `related` are querysets of other rows the list embeds (e.g. the category names of the product
+        facets), their max(updated_at) is part of the tag.
+    """
+    stats = queryset.order_by().aggregate(last_modified=Max("updated_at"), count=Count("pk"))
+    last_modified = stats["last_modified"]
+    parts = [last_modified, stats["count"]]
+    for rows in related:
+        modified = rows.order_by().aggregate(last_modified=Max("updated_at"))["last_modified"]
+        parts.append(modified)
+        if modified is not None and (last_modified is None or modified > last_modified):
+            last_modified = modified
+    return make_etag(request, *parts), last_modified
+
+
+def object_validators(request, queryset, pk, extra_fields=()):
+    """
+        `extra_fields` are hashed into the tag too, for columns written without moving updated_at
+        (e.g. CustomUser.updated_at is only set on creation, its avatar_derivatives change later).
+    """
+    row = queryset.filter(pk=pk).values_list("updated_at", *extra_fields).first() or (None,) * (1 + len(extra_fields))
+    last_modified = row[0]
+    return make_etag(request, pk, *row), last_modified
+
+
+def conditional_get(handler):
+    """
+        Answer If-None-Match / If-Modified-Since from the view's `get_validators(request, *args, **kwargs)`,
+        which returns an (etag, last_modified) pair, or None to skip the check.
+    """
+
+    @wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return handler(self, request, *args, **kwargs)
+
+        etag, last_modified = validators
+        timestamp = int(last_modified.timestamp()) if last_modified else None
+        response = get_conditional_response(request._request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = handler(self, request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response["ETag"] = etag
+            if timestamp is not None:
+                response["Last-Modified"] = http_date(timestamp)
+        return response
+
+    return wrapper
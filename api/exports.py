@@ -0,0 +1,148 @@
+"""
+    Streaming exports of orders, order lines, products and users as CSV or NDJSON.
+
+    Rows are read through `.iterator(chunk_size=...)` (a server-side cursor on PostgreSQL) as
+    plain tuples, rendered one at a time, gathered into buffers of about BUFFER_SIZE bytes and,
+    when asked, gzip-compressed as they go. Nothing holds more than a chunk of rows and a buffer,
+    so an export costs the same memory whether it holds a thousand lines or ten million. The
+    date range applies to each export's own date (an order line's is its order's). Orders and lines
+    moved to the archive tables (see src/order/archive.py) are read first, the archived orders
+    being older than the ones left.
+"""
+import csv
+import zlib
+from datetime import datetime, time, timedelta
+from itertools import chain
+
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+
+from src.order.models import ArchivedOrderLines, ArchivedOrders, Orders, OrderLines
+from src.product.models import Products
+
+EXPORT_FORMATS = ("csv", "ndjson")
+CONTENT_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+CHUNK_SIZE = 2000
+BUFFER_SIZE = 64 * 1024
+
+# name: (models read in turn, exported fields, date field, ordering)
+EXPORTS = {
+    "orders": (
+        (ArchivedOrders, Orders),
+        ["id", "user__username", "created_at", "updated_at", "total", "item_count"],
+        "created_at",
+        ("created_at", "id"),
+    ),
+    "order-lines": (
+        (ArchivedOrderLines, OrderLines),
+        ["id", "order_id", "order__created_at", "product_id", "price", "quantity"],
+        "order__created_at",
+        ("order_id", "id"),
+    ),
+    "products": (
+        (Products,),
+        ["id", "title", "category_id", "price", "discount_type", "discount_value", "effective_price", "created_at", "updated_at"],
+        "created_at",
+        ("created_at", "id"),
+    ),
+    "users": (
+        (get_user_model(),),
+        ["id", "username", "email", "first_name", "last_name", "role", "date_joined", "is_active"],
+        "date_joined",
+        ("date_joined", "id"),
+    ),
+}
+
+
+class Echo:
+    """
+        A file-like object that hands back what is written to it, for csv.writer.
+    """
+
+    def write(self, value):
+        return value
+
+
+def date_bounds(start=None, end=None):
+    """
+        The aware datetimes bounding the days `start` to `end` (inclusive, either may be None).
+    """
+    lower = timezone.make_aware(datetime.combine(start, time.min)) if start is not None else None
+    upper = timezone.make_aware(datetime.combine(end + timedelta(days=1), time.min)) if end is not None else None
+    return lower, upper
+
+
+def export_rows(name, start=None, end=None, chunk_size=CHUNK_SIZE):
+    """
+        (column names, iterator of row tuples) of the export `name` for the days `start` to `end`.
+    """
+    models, fields, date_field, ordering = EXPORTS[name]
+    lower, upper = date_bounds(start, end)
+    querysets = []
+    for model in models:
+        rows = model._default_manager.all()
+        if lower is not None:
+            rows = rows.filter(**{f"{date_field}__gte": lower})
+        if upper is not None:
+            rows = rows.filter(**{f"{date_field}__lt": upper})
+        querysets.append(rows.order_by(*ordering).values_list(*fields))
+    columns = [field.replace("__", "_") for field in fields]
+    # one cursor open at a time, the next table is only read once the previous one is done
+    return columns, chain.from_iterable(rows.iterator(chunk_size=chunk_size) for rows in querysets)
+
+
+def render_csv(columns, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+
+
+def render_ndjson(columns, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(columns, row))) + "\n"
+
+
+def buffered(chunks, size=BUFFER_SIZE):
+    """
+        Join small text chunks into encoded blocks of about `size` bytes.
+    """
+    parts, length = [], 0
+    for chunk in chunks:
+        parts.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield "".join(parts).encode("utf-8")
+            parts, length = [], 0
+    if parts:
+        yield "".join(parts).encode("utf-8")
+
+
+def gzip_stream(blocks, level=6):
+    """
+        Compress byte blocks into one gzip stream as they come.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for block in blocks:
+        compressed = compressor.compress(block)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def stream_export(name, output_format="csv", start=None, end=None, compress=False, chunk_size=CHUNK_SIZE):
+    """
+        The export `name` as an iterator of bytes, gzip-compressed when `compress`.
+    """
+    if output_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported format '{output_format}', use one of {', '.join(EXPORT_FORMATS)}")
+    columns, rows = export_rows(name, start, end, chunk_size)
+    render = render_csv if output_format == "csv" else render_ndjson
+    blocks = buffered(render(columns, rows))
+    return gzip_stream(blocks) if compress else blocks
+
+
+def export_filename(name, output_format, compress=False):
+    return f"{name}.{output_format}{'.gz' if compress else ''}"
@@ -0,0 +1,127 @@
+"""
+    Catalog filters and facet counts for the product listing.
+
+    Filters: `category` (ids or names, comma-separated, each including its subcategories),
+    `min_price`/`max_price` (on the price after discount), `discount_type` (comma-separated, any of)
+    and `tag` (comma-separated, all of). Category and discount type filters are served by the
+    composite (column, effective_price, id) and (category, title) indexes on Products, so a filtered
+    page is the same range scan as an unfiltered one; tags are index lookups through `tag_set`.
+
+    Facets count the filtered products per category, per discount type and per price bucket in a
+    single GROUP BY over (category, discount type, price bucket); the three facets are rolled up
+    from its rows in Python.
+"""
+from django.conf import settings
+from django.utils.dateparse import parse_date
+from django.db.models import Case, Count, IntegerField, Q, Value, When
+
+from src.product.models import Categories, Products
+from src.product.tags import filter_tagged
+
+
+def get_list_param(params, name):
+    return [value.strip() for value in params.get(name, "").split(",") if value.strip()]
+
+
+def get_date_param(params, name):
+    """
+        The date (YYYY-MM-DD) given as `name`, None when absent, raises ValueError when malformed.
+    """
+    if not params.get(name):
+        return None
+    try:
+        value = parse_date(params[name])
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValueError(f"'{name}' must be a date (YYYY-MM-DD)")
+    return value
+
+
+def filter_by_category(queryset, values):
+    ids = [int(value) for value in values if value.isdigit()]
+    names = [value for value in values if not value.isdigit()]
+    paths = Categories.objects.filter(Q(pk__in=ids) | Q(name__in=names)).values_list("path", flat=True)
+    subtrees = Q()
+    for path in paths:
+        subtrees |= Q(path__startswith=path)
+    if not subtrees:
+        return queryset.none()
+    return queryset.filter(category__in=Categories.objects.filter(subtrees).values("pk"))
+
+
+def filter_products(queryset, params):
+    """
+        Apply the catalog filters found in `params`, raises ValueError on malformed values.
+    """
+    try:
+        if "min_price" in params:
+            queryset = queryset.filter(effective_price__gte=float(params["min_price"]))
+        if "max_price" in params:
+            queryset = queryset.filter(effective_price__lte=float(params["max_price"]))
+    except ValueError:
+        raise ValueError("'min_price' and 'max_price' must be numbers")
+
+    categories = get_list_param(params, "category")
+    if categories:
+        queryset = filter_by_category(queryset, categories)
+
+    discount_types = get_list_param(params, "discount_type")
+    if discount_types:
+        unknown = set(discount_types) - set(dict(Products.discount_type_options))
+        if unknown:
+            raise ValueError(f"Unknown discount_type '{', '.join(sorted(unknown))}'")
+        queryset = queryset.filter(discount_type__in=discount_types)
+
+    tags = get_list_param(params, "tag")
+    if tags:
+        queryset = filter_tagged(queryset, tags)
+    return queryset
+
+
+def get_price_buckets():
+    """
+        Upper bounds of the price facet buckets, the last bucket is open-ended.
+    """
+    return sorted(getattr(settings, "CATALOG_PRICE_BUCKETS", [25, 50, 100, 250, 500, 1000]))
+
+
+def product_facets(queryset):
+    """
+        Facet counts of `queryset` in one grouped query.
+    """
+    bounds = get_price_buckets()
+    bucket = Case(
+        *[When(effective_price__lt=bound, then=Value(index)) for index, bound in enumerate(bounds)],
+        default=Value(len(bounds)),
+        output_field=IntegerField(),
+    )
+    rows = (
+        queryset.order_by()
+        .annotate(price_bucket=bucket)
+        .values("category_id", "category__name", "discount_type", "price_bucket")
+        .annotate(count=Count("pk"))
+    )
+
+    categories, discount_types = {}, {}
+    price_counts = [0] * (len(bounds) + 1)
+    for row in rows:
+        category = categories.setdefault(row["category_id"], {"id": row["category_id"], "name": row["category__name"], "count": 0})
+        category["count"] += row["count"]
+        discount_types[row["discount_type"]] = discount_types.get(row["discount_type"], 0) + row["count"]
+        price_counts[row["price_bucket"]] += row["count"]
+
+    lower_bounds = [0, *bounds]
+    upper_bounds = [*bounds, None]
+    return {
+        "category": sorted(categories.values(), key=lambda category: (-category["count"], category["name"])),
+        "discount_type": [
+            {"value": value, "count": discount_types[value]}
+            for value, _ in Products.discount_type_options
+            if value in discount_types
+        ],
+        "price": [
+            {"min": lower, "max": upper, "count": count}
+            for lower, upper, count in zip(lower_bounds, upper_bounds, price_counts)
+        ],
+    }
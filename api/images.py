@@ -0,0 +1,146 @@
+"""
+    Resized derivatives (thumbnails) of product pictures and user avatars.
+
+    Derivatives are rendered with Pillow off the request path: saving a model with a new image
+    schedules the work on a small thread pool once the transaction commits (or runs it inline when
+    IMAGE_DERIVATIVES["ASYNC"] is off, and from the generate_image_derivatives command). Files are
+    stored content-addressed under derivatives/<sha256>.<ext>, so identical renditions are written
+    once. The storage names land in a JSON column next to the image, which the serializers turn
+    into URLs without any extra query.
+"""
+import hashlib
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    "WIDTHS": [160, 320, 640],
+    "FORMATS": ["webp", "jpeg"],
+    "QUALITY": 80,
+    "ASYNC": True,
+    "MAX_WORKERS": 2,
+}
+
+PILLOW_FORMATS = {"webp": "WEBP", "jpeg": "JPEG"}
+
+_executor = None
+
+
+def get_setting(name):
+    return getattr(settings, "IMAGE_DERIVATIVES", {}).get(name, DEFAULTS[name])
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=get_setting("MAX_WORKERS"), thread_name_prefix="derivatives")
+    return _executor
+
+
+def store(content, extension):
+    digest = hashlib.sha256(content).hexdigest()
+    name = f"derivatives/{digest[:2]}/{digest}.{extension}"
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(content))
+    return name
+
+
+def render_derivatives(field_file):
+    """
+        Render every configured width and format of an image, returns {format: {width: storage name}}.
+    """
+    with field_file.open("rb") as source:
+        image = ImageOps.exif_transpose(Image.open(source))
+        image.load()
+
+    derivatives = {}
+    for extension in get_setting("FORMATS"):
+        if extension == "webp" and not features.check("webp"):
+            continue
+        rendered = derivatives[extension] = {}
+        for width in get_setting("WIDTHS"):
+            # never upscale, narrower originals just produce (and dedupe to) the same file
+            target = min(width, image.width)
+            resized = image.resize((target, max(1, round(image.height * target / image.width))), Image.LANCZOS)
+            if extension == "jpeg" and resized.mode != "RGB":
+                resized = resized.convert("RGB")
+            elif resized.mode not in ("RGB", "RGBA"):
+                resized = resized.convert("RGBA")
+            buffer = io.BytesIO()
+            resized.save(buffer, format=PILLOW_FORMATS[extension], quality=get_setting("QUALITY"))
+            rendered[str(width)] = store(buffer.getvalue(), extension)
+    return derivatives
+
+
+def generate_derivatives(model_label, pk, image_field, derivatives_field):
+    """
+        Render the derivatives of one row's image and record them, unless the image changed meanwhile.
+    """
+    from .cache import bump_version
+
+    model = apps.get_model(model_label)
+    instance = model._default_manager.filter(pk=pk).only(image_field).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, image_field)
+    data = {}
+    if field_file:
+        data = {"source": field_file.name, "formats": render_derivatives(field_file)}
+    changes = {derivatives_field: data}
+    updated_at = next((field for field in model._meta.concrete_fields if field.name == "updated_at"), None)
+    if getattr(updated_at, "auto_now", False):
+        # the conditional GET validators follow updated_at, a 304 mustn't hide the new URLs
+        changes["updated_at"] = timezone.now()
+    # filtering on the source keeps a slow render from overwriting the derivatives of a newer upload
+    updated = model._default_manager.filter(pk=pk, **{image_field: field_file.name}).update(**changes)
+    if updated:
+        bump_version(model, pk=pk)
+
+
+def _run(model_label, pk, image_field, derivatives_field):
+    try:
+        generate_derivatives(model_label, pk, image_field, derivatives_field)
+    except Exception:
+        logger.exception("Rendering %s derivatives of %s %s failed", image_field, model_label, pk)
+    finally:
+        close_old_connections()
+
+
+def schedule_derivatives(instance, image_field, derivatives_field):
+    """
+        Queue a render if the image changed since its derivatives were made. Runs after commit so the
+        worker sees the new row.
+    """
+    field_file = getattr(instance, image_field)
+    current = getattr(instance, derivatives_field) or {}
+    if (field_file.name or None) == current.get("source"):
+        return
+
+    args = (instance._meta.label, instance.pk, image_field, derivatives_field)
+    if get_setting("ASYNC"):
+        transaction.on_commit(lambda: get_executor().submit(_run, *args))
+    else:
+        transaction.on_commit(lambda: generate_derivatives(*args))
+
+
+def derivative_urls(data, request=None):
+    """
+        {format: {width: url}} for a derivatives column, absolute when a request is at hand.
+    """
+    urls = {}
+    for extension, widths in (data or {}).get("formats", {}).items():
+        urls[extension] = {}
+        for width, name in widths.items():
+            url = default_storage.url(name)
+            urls[extension][width] = request.build_absolute_uri(url) if request is not None else url
+    return urls
@@ -0,0 +1,45 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from api.models import JobState
+from src.order.archive import archive_orders
+
+JOB_NAME = "order_archive"
+
+
+class Command(BaseCommand):
+    help = "Move orders (and their lines) older than a cutoff day to the archive tables, in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--older-than-days", type=int, default=365, help="Archive the orders created before this many days ago")
+        parser.add_argument("--before", help="Archive the orders created before this day (YYYY-MM-DD) instead")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Orders moved per transaction")
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep between batches")
+
+    def handle(self, *args, older_than_days=365, before=None, batch_size=1000, pause=0, **options):
+        try:
+            before = parse_date(before) if before else timezone.localdate() - timedelta(days=older_than_days)
+        except ValueError as e:
+            raise CommandError(e)
+        if before is None:
+            raise CommandError("--before must be a date (YYYY-MM-DD)")
+
+        started = time.perf_counter()
+        orders = lines = 0
+        for batch_orders, batch_lines in archive_orders(before, batch_size):
+            orders += batch_orders
+            lines += batch_lines
+            if pause:
+                time.sleep(pause)
+
+        state = JobState.get(JOB_NAME)
+        state.watermark = {"before": before.isoformat()}
+        state.save()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            self.style.SUCCESS(f"{orders} orders and {lines} lines created before {before} archived in {elapsed:.2f}s")
+        )
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import RequestFactory
+from rest_framework.renderers import JSONRenderer
+
+from api.compiled import compile_serializer
+from api.serializers import ProductsSerializer
+from src.product.models import Products
+
+
+class Command(BaseCommand):
+    help = "Compare rows/s of ProductsSerializer(many=True) against the compiled read path on the catalog"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1000, help="Products serialized per run")
+        parser.add_argument("--repeat", type=int, default=5, help="Runs per path, the best one is reported")
+
+    def handle(self, *args, rows=1000, repeat=5, **options):
+        queryset = Products.objects.order_by("-id")[:rows]
+        count = queryset.count()
+        if not count:
+            raise CommandError("No products to serialize, import some first")
+
+        request = RequestFactory().get("/api/products/")
+        compiled = compile_serializer(ProductsSerializer, request)
+
+        def serializer_path():
+            return ProductsSerializer(list(queryset.all()), many=True, context={"request": request}).data
+
+        def compiled_path():
+            return compiled.to_representation(list(compiled.values(queryset.all())))
+
+        renderer = JSONRenderer()
+        if renderer.render(serializer_path()) != renderer.render(compiled_path()):
+            raise CommandError("The compiled output differs from ProductsSerializer")
+
+        results = {}
+        for name, run in (("ProductsSerializer(many=True)", serializer_path), ("compiled", compiled_path)):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            results[name] = count / best
+            self.stdout.write(f"{name:32} {count / best:>12,.0f} rows/s (best of {repeat}, {count} rows, query included)")
+
+        speedup = results["compiled"] / results["ProductsSerializer(many=True)"]
+        self.stdout.write(self.style.SUCCESS(f"compiled path is {speedup:.1f}x faster"))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from api.cache import bump_version
+from api.models import JobState
+from src.product.models import Products
+from src.product.related import rebuild_related_products, refresh_related_products
+
+JOB_NAME = "related_products"
+
+
+class Command(BaseCommand):
+    help = (
+        "Build the 'frequently bought together' serving table from order lines and cart items, "
+        "incrementally from the orders created or changed since the last run unless --full"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recount every order and cart from scratch")
+        parser.add_argument("--top-k", type=int, default=10, help="Related products kept per product")
+        parser.add_argument("--max-basket-size", type=int, default=50, help="Skip baskets with more products")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Baskets counted per step")
+
+    def handle(self, *args, full=False, top_k=10, max_basket_size=50, batch_size=1000, chunk_size=10000, **options):
+        state = JobState.get(JOB_NAME)
+        since = None if full else parse_datetime(state.watermark.get("updated_at") or "")
+        if since is None:
+            until, written = rebuild_related_products(top_k, max_basket_size, batch_size, chunk_size)
+        else:
+            until, written = refresh_related_products(since, top_k, max_basket_size, batch_size, chunk_size)
+
+        state.watermark = {"updated_at": until.isoformat()}
+        state.save()
+        if written:
+            bump_version(Products)
+        self.stdout.write(self.style.SUCCESS(f"{written} related products written, orders counted up to {until.isoformat()}"))
@@ -0,0 +1,42 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.exports import CHUNK_SIZE, EXPORT_FORMATS, EXPORTS, stream_export
+from api.filters import get_date_param
+
+
+class Command(BaseCommand):
+    help = "Stream orders, order lines, products or users to a CSV or NDJSON file, optionally gzip-compressed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("name", choices=sorted(EXPORTS))
+        parser.add_argument("--format", dest="output_format", choices=EXPORT_FORMATS, default="csv")
+        parser.add_argument("--from", dest="start", help="First day exported (YYYY-MM-DD)")
+        parser.add_argument("--to", dest="end", help="Last day exported (YYYY-MM-DD)")
+        parser.add_argument("--output", default="-", help="File to write, '-' writes standard output")
+        parser.add_argument("--gzip", action="store_true", help="Compress the output with gzip")
+        parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows fetched per round trip")
+
+    def handle(self, *args, name, output_format="csv", start=None, end=None, output="-", gzip=False, chunk_size=CHUNK_SIZE, **options):
+        dates = {"from": start, "to": end}
+        try:
+            start, end = get_date_param(dates, "from"), get_date_param(dates, "to")
+        except ValueError as e:
+            raise CommandError(e)
+
+        blocks = stream_export(name, output_format, start, end, gzip, chunk_size)
+        written = 0
+        try:
+            if output == "-":
+                for block in blocks:
+                    sys.stdout.buffer.write(block)
+                sys.stdout.buffer.flush()
+                return
+            with open(output, "wb") as stream:
+                for block in blocks:
+                    stream.write(block)
+                    written += len(block)
+        except OSError as e:
+            raise CommandError(e)
+        self.stdout.write(self.style.SUCCESS(f"{name} exported to {output} ({written} bytes)"))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cart_store import get_cart_store
+
+
+class Command(BaseCommand):
+    help = "Write the unflushed changes of the carts held by the cart store to the database (run it periodically)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-age", type=float, default=0, help="Only carts whose oldest unflushed change is this many seconds old")
+
+    def handle(self, *args, max_age=0, **options):
+        store = get_cart_store()
+        if store is None:
+            raise CommandError("No cart store is configured (CART_STORE['BACKEND'])")
+        flushed = store.flush_all(max_age=max_age)
+        self.stdout.write(self.style.SUCCESS(f"{flushed} carts flushed"))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from api.images import generate_derivatives
+from src.product.models import Products
+from src.user.models import CustomUser
+
+TARGETS = {
+    "products": (Products, "picture", "picture_derivatives"),
+    "users": (CustomUser, "avatar", "avatar_derivatives"),
+}
+
+
+class Command(BaseCommand):
+    help = "Render the missing (or with --force, all) resized derivatives of product pictures and avatars"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model", choices=TARGETS, action="append", help="Defaults to all of them")
+        parser.add_argument("--force", action="store_true", help="Re-render images that already have derivatives")
+
+    def handle(self, *args, model=None, force=False, **options):
+        for name in model or TARGETS:
+            target, image_field, derivatives_field = TARGETS[name]
+            rows = target._default_manager.exclude(**{image_field: ""}).exclude(**{f"{image_field}__isnull": True})
+            rendered = failed = 0
+            for pk, image, derivatives in rows.values_list("pk", image_field, derivatives_field).iterator():
+                if not force and (derivatives or {}).get("source") == image:
+                    continue
+                try:
+                    generate_derivatives(target._meta.label, pk, image_field, derivatives_field)
+                    rendered += 1
+                except Exception as e:
+                    failed += 1
+                    self.stderr.write(f"{name} {pk}: {e}")
+            self.stdout.write(self.style.SUCCESS(f"{name}: {rendered} rendered, {failed} failed"))
@@ -0,0 +1,47 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.cache import bump_version
+from src.product.importers import IMPORT_FORMATS, ProductImporter
+from src.product.models import Products
+
+
+class Command(BaseCommand):
+    help = "Stream products from a CSV or JSON Lines file into the catalog, upserting on title"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File to import, '-' reads standard input")
+        parser.add_argument("--format", dest="input_format", choices=IMPORT_FORMATS, help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, path, input_format=None, batch_size=1000, **options):
+        if input_format is None:
+            extension = path.rsplit(".", 1)[-1].lower()
+            input_format = {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(extension)
+            if input_format is None:
+                raise CommandError("Can't tell the format from the file name, pass --format")
+
+        started = time.monotonic()
+        importer = ProductImporter(batch_size=batch_size)
+        try:
+            if path == "-":
+                report = importer.run(sys.stdin, input_format)
+            else:
+                with open(path, newline="", encoding="utf-8") as stream:
+                    report = importer.run(stream, input_format)
+        except OSError as e:
+            raise CommandError(e)
+        finally:
+            bump_version(Products)
+        elapsed = time.monotonic() - started
+
+        for error in report.errors:
+            self.stderr.write(f"line {error['line']}: {error['error']}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{report.imported} of {report.rows} rows imported, {report.failed} failed "
+                f"in {elapsed:.1f}s ({report.rows / elapsed if elapsed else report.rows:.0f} rows/s)"
+            )
+        )
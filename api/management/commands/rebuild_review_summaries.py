@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from api.cache import bump_version
+from src.product.models import Products
+from src.product.summaries import rebuild_review_summaries
+
+
+class Command(BaseCommand):
+    help = "Recompute the per-product review summaries from the reviews"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--product", type=int, action="append", dest="products", help="Only these product ids")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, products=None, batch_size=1000, **options):
+        written = rebuild_review_summaries(product_ids=products, batch_size=batch_size)
+        bump_version(Products)
+        self.stdout.write(self.style.SUCCESS(f"{written} review summaries rebuilt"))
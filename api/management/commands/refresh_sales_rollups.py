@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from django.utils.dateparse import parse_datetime
+
+from api.models import JobState
+from src.order.rollups import refresh_sales_rollups
+
+JOB_NAME = "sales_rollups"
+
+
+class Command(BaseCommand):
+    help = "Refresh the daily sales rollups for the orders created or changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Recompute every day from scratch")
+
+    def handle(self, *args, full=False, **options):
+        state = JobState.get(JOB_NAME)
+        since = None if full else parse_datetime(state.watermark.get("updated_at") or "")
+        until, days, written = refresh_sales_rollups(since)
+        if until is not None:
+            state.watermark = {"updated_at": until.isoformat()}
+            state.save()
+        self.stdout.write(self.style.SUCCESS(f"{days} days refreshed, {written} rollup rows written"))
@@ -0,0 +1,65 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.cart_store import get_cart_store
+from api.models import JobState
+from src.cart.sweeper import OPEN_STATUSES, format_position, parse_position, sweep_abandoned_carts
+
+JOB_NAME = "abandoned_carts"
+
+
+class Command(BaseCommand):
+    help = "Mark carts idle for longer than --idle-hours as abandoned, in short chunked transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--idle-hours", type=float, default=72, help="Hours without activity before a cart is abandoned")
+        parser.add_argument("--status", action="append", dest="statuses", help=f"Statuses swept (default {', '.join(OPEN_STATUSES)})")
+        parser.add_argument("--purge-items", action="store_true", help="Also delete the items of abandoned carts")
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--pause", type=float, default=0, help="Seconds to sleep between chunks")
+        parser.add_argument("--resume", action="store_true", help="Continue the last interrupted sweep")
+        parser.add_argument("--every", type=float, help="Keep running, sweeping every this many seconds")
+
+    def handle(self, *args, every=None, **options):
+        while True:
+            self.sweep(**options)
+            if every is None:
+                return
+            time.sleep(every)
+            options["resume"] = False
+
+    def sweep(self, idle_hours=72, statuses=None, purge_items=False, chunk_size=500, pause=0, resume=False, **options):
+        state = JobState.get(JOB_NAME)
+        statuses = statuses or OPEN_STATUSES
+        if resume and state.watermark.get("cutoff"):
+            cutoff, position = parse_datetime(state.watermark["cutoff"]), parse_position(state.watermark.get("position"))
+        else:
+            cutoff, position = timezone.now() - timedelta(hours=idle_hours), None
+
+        store = get_cart_store()
+        if store is not None:
+            # unflushed cart changes haven't touched updated_at yet
+            store.flush_all()
+
+        started = time.perf_counter()
+        abandoned = purged = 0
+        chunks = sweep_abandoned_carts(cutoff, statuses, purge_items, chunk_size, position, store)
+        for chunk_abandoned, chunk_purged, position, ids in chunks:
+            abandoned += chunk_abandoned
+            purged += chunk_purged
+            state.watermark = {"cutoff": cutoff.isoformat(), "position": format_position(position)}
+            state.save()
+            if pause:
+                time.sleep(pause)
+
+        state.watermark = {"last_cutoff": cutoff.isoformat()}
+        state.save()
+        elapsed = time.perf_counter() - started
+        rate = abandoned / elapsed if elapsed else 0
+        self.stdout.write(
+            self.style.SUCCESS(f"{abandoned} carts abandoned, {purged} items purged in {elapsed:.2f}s ({rate:,.0f} rows/s)")
+        )
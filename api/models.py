@@ -1,3 +1,23 @@
 from django.db import models
 
-# Create your models here.
+
+class JobState(models.Model):
+    """
+        Progress of a background job between runs, e.g. the last row an incremental job processed.
+    """
+
+    name = models.CharField(max_length=100, unique=True)
+    # the job's watermark: last processed row id, timestamp or date, whatever the job keys on
+    watermark = models.JSONField(default=dict, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def get(cls, name):
+        return cls.objects.get_or_create(name=name)[0]
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        verbose_name = "Job state"
+        verbose_name_plural = "Job states"
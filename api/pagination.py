@@ -0,0 +1,210 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+from .serializers import SparseFieldsMixin
+
+
+class KeysetPagination(BasePagination):
+    """
+        Opaque cursor (keyset) pagination.
+
+        Pages are keyed on the model's Meta.ordering (or an explicit `ordering`) with the primary key
+        appended as a tie-breaker, so every page is a range scan on an index instead of an OFFSET
+        that gets slower the deeper a client pages. Ordering fields must be non-nullable.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    page_size = api_settings.PAGE_SIZE or 50
+    max_page_size = 200
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering=None, page_size=None):
+        self.ordering = ordering
+        if page_size is not None:
+            self.page_size = page_size
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.paginate_querysets([queryset], request, view=view)
+
+    def paginate_querysets(self, querysets, request, view=None):
+        """
+            Paginate several querysets as one: the rows of each come after all the rows of the
+            previous ones in the ordering (e.g. a table then its archive), and they share the
+            ordering columns, so one cursor positions all of them. The next queryset is only read
+            when a page runs past the end of the previous one.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = querysets[0].model
+        self.fields = self.get_ordering(querysets[0])
+
+        values, self.reverse = self.decode_cursor(request)
+        self.has_cursor = values is not None
+
+        rows = []
+        for queryset in reversed(querysets) if self.reverse else querysets:
+            rows += self.fetch(queryset, values, self.page_size + 1 - len(rows))
+            if len(rows) > self.page_size:
+                break
+        self.has_more = len(rows) > self.page_size
+        rows = rows[: self.page_size]
+        if self.reverse:
+            rows.reverse()
+        self.page = rows
+        return rows
+
+    def fetch(self, queryset, values, limit):
+        queryset = queryset.order_by(*self.order_by(reverse=self.reverse))
+        # a sparse .only() or .values() selection still has to load the columns the cursors are built from
+        selected = list(queryset.query.values_select)
+        loaded, deferred = queryset.query.deferred_loading
+        if selected and set(self.field_names) - set(selected):
+            queryset = queryset.values(*selected, *[name for name in self.field_names if name not in selected])
+        elif loaded and not deferred:
+            queryset = queryset.only(*loaded, *self.field_names)
+        if values is not None:
+            queryset = queryset.filter(self.position_filter(values))
+        return list(queryset[:limit])
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering(self, queryset):
+        """
+            Return the ordering as a list of (field name, descending) pairs ending with the primary key.
+        """
+        opts = queryset.model._meta
+        ordering = self.ordering or queryset.query.order_by or opts.ordering or ()
+        fields = []
+        for name in ordering:
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            if name == "pk":
+                name = opts.pk.name
+            fields.append((name, descending))
+
+        if not any(name == opts.pk.name for name, _ in fields):
+            # tie-break in the direction of the leading field so one composite index serves the scan
+            descending = fields[0][1] if fields else False
+            fields.append((opts.pk.name, descending))
+        return fields
+
+    def order_by(self, reverse=False):
+        return [("-" if descending != reverse else "") + name for name, descending in self.fields]
+
+    def position_filter(self, values):
+        """
+            Build the row-value comparison `(a, b, id) > (x, y, z)` as an OR of prefix equalities,
+            which every backend can answer from a composite index on the ordering columns.
+        """
+        condition = Q()
+        for index, (name, descending) in enumerate(self.fields):
+            lookup = "lt" if descending != self.reverse else "gt"
+            clause = Q(**{f"{name}__{lookup}": values[index]})
+            for previous in range(index):
+                clause &= Q(**{self.fields[previous][0]: values[previous]})
+            condition |= clause
+        return condition
+
+    @property
+    def field_names(self):
+        return [name for name, _ in self.fields]
+
+    def get_row_value(self, row, name):
+        if isinstance(row, dict):
+            return row[name]
+        field = row._meta.get_field(name)
+        return getattr(row, field.attname)
+
+    def encode_cursor(self, row, reverse):
+        position = [self.get_row_value(row, name) for name in self.field_names]
+        payload = json.dumps({"p": position, "r": int(reverse)}, default=str, separators=(",", ":"))
+        cursor = base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+            position, reverse = payload["p"], bool(payload["r"])
+        except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        if len(position) != len(self.fields):
+            raise NotFound(self.invalid_cursor_message)
+        return self.to_python(position), reverse
+
+    def to_python(self, position):
+        model = self.model
+        values = []
+        for (name, _), value in zip(self.fields, position):
+            try:
+                values.append(model._meta.get_field(name).to_python(value))
+            except (FieldDoesNotExist, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def get_next_link(self):
+        if not self.page:
+            return None
+        if self.has_more if not self.reverse else self.has_cursor:
+            return self.encode_cursor(self.page[-1], reverse=False)
+        return None
+
+    def get_previous_link(self):
+        if not self.page:
+            return None
+        if self.has_more if self.reverse else self.has_cursor:
+            return self.encode_cursor(self.page[0], reverse=True)
+        return None
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+
+def has_filters(request):
+    """
+        True when the request carries query parameters other than the pagination and sparse fieldset controls.
+    """
+    controls = {
+        KeysetPagination.cursor_query_param,
+        KeysetPagination.page_size_query_param,
+        SparseFieldsMixin.fields_query_param,
+        SparseFieldsMixin.exclude_query_param,
+        SparseFieldsMixin.expand_query_param,
+    }
+    return any(key not in controls for key in request.query_params)
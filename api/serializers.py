@@ -1,12 +1,114 @@
-from rest_framework.serializers import ModelSerializer
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework.serializers import CharField, ModelSerializer, ReadOnlyField
 from src.user import models as user_models
 from src.product import models as product_models
 from src.cart import models as cart_models
 from src.order import models as order_models
 
+from .images import derivative_urls
+
+
+class DerivativesField(ReadOnlyField):
+    """
+        Renders an image derivatives column as {format: {width: url}}.
+    """
+
+    def to_representation(self, value):
+        return derivative_urls(value, self.context.get("request"))
+
+
+class SparseFieldsMixin:
+    """
+        Sparse fieldsets: `?fields=id,title` keeps only the listed fields, `?exclude=description`
+        drops the listed ones. Unknown names are ignored. `?expand=name` adds the optional nested
+        fields listed in `expandable_fields` ({name: serializer class}, sourced from the relation
+        of the same name). Needs the request in the serializer context; nested serializers are
+        left whole.
+
+        `prepare_queryset()` pushes the same selection down to the database: `.only()` the columns
+        behind the selected fields, `select_related()` the expanded relations and
+        `prefetch_related()` the selected `prefetch_fields` (nested many-relations), so the columns
+        nobody asked for aren't fetched and nested data costs no extra query per row.
+    """
+
+    fields_query_param = "fields"
+    exclude_query_param = "exclude"
+    expand_query_param = "expand"
+    expandable_fields = {}
+    prefetch_fields = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is None or hasattr(self, "initial_data"):
+            return
+        selected = self.get_sparse_fields(request, list(self.fields))
+        if selected is not None:
+            for name in list(self.fields):
+                if name not in selected:
+                    self.fields.pop(name)
+        for name in self.get_expanded_fields(request):
+            self.fields[name] = self.expandable_fields[name](read_only=True, allow_null=True)
+
+    @staticmethod
+    def get_list_param(request, param):
+        value = getattr(request, "query_params", request.GET).get(param)
+        if value is None:
+            return None
+        return {name.strip() for name in value.split(",") if name.strip()}
+
+    @classmethod
+    def get_sparse_fields(cls, request, names):
+        """
+            The subset of `names` selected by the request, or None when it doesn't ask for one.
+        """
+        include = cls.get_list_param(request, cls.fields_query_param)
+        exclude = cls.get_list_param(request, cls.exclude_query_param)
+        if include is None and exclude is None:
+            return None
+        return [name for name in names if (include is None or name in include) and name not in (exclude or ())]
+
+    @classmethod
+    def get_expanded_fields(cls, request):
+        expand = cls.get_list_param(request, cls.expand_query_param) or ()
+        return [name for name in cls.expandable_fields if name in expand]
+
+    @classmethod
+    def prepare_queryset(cls, queryset, request):
+        """
+            Restrict `queryset` to the columns behind the selected fields (plus the primary key) and
+            join in the expanded relations. The columns are left alone when a selected field isn't
+            backed by a plain model field.
+        """
+        expanded = cls.get_expanded_fields(request)
+        if expanded:
+            queryset = queryset.select_related(*expanded)
+        prefetched = cls.get_sparse_fields(request, list(cls.prefetch_fields))
+        prefetched = cls.prefetch_fields if prefetched is None else prefetched
+        if prefetched:
+            queryset = queryset.prefetch_related(*prefetched)
+        # .only() can't defer the columns select_related() needs, so joined querysets load whole rows
+        if queryset.query.select_related or cls.get_sparse_fields(request, []) is None:
+            return queryset
+
+        serializer = cls(context={"request": request})
+        opts = queryset.model._meta
+        columns = {opts.pk.name}
+        for field in serializer.fields.values():
+            try:
+                model_field = opts.get_field(field.source.split(".")[0])
+            except FieldDoesNotExist:
+                return queryset
+            if not model_field.concrete or model_field.many_to_many:
+                return queryset
+            columns.add(model_field.name)
+        return queryset.only(*columns)
+
 
 # user serializer
-class CustomUserSerializer(ModelSerializer):
+class CustomUserSerializer(SparseFieldsMixin, ModelSerializer):
+    avatar_derivatives = DerivativesField()
+
     class Meta:
         model = user_models.CustomUser
         fields = [
@@ -18,6 +120,7 @@ class CustomUserSerializer(ModelSerializer):
             "first_name",
             "last_name",
             "avatar",
+            "avatar_derivatives",
             "locale",
             "bio",
             "company",
@@ -25,7 +128,19 @@ class CustomUserSerializer(ModelSerializer):
 
 
 # product serializer
-class ProductsSerializer(ModelSerializer):
+class ReviewSummarySerializer(ModelSerializer):
+    mean = ReadOnlyField()
+    histogram = ReadOnlyField()
+
+    class Meta:
+        model = product_models.ReviewSummary
+        fields = ["count", "mean", "histogram"]
+
+
+class ProductsSerializer(SparseFieldsMixin, ModelSerializer):
+    picture_derivatives = DerivativesField()
+    expandable_fields = {"review_summary": ReviewSummarySerializer}
+
     class Meta:
         model = product_models.Products
         fields = [
@@ -33,17 +148,19 @@ class ProductsSerializer(ModelSerializer):
             "category",
             "title",
             "picture",
+            "picture_derivatives",
             "summary",
             "description",
             "price",
             "discount_type",
             "discount_value",
+            "effective_price",
             "created_at",
             "updated_at",
         ]
 
 
-class CategoriesSerializer(ModelSerializer):
+class CategoriesSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = product_models.Categories
         fields = [
@@ -58,32 +175,70 @@ class CategoriesSerializer(ModelSerializer):
         ]
 
 
-class ReviewsSerializer(ModelSerializer):
+class TagsSerializer(SparseFieldsMixin, ModelSerializer):
+    class Meta:
+        model = product_models.Tags
+        fields = ["id", "name"]
+
+
+class ReviewsSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = product_models.Reviews
         fields = ["id", "user_id", "product", "rating", "comments", "created_at"]
 
 
+class ReviewerSerializer(ModelSerializer):
+    class Meta:
+        model = user_models.CustomUser
+        fields = ["id", "username", "first_name", "last_name", "avatar"]
+
+
+class ReviewFeedSerializer(SparseFieldsMixin, ModelSerializer):
+    user = ReviewerSerializer(read_only=True)
+
+    class Meta:
+        model = product_models.Reviews
+        fields = ["id", "user", "rating", "comments", "created_at"]
+
+
 # Oder serializer
-class OrdersSerializer(ModelSerializer):
+class OrdersSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = order_models.Orders
-        fields = ["id", "user", "created_at"]
+        fields = ["id", "user", "created_at", "total", "item_count"]
 
 
-class OrderLinesSerializer(ModelSerializer):
+class OrderLinesSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = order_models.OrderLines
         fields = ["id", "order", "product", "price", "quantity"]
 
 
-class CartsSerializer(ModelSerializer):
+class OrderLineSerializer(ModelSerializer):
+    # the foreign key holds the title, no need to fetch each product
+    product = CharField(source="product_id", read_only=True)
+
+    class Meta:
+        model = order_models.OrderLines
+        fields = ["id", "product", "price", "quantity"]
+
+
+class OrderWithLinesSerializer(SparseFieldsMixin, ModelSerializer):
+    lines = OrderLineSerializer(many=True, read_only=True)
+    prefetch_fields = ("lines",)
+
+    class Meta:
+        model = order_models.Orders
+        fields = ["id", "user", "created_at", "total", "item_count", "lines"]
+
+
+class CartsSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = cart_models.Carts
         fields = ["id", "created_by", "status", "created_at", "updated_at"]
 
 
-class CartItemsSerializer(ModelSerializer):
+class CartItemsSerializer(SparseFieldsMixin, ModelSerializer):
     class Meta:
         model = cart_models.CartItems
         fields = ["id", "product_id", "cart_id", "quantity", "created_at"]
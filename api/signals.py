@@ -0,0 +1,50 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from src.cart.models import Carts, CartItems
+from src.product.models import Categories, Products, Reviews
+from src.user.models import CustomUser
+
+from .cache import bump_version
+from .images import schedule_derivatives
+
+
+@receiver(post_save, sender=Products)
+@receiver(post_delete, sender=Products)
+@receiver(post_save, sender=Reviews)
+@receiver(post_delete, sender=Reviews)
+@receiver(post_save, sender=Categories)
+def bump_catalog_version(sender, instance, **kwargs):
+    bump_version(sender, pk=instance.pk)
+
+
+@receiver(post_save, sender=Reviews)
+@receiver(post_delete, sender=Reviews)
+def bump_reviewed_product_version(sender, instance, **kwargs):
+    # products embed their review summary (?expand=review_summary)
+    product_id = Products.objects.filter(title=instance.product_id).values_list("pk", flat=True).first()
+    if product_id is not None:
+        bump_version(Products, pk=product_id)
+
+
+@receiver(post_delete, sender=Categories)
+def bump_category_version(sender, instance, **kwargs):
+    # the subcategories were re-parented with a plain UPDATE, so their cached details are stale too
+    bump_version(sender)
+
+
+@receiver(post_save, sender=CartItems)
+@receiver(post_delete, sender=CartItems)
+def bump_cart_version(sender, instance, **kwargs):
+    # cart summaries are cached on their cart's version
+    bump_version(Carts, pk=instance.cart_id_id)
+
+
+@receiver(post_save, sender=Products)
+def render_picture_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance, "picture", "picture_derivatives")
+
+
+@receiver(post_save, sender=CustomUser)
+def render_avatar_derivatives(sender, instance, **kwargs):
+    schedule_derivatives(instance, "avatar", "avatar_derivatives")
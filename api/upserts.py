@@ -0,0 +1,128 @@
+"""
+    Single-statement "insert or add to" writes for cart items and order lines.
+
+    Adding a product that is already in the cart (or order) used to be INSERT, IntegrityError, SELECT,
+    then UPDATE with a quantity summed in Python: three round trips, and two concurrent adds could
+    both read the old quantity and lose one of them. `upsert_increment` issues one
+    INSERT ... ON CONFLICT (...) DO UPDATE SET quantity = table.quantity + EXCLUDED.quantity
+    RETURNING ... for any number of rows, so the database does the addition under the row lock.
+    PostgreSQL and SQLite (3.35+) share that syntax; other backends fall back to one atomic
+    F() UPDATE (or INSERT) per row.
+"""
+from django.db import connections, router, transaction
+from django.db.models import F
+
+
+def parse_whole_number(value):
+    """
+        int() that refuses booleans and fractions instead of truncating them.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"{value!r} is not a whole number")
+    return int(value)
+
+
+def parse_quantities(data):
+    """
+        Read {product title: quantity} from a request body holding one item ({"product", "quantity"}),
+        a list of items, or {"items": [...]}. Quantities of a product listed twice are summed.
+        Raises ValueError with a message on malformed items.
+    """
+    if isinstance(data, list):
+        items = data
+    elif isinstance(data, dict) and isinstance(data.get("items"), list):
+        items = data["items"]
+    else:
+        items = [data]
+    if not items:
+        raise ValueError("Provide at least one item")
+
+    quantities = {}
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Each item must be an object with 'product' and 'quantity'")
+        try:
+            product, quantity = item["product"], parse_whole_number(item["quantity"])
+        except KeyError as e:
+            raise ValueError(f"Provide key(s) {e}")
+        except (TypeError, ValueError):
+            raise ValueError("'quantity' must be a whole number")
+        if not isinstance(product, str):
+            raise ValueError("'product' must be a product title")
+        if quantity < 1:
+            raise ValueError("'quantity' must be at least 1")
+        quantities[product] = quantities.get(product, 0) + quantity
+    return quantities
+
+
+def upsert_increment(objs, unique_fields, increment_fields, update_fields=()):
+    """
+        Insert `objs` (unsaved instances of one model), or for those conflicting on `unique_fields`
+        add their `increment_fields` to the stored row and overwrite its `update_fields`. Returns
+        the resulting rows as instances, in the order of `objs`.
+    """
+    if not objs:
+        return []
+    model = type(objs[0])
+    using = router.db_for_write(model)
+    connection = connections[using]
+    if connection.vendor not in ("postgresql", "sqlite"):
+        return upsert_increment_per_row(objs, unique_fields, increment_fields, update_fields, using)
+
+    opts = model._meta
+    quote = connection.ops.quote_name
+    # the auto primary key is left to the database, as bulk_create does
+    fields = [field for field in opts.concrete_fields if field is not opts.pk or not field.db_returning]
+    table = quote(opts.db_table)
+
+    def column(name):
+        return quote(opts.get_field(name).column)
+
+    params = []
+    for obj in objs:
+        params.extend(field.get_db_prep_save(field.pre_save(obj, True), connection) for field in fields)
+    row = "(%s)" % ", ".join(["%s"] * len(fields))
+    assignments = [f"{column(name)} = {table}.{column(name)} + EXCLUDED.{column(name)}" for name in increment_fields]
+    assignments += [f"{column(name)} = EXCLUDED.{column(name)}" for name in update_fields]
+    returning = opts.concrete_fields
+    sql = (
+        f"INSERT INTO {table} ({', '.join(quote(field.column) for field in fields)}) "
+        f"VALUES {', '.join([row] * len(objs))} "
+        f"ON CONFLICT ({', '.join(column(name) for name in unique_fields)}) DO UPDATE SET {', '.join(assignments)} "
+        f"RETURNING {', '.join(f'{table}.{quote(field.column)}' for field in returning)}"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+
+    converters = []
+    for index, field in enumerate(returning):
+        col = field.get_col(opts.db_table)
+        converters.append((index, connection.ops.get_db_converters(col) + col.get_db_converters(connection), col))
+    instances = {}
+    attnames = [field.attname for field in returning]
+    for values in rows:
+        values = list(values)
+        for index, functions, col in converters:
+            for convert in functions:
+                values[index] = convert(values[index], col, connection)
+        instance = model.from_db(using, attnames, values)
+        instances[tuple(getattr(instance, opts.get_field(name).attname) for name in unique_fields)] = instance
+    return [instances[tuple(getattr(obj, opts.get_field(name).attname) for name in unique_fields)] for obj in objs]
+
+
+def upsert_increment_per_row(objs, unique_fields, increment_fields, update_fields, using):
+    model = type(objs[0])
+    opts = model._meta
+    instances = []
+    with transaction.atomic(using=using):
+        for obj in objs:
+            for name in update_fields:
+                opts.get_field(name).pre_save(obj, True)
+            lookup = {opts.get_field(name).attname: getattr(obj, opts.get_field(name).attname) for name in unique_fields}
+            changes = {name: F(name) + getattr(obj, name) for name in increment_fields}
+            changes.update({name: getattr(obj, name) for name in update_fields})
+            if not model.objects.using(using).filter(**lookup).update(**changes):
+                obj.save(using=using, force_insert=True)
+            instances.append(model.objects.using(using).get(**lookup))
+    return instances
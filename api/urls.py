@@ -5,13 +5,26 @@ app_name = "ecommerce_api"
 
 urlpatterns = [
     path("users/", views.UsersView.as_view(), name="users-view"),
+    path("products/search/", views.ProductSearchView.as_view(), name="product-search"),
+    path("products/reprice/", views.ProductRepriceView.as_view(), name="product-reprice"),
+    path("products/import/", views.ProductImportView.as_view(), name="product-import"),
+    path("products/retag/", views.ProductRetagView.as_view(), name="product-retag"),
+    path("products/tags/", views.TagsView.as_view(), name="tags"),
     re_path("products/(?:(?P<pk>\d+)/)?$", views.ProductsView.as_view(), name="products"),
+    path("products/<int:pk>/reviews/", views.ProductReviewsView.as_view(), name="product-reviews"),
+    path("products/<int:pk>/related/", views.ProductRelatedView.as_view(), name="product-related"),
     path("products/categories/<int:pk>/", views.CategoryDetailView.as_view(), name="category-detail"),
     path("products/categories/", views.CategoryListViews.as_view(), name="category-list"),
     re_path("products/reviews/(?:(?P<pk>\d+)/)?$", views.ReviewView.as_view(), name="review"),
     path("orders/<int:pk>/", views.OrderDetailView.as_view(), name="order-detail"),
+    path("orders/history/", views.OrderHistoryView.as_view(), name="order-history"),
+    path("orders/sales/", views.SalesReportView.as_view(), name="sales-report"),
+    path("exports/<str:name>/", views.ExportView.as_view(), name="export"),
     path("orders/", views.OrdersListView.as_view(), name="order-list"),
     path("order-lines/", views.OrderLinesView.as_view(), name="order-lines"),
+    path("cache/stats/", views.CacheStatsView.as_view(), name="cache-stats"),
+    path("carts/summary/", views.CartSummaryView.as_view(), name="cart-summary"),
+    path("carts/checkout/", views.CheckoutView.as_view(), name="cart-checkout"),
     path("carts/", views.CartsView.as_view(), name="carts-list"),
     path("cart-items/", views.CartItemsView.as_view(), name="cart-items"),
 ]
@@ -2,26 +2,46 @@ try:
     from rest_framework.views import APIView
     from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser, BasePermission
     from src.user.models import CustomUser
-    from src.product.models import Products, Categories, Reviews
-    from src.cart.models import Carts, CartItems
-    from src.order.models import Orders, OrderLines
+    from src.product.models import Products, Categories, Reviews, Tags
+    from src.product.tags import filter_tagged, retag
+    from src.product.search import search_products
+    from src.product.importers import IMPORT_FORMATS, ProductImporter
+    import io
+    from src.cart.models import Carts, CartItems, touch_cart
+    from src.cart.summary import cart_summary
+    from src.order.models import Orders, OrderLines, ArchivedOrders, DailySales, ProductDailySales, CategoryDailySales
+    from src.order.totals import refresh_order_totals
     from rest_framework import generics
     from .serializers import (
         CustomUserSerializer,
         ReviewsSerializer,
+        ReviewFeedSerializer,
         OrdersSerializer,
         OrderLinesSerializer,
+        OrderWithLinesSerializer,
         CartsSerializer,
         CartItemsSerializer,
         CategoriesSerializer,
         ProductsSerializer,
+        TagsSerializer,
     )
     from rest_framework.response import Response
     from rest_framework import status
     from django.utils.datastructures import MultiValueDictKeyError
+    from django.http import StreamingHttpResponse
+    from django.db.models import Sum
     from django.core.exceptions import ObjectDoesNotExist, MultipleObjectsReturned
     from django.db.utils import IntegrityError
     from .permissions import IsPostOrIsAuthenticated
+    from .pagination import KeysetPagination, has_filters
+    from .compiled import serialize_instances, serialize_page, serialize_queryset
+    from .filters import filter_products, get_date_param, product_facets
+    from .upserts import parse_quantities, upsert_increment
+    from .cart_store import get_cart_store
+    from .checkout import CheckoutError, checkout
+    from .exports import CONTENT_TYPES, EXPORT_FORMATS, EXPORTS, export_filename, stream_export
+    from .cache import bump_version, cached_response, cached_value, get_stats
+    from .conditional import conditional_get, list_validators, object_validators
     from rest_framework.exceptions import PermissionDenied
     from django.http import HttpResponseForbidden
     from drf_spectacular.utils import extend_schema
@@ -46,7 +66,7 @@ class UsersView(APIView):
         if pk != None:
             try:
                 user = CustomUser.objects.get(pk=pk)
-                serializer = CustomUserSerializer(user)
+                serializer = CustomUserSerializer(user, context={"request": request})
                 return Response(serializer.data, status=status.HTTP_200_OK)
             except CustomUser.DoesNotExist:
                 return Response(
@@ -54,7 +74,7 @@ class UsersView(APIView):
                     status=status.HTTP_404_NOT_FOUND,
                 )
         else:
-            if request.query_params:
+            if has_filters(request):
                 if "username" in request.query_params:
                     try:
                         username = request.query_params["username"]
@@ -70,12 +90,12 @@ class UsersView(APIView):
                     except ObjectDoesNotExist:
                         return Response({"error": f"User ID '{user_id}' does not exist"}, status=status.HTTP_400_BAD_REQUEST)
                     
-                serializer = CustomUserSerializer(user)
+                serializer = CustomUserSerializer(user, context={"request": request})
                 return Response(serializer.data, status=status.HTTP_200_OK)
         
-        users = CustomUser.objects.all()
-        serializer = CustomUserSerializer(users, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, CustomUser.objects.all(), CustomUserSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
 
     @extend_schema(responses=CustomUserSerializer, request=None)
     def post(self, request, *args, **kwargs):
@@ -99,7 +119,7 @@ class UsersView(APIView):
             return Response({"error": f"{e}"})
         user.save()
         
-        serializer = CustomUserSerializer(user)
+        serializer = CustomUserSerializer(user, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete(self, request, *args, **kwargs):
@@ -125,14 +145,17 @@ class ProductsView(APIView):
     # permission_classes = [AllowAny]
 
     @extend_schema(responses=ProductsSerializer, request=None)
+    @conditional_get
+    # the facets embed category names
+    @cached_response(Products, Categories)
     def get(self, request, pk=None, *args, **kwargs):
         """
             Get a list of products or a single product by providing the product's 'id' or 'title' as a query parameter
         """
         if pk != None:
             try:
-                product = Products.objects.get(pk=pk)
-                serializer = ProductsSerializer(product)
+                product = ProductsSerializer.prepare_queryset(Products.objects.all(), request).get(pk=pk)
+                serializer = ProductsSerializer(product, context={"request": request})
                 return Response(serializer.data, status=status.HTTP_200_OK)
             except Products.DoesNotExist:
                 return Response(
@@ -143,14 +166,50 @@ class ProductsView(APIView):
             try:
                 product_name = request.query_params["title"]
                 product = Products.objects.get(title=product_name)
-                serializer = ProductsSerializer(product)
+                serializer = ProductsSerializer(product, context={"request": request})
 
                 return Response(serializer.data, status=status.HTTP_200_OK)
             except:
-                products = Products.objects.all()
-                serializer = ProductsSerializer(products, many=True)
+                return self.list(request)
 
-                return Response(serializer.data, status=status.HTTP_200_OK)
+    def get_validators(self, request, pk=None, *args, **kwargs):
+        if ProductsSerializer.get_expanded_fields(request):
+            # expansions change with their own rows, which products' updated_at doesn't follow
+            return None
+        if pk != None:
+            return object_validators(request, Products.objects.all(), pk)
+        if "title" in request.query_params:
+            return list_validators(request, Products.objects.filter(title=request.query_params["title"]))
+        try:
+            return list_validators(request, self.filter_queryset(request), related=[Categories.objects.all()])
+        except ValueError:
+            return None
+
+    def filter_queryset(self, request):
+        return filter_products(Products.objects.all(), request.query_params)
+
+    def list(self, request):
+        """
+            Paginated products. Sort by what the customer pays with 'ordering=price' (or '-price') and
+            narrow it with 'category', 'min_price'/'max_price', 'discount_type' and 'tag' (see api/filters.py).
+            The first page also carries the facet counts of the filtered products
+        """
+        try:
+            products = self.filter_queryset(request)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        ordering = None
+        if request.query_params.get("ordering") in ("price", "-price"):
+            ordering = [request.query_params["ordering"].replace("price", "effective_price")]
+
+        paginator = KeysetPagination(ordering=ordering)
+        data = serialize_page(paginator, products, ProductsSerializer, request, view=self)
+        response = paginator.get_paginated_response(data)
+        if not paginator.has_cursor:
+            # later pages page through the same result set, the client already has its facets
+            response.data["facets"] = product_facets(products)
+        return response
 
     @extend_schema(responses=ProductsSerializer, request=None)
     def post(self, request, *args, **kwargs):
@@ -175,7 +234,7 @@ class ProductsView(APIView):
                 discount_value=product_data["discount_value"],
             )
             product.save()
-            serializer = ProductsSerializer(product)
+            serializer = ProductsSerializer(product, context={"request": request})
 
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         except Exception as e:
@@ -217,32 +276,221 @@ class ProductsView(APIView):
         )
 
 
+class ProductRepriceView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=None, request=None)
+    def post(self, request, *args, **kwargs):
+        """
+            Apply a discount rule ('discount_type', 'discount_value') to every product of a 'category' (id or name, subcategories
+            included) and/or carrying a 'tag', in a single UPDATE. This action requires an admin user
+        """
+        data = request.data
+        discount_type = str(data.get("discount_type", "")).lower()
+        if discount_type not in dict(Products.discount_type_options):
+            return Response({"error": f"'discount_type' must be one of {list(dict(Products.discount_type_options))}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            discount_value = float(data.get("discount_value", 0))
+        except (TypeError, ValueError):
+            return Response({"error": "'discount_value' must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not data.get("category") and not data.get("tag"):
+            return Response({"error": "Provide a 'category' and/or a 'tag' to select the products to reprice."}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = Products.objects.all()
+        if data.get("category"):
+            category = data["category"]
+            try:
+                lookup = {"pk": int(category)} if str(category).isdigit() else {"name": category}
+                category = Categories.objects.get(**lookup)
+            except Categories.DoesNotExist:
+                return Response({"error": f"Category '{data['category']}' not found"}, status=status.HTTP_404_NOT_FOUND)
+            products = products.filter(category__path__startswith=category.path)
+        if data.get("tag"):
+            products = filter_tagged(products, [data["tag"]])
+
+        updated = products.reprice(discount_type, discount_value)
+        bump_version(Products)
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+
+class ProductRetagView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=None, request=None)
+    def post(self, request, *args, **kwargs):
+        """
+            Bulk retag: 'add' and/or 'remove' tags (lists or space separated) on the products listed in 'ids', carrying
+            a 'tag', or of a 'category' (id or name, subcategories included). This action requires an admin user
+        """
+        data = request.data
+
+        def tag_list(value):
+            return " ".join(value) if isinstance(value, (list, tuple)) else str(value or "")
+
+        add, remove = tag_list(data.get("add")), tag_list(data.get("remove"))
+        if not add.strip() and not remove.strip():
+            return Response({"error": "Provide tags to 'add' and/or 'remove'."}, status=status.HTTP_400_BAD_REQUEST)
+        if not any(data.get(key) for key in ("ids", "tag", "category")):
+            return Response({"error": "Provide 'ids', a 'tag' and/or a 'category' to select the products to retag."}, status=status.HTTP_400_BAD_REQUEST)
+
+        products = Products.objects.all()
+        if data.get("ids"):
+            ids = data["ids"].split(",") if isinstance(data["ids"], str) else data["ids"]
+            try:
+                products = products.filter(pk__in=[int(pk) for pk in ids])
+            except (TypeError, ValueError):
+                return Response({"error": "'ids' must be a list of product ids"}, status=status.HTTP_400_BAD_REQUEST)
+        if data.get("tag"):
+            products = filter_tagged(products, [data["tag"]])
+        if data.get("category"):
+            products = filter_products(products, {"category": str(data["category"])})
+
+        try:
+            updated = retag(products, add=[add], remove=[remove])
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            bump_version(Products)
+        return Response({"updated": updated}, status=status.HTTP_200_OK)
+
+
+class TagsView(APIView):
+    @extend_schema(responses=TagsSerializer, request=None)
+    def get(self, request, *args, **kwargs):
+        """
+            List the tags, or look them up by prefix with 'q'
+        """
+        tags = Tags.objects.all()
+        if request.query_params.get("q"):
+            tags = tags.filter(name__startswith=request.query_params["q"].strip().lower())
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, tags, TagsSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
+
+
+class ProductImportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    @extend_schema(responses=None, request=None)
+    def post(self, request, *args, **kwargs):
+        """
+            Bulk import (upsert on title) products from an uploaded CSV or JSON Lines 'file'. The 'format' is taken from the file
+            extension unless given; 'batch_size' rows are written per statement. Invalid rows are reported by line and skipped.
+            This action requires an admin user
+        """
+        upload = request.FILES.get("file")
+        if upload is None:
+            return Response({"error": "Upload the products as 'file'"}, status=status.HTTP_400_BAD_REQUEST)
+
+        input_format = request.data.get("format") or {"csv": "csv", "jsonl": "jsonl", "ndjson": "jsonl"}.get(upload.name.rsplit(".", 1)[-1].lower())
+        if input_format not in IMPORT_FORMATS:
+            return Response({"error": f"Provide 'format' as one of {list(IMPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            batch_size = max(1, int(request.data.get("batch_size", 1000)))
+        except ValueError:
+            return Response({"error": "'batch_size' must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+
+        importer = ProductImporter(batch_size=batch_size)
+        try:
+            report = importer.run(io.TextIOWrapper(upload.file, encoding="utf-8", newline=""), input_format)
+        except UnicodeDecodeError:
+            return Response({"error": "The file must be UTF-8 encoded"}, status=status.HTTP_400_BAD_REQUEST)
+        finally:
+            bump_version(Products)
+        return Response(report.as_dict(), status=status.HTTP_200_OK)
+
+
+class ProductSearchView(APIView):
+    max_limit = 100
+
+    @extend_schema(responses=ProductsSerializer, request=None)
+    @cached_response(Products, Categories)
+    def get(self, request, *args, **kwargs):
+        """
+            Full-text search over the products' title, summary, description, tags and category name. Provide 'q' (and optionally 'limit') as query parameters
+        """
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"error": "Provide 'q' as key with a value to search for products."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = int(request.query_params.get("limit", 20))
+        except ValueError:
+            return Response({"error": "'limit' must be a number"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(limit, self.max_limit))
+
+        results = serialize_queryset(search_products(query, limit=limit), ProductsSerializer, request)
+        return Response({"query": query, "results": results}, status=status.HTTP_200_OK)
+
+
 class CategoryListViews(APIView):
     # permission_classes = [AllowAny]
 
     @extend_schema(responses=CategoriesSerializer, request=None)
+    @cached_response(Categories, Products)
     def get(self, request, pk=None, *args, **kwargs):
         """
-            Get a list of categories or a single category by providing the category's 'id'
+            Get a list of categories or a single category by providing the category's 'name' (add 'breadcrumbs' for its ancestors).
+            Add 'tree' for the nested category tree (rooted at 'name' if given), or 'subtree' with a category name for the
+            products of that category and all of its subcategories
         """
         # print(request.user)
         
-        if request.query_params:
+        if "tree" in request.query_params:
+            return self.get_tree(request)
+        if "subtree" in request.query_params:
+            return self.get_subtree_products(request)
+
+        if has_filters(request):
             if "name" in request.query_params:
                 category_name = request.query_params.get("name")
                 try:
                     category = Categories.objects.get(name=category_name)
-                    serializer = CategoriesSerializer(category)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
+                    serializer = CategoriesSerializer(category, context={"request": request})
+                    data = serializer.data
+                    if "breadcrumbs" in request.query_params:
+                        data["breadcrumbs"] = list(category.get_ancestors().values("id", "name", "slug"))
+                    return Response(data, status=status.HTTP_200_OK)
                 except Categories.DoesNotExist:
                     return Response({"message": f"Category with name '{category_name}' not found."}                    )
             else:
                 return Response({"message", "Provide 'name' as key with a value to query for an item."}, status=status.HTTP_400_BAD_REQUEST)
 
-        category = Categories.objects.all()
-        serializer = CategoriesSerializer(category, many=True)
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, Categories.objects.all(), CategoriesSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
+
+    def get_tree(self, request):
+        """
+            Nest the categories in one query: ordering by depth puts every parent before its children
+        """
+        categories = Categories.objects.all()
+        if "name" in request.query_params:
+            category_name = request.query_params.get("name")
+            try:
+                categories = Categories.objects.get(name=category_name).get_descendants(include_self=True)
+            except Categories.DoesNotExist:
+                return Response({"message": f"Category with name '{category_name}' not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        nodes = {}
+        tree = []
+        for category in CategoriesSerializer(categories.order_by("depth", "name"), many=True).data:
+            node = nodes[category["id"]] = {**category, "subcategories": []}
+            parent = nodes.get(category["parent_category"])
+            (parent["subcategories"] if parent else tree).append(node)
+        return Response(tree, status=status.HTTP_200_OK)
+
+    def get_subtree_products(self, request):
+        category_name = request.query_params.get("subtree")
+        try:
+            category = Categories.objects.get(name=category_name)
+        except Categories.DoesNotExist:
+            return Response({"message": f"Category with name '{category_name}' not found."}, status=status.HTTP_404_NOT_FOUND)
 
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        products = Products.objects.filter(category__path__startswith=category.path)
+        data = serialize_page(paginator, products, ProductsSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
 
     @extend_schema(responses=CategoriesSerializer, request=None)
     def post(self, request, *args, **kwargs):
@@ -268,7 +516,7 @@ class CategoryListViews(APIView):
             return Response({"error": f"{e}"}, status=status.HTTP_409_CONFLICT)
 
         category.save()
-        serializer = CategoriesSerializer(category)
+        serializer = CategoriesSerializer(category, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     def delete(self, request, *args, **kwargs):
@@ -289,14 +537,19 @@ class CategoryListViews(APIView):
 
 
 class CategoryDetailView(APIView):
+    def get_validators(self, request, pk=None, *args, **kwargs):
+        return object_validators(request, Categories.objects.all(), pk)
+
     @extend_schema(responses=CategoriesSerializer, request=None)
+    @conditional_get
+    @cached_response(Categories)
     def get(self, request, pk=None, *args, **kwargs):
         """
             Get a single category by providing the category's 'id'
         """
         try:
             category = Categories.objects.get(id=pk)
-            serializer = CategoriesSerializer(category)
+            serializer = CategoriesSerializer(category, context={"request": request})
             return Response(serializer.data, status=status.HTTP_200_OK)
         except:
             return Response({"message": f"Category with id {pk} not found"},status=status.HTTP_404_NOT_FOUND,)
@@ -315,13 +568,62 @@ class CategoryDetailView(APIView):
         return Response({"success": "Category item deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
         
 
-class ReviewView(APIView):
+class ReviewFeedMixin:
+    def review_feed(self, request, product_title):
+        """
+            A product's reviews, newest first, keyset paginated on the (product, -created_at, -id) index
+            (or (product, rating, -created_at, -id) when filtered by 'rating'), reviewers joined in
+        """
+        reviews = Reviews.objects.filter(product_id=product_title).select_related("user")
+        if request.query_params.get("rating"):
+            ratings = {rating.strip().lower() for rating in request.query_params["rating"].split(",")}
+            unknown = ratings - set(Reviews.rating_scale)
+            if unknown:
+                return Response({"error": f"'rating' must be one of {list(Reviews.rating_scale)}"}, status=status.HTTP_400_BAD_REQUEST)
+            reviews = reviews.filter(rating__in=ratings)
+
+        paginator = KeysetPagination(ordering=["-created_at", "-id"])
+        data = serialize_page(paginator, reviews, ReviewFeedSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
+
+
+class ProductReviewsView(ReviewFeedMixin, APIView):
+    @extend_schema(responses=ReviewFeedSerializer, request=None)
+    def get(self, request, pk=None, *args, **kwargs):
+        """
+            Get the reviews of a product, newest first. Narrow them with 'rating' (comma separated)
+        """
+        title = Products.objects.filter(pk=pk).values_list("title", flat=True).first()
+        if title is None:
+            return Response({"message": f"Product with id {pk} not found"}, status=status.HTTP_404_NOT_FOUND)
+        return self.review_feed(request, title)
+
+
+class ProductRelatedView(APIView):
+    @extend_schema(responses=ProductsSerializer, request=None)
+    @cached_response(Products, per_object=False)
+    def get(self, request, pk=None, *args, **kwargs):
+        """
+            Get the products frequently bought together with a product, best match first, as computed by the
+            'build_related_products' job
+        """
+        # one read of the serving table's (product, rank) index, joined to the products
+        related = Products.objects.filter(related_to__product_id=pk).order_by("related_to__rank")
+        results = serialize_queryset(related, ProductsSerializer, request)
+        if not results and not Products.objects.filter(pk=pk).exists():
+            return Response({"message": f"Product with id {pk} not found"}, status=status.HTTP_404_NOT_FOUND)
+        return Response({"product": pk, "results": results}, status=status.HTTP_200_OK)
+
+
+class ReviewView(ReviewFeedMixin, APIView):
     # permission_classes = [AllowAny]
 
     @extend_schema(responses=ReviewsSerializer, request=None)
+    @cached_response(Reviews)
     def get(self, request, pk=None, *args, **kwargs):
         """
-            Get a list of reviews or a single review by providing the review's 'id' or 'product' as a query parameter
+            Get a list of reviews or a single review by providing the review's 'id', or the reviews of a product by
+            providing its title as 'product' (see products/<id>/reviews/)
         """
         if pk != None:
             try:
@@ -332,23 +634,22 @@ class ReviewView(APIView):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
 
-        elif request.query_params:
+        elif has_filters(request):
             if "product" in request.query_params:
                 product_name = request.query_params.get("product")
-                try:
-                    review = Reviews.objects.get(product=product_name)
-                except ObjectDoesNotExist:
+                if not Products.objects.filter(title=product_name).exists():
                     return Response({"error": f"Invalid product name '{product_name}'"}, status=status.HTTP_400_BAD_REQUEST)
+                return self.review_feed(request, product_name)
             else:
                 return Response({"error": f"Provide 'name' as key with a value (Category name) to select a product."}, status=status.HTTP_400_BAD_REQUEST)
 
-        if pk or request.query_params:
-            serializer = ReviewsSerializer(review)
+        if pk or has_filters(request):
+            serializer = ReviewsSerializer(review, context={"request": request})
             return Response(serializer.data, status=status.HTTP_200_OK)
 
-        reviews = Reviews.objects.all()
-        serializer = ReviewsSerializer(reviews, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, Reviews.objects.all(), ReviewsSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
 
     @extend_schema(responses=ReviewsSerializer, request=None)
     def post(self, request, *args, **kwargs):
@@ -372,10 +673,20 @@ class ReviewView(APIView):
             )
         review.save()
 
-        serializer = ReviewsSerializer(review)
+        serializer = ReviewsSerializer(review, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
+class CacheStatsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        """
+            Hit and miss counters of the catalog response cache. This action requires an admin user
+        """
+        return Response(get_stats(), status=status.HTTP_200_OK)
+
+
 class OrdersListView(APIView):
     # permission_classes = [AllowAny]
     
@@ -391,63 +702,154 @@ class OrdersListView(APIView):
         
         order = Orders.objects.create(user=username)
         order.save()
-        serializer = OrdersSerializer(order)
+        serializer = OrdersSerializer(order, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
-    @extend_schema(responses=OrdersSerializer, request=None)
+    @extend_schema(responses=OrderWithLinesSerializer, request=None)
     def get(self, request, pk=None, *args, **kwargs):
         """
-            Get a list of orders or a single order by providing the  owner's'username' as a query parameter
+            Get a list of orders, or the orders of a user by providing the owner's 'username' as a query parameter
         """
-        if request.query_params:
+        orders = Orders.objects.all()
+        if has_filters(request):
             if "username" in request.query_params:
-                username = request.query_params.get("username")
-                try:
-                    order = Orders.objects.get(user=username)
-                    serializer = ReviewsSerializer(order)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
-                except ObjectDoesNotExist:
-                    return Response({"error": f"Invalid username name '{username}'"}, status=status.HTTP_400_BAD_REQUEST)
+                orders = orders.filter(user__username=request.query_params.get("username"))
             else:
                 return Response({"error": f"Provide 'username' as key with a value (user's username) to select a review."}, status=status.HTTP_400_BAD_REQUEST)
 
-        orders = Orders.objects.all()
-        serializer = OrdersSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, orders, OrderWithLinesSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
     
     def delete(self, request, pk=None, *args, **kwargs):
         """
-            Delete an order by providing the owner's 'username' as a query parameter
+            Delete the orders of a user by providing the owner's 'username' as a query parameter
         """
         
         if request.query_params:
             if "username" in request.query_params:
                 username = request.query_params.get("username")
-                try:
-                    order = Orders.objects.get(user=username)
-                    order.delete()
-                    return Response({"message": "Order deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
-                except ObjectDoesNotExist:
+                deleted, _ = Orders.objects.filter(user__username=username).delete()
+                if not deleted:
                     return Response({"error": f"Invalid username name '{username}'"}, status=status.HTTP_400_BAD_REQUEST)
+                return Response({"message": "Order deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
             else:
                 return Response({"error": f"Provide 'username' as key with a value (user's username) to select a review."}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response({"message": "Provide a username or and ID to delete an order"}, status=status.HTTP_200_OK)
 
 
+class OrderHistoryView(APIView):
+    @extend_schema(responses=OrderWithLinesSerializer, request=None)
+    def get(self, request, *args, **kwargs):
+        """
+            Get your orders, newest first, each with its lines. Archived orders follow the recent ones
+        """
+        # a range of the (user, -created_at, -id) index, plus one query for the lines of the whole page;
+        # the archive (older than every current order, same index) is only read past the last current order
+        orders = Orders.objects.filter(user=request.user)
+        archived = ArchivedOrders.objects.filter(user=request.user)
+        paginator = KeysetPagination(ordering=["-created_at", "-id"])
+        data = serialize_page(paginator, orders, OrderWithLinesSerializer, request, view=self, continuations=[archived])
+        return paginator.get_paginated_response(data)
+
+
+class SalesReportView(APIView):
+    permission_classes = [IsAdminUser]
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        """
+            Sales (units, revenue, distinct orders) per 'day', 'product' or 'category' (as 'by'), between the dates
+            'from' and 'to' (inclusive), read from the daily rollups kept by the 'refresh_sales_rollups' command.
+            Narrow them to a 'product' or 'category' id
+        """
+        by = request.query_params.get("by", "day")
+        if by not in ("day", "product", "category"):
+            return Response({"error": "'by' must be one of 'day', 'product' or 'category'"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = get_date_param(request.query_params, "from"), get_date_param(request.query_params, "to")
+            ids = {}
+            for name in ("limit", "product", "category"):
+                try:
+                    ids[name] = int(request.query_params[name]) if request.query_params.get(name) else None
+                except ValueError:
+                    raise ValueError(f"'{name}' must be a number")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        limit = max(1, min(ids["limit"] or 100, self.max_limit))
+        product, category = ids["product"], ids["category"]
+        if product is not None and category is not None:
+            return Response({"error": "Narrow to a 'product' or a 'category', not both"}, status=status.HTTP_400_BAD_REQUEST)
+        if (product is not None and by == "category") or (category is not None and by == "product"):
+            return Response({"error": f"Sales by {by} can't be narrowed to a {'product' if product is not None else 'category'}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if product is not None:
+            rows = ProductDailySales.objects.filter(product_id=product)
+        elif category is not None:
+            rows = CategoryDailySales.objects.filter(category_id=category)
+        else:
+            rows = {"day": DailySales, "product": ProductDailySales, "category": CategoryDailySales}[by].objects.all()
+        if start is not None:
+            rows = rows.filter(day__gte=start)
+        if end is not None:
+            rows = rows.filter(day__lte=end)
+
+        totals = {"units": Sum("units"), "revenue": Sum("revenue"), "orders": Sum("orders")}
+        if by == "day":
+            results = rows.values("day").annotate(**totals).order_by("day")
+        else:
+            group = f"{by}_id"
+            results = rows.values(group).annotate(**totals).order_by("-revenue", group)
+        results = [
+            {by if name in ("product_id", "category_id") else name: value for name, value in row.items()}
+            for row in results[:limit]
+        ]
+        return Response({"by": by, "from": start, "to": end, "results": results}, status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name, *args, **kwargs):
+        """
+            Stream the export 'name' (orders, order-lines, products or users) 'as' csv or ndjson for
+            the dates 'from' to 'to' (inclusive), gzip-compressed with 'gzip=1'. ('format' is
+            taken by DRF's content negotiation.)
+        """
+        if name not in EXPORTS:
+            return Response({"error": f"Unknown export '{name}'"}, status=status.HTTP_404_NOT_FOUND)
+        output_format = request.query_params.get("as", "csv")
+        if output_format not in EXPORT_FORMATS:
+            return Response({"error": f"'as' must be one of {', '.join(EXPORT_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            start, end = get_date_param(request.query_params, "from"), get_date_param(request.query_params, "to")
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        compress = request.query_params.get("gzip") in ("1", "true")
+        response = StreamingHttpResponse(
+            stream_export(name, output_format, start, end, compress),
+            content_type="application/gzip" if compress else CONTENT_TYPES[output_format],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{export_filename(name, output_format, compress)}"'
+        return response
+
+
 class OrderDetailView(APIView):
-    @extend_schema(responses=ReviewsSerializer, request=None)
-    def get(self, pk=None):
+    @extend_schema(responses=OrderWithLinesSerializer, request=None)
+    def get(self, request, pk=None, *args, **kwargs):
         """
-            List or retireve an Order by providing the id of the associated Order
+            Retrieve an Order (current or archived), with its lines, by providing the id of the associated Order
         """
         if pk != None:
-            try:
-                order = Orders.objects.get(id=pk)
-                serializer = ReviewsSerializer(order)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            except ObjectDoesNotExist:
-                return Response({"error": f"You provided an invalid id '{pk}.'"}, status=status.HTTP_400_BAD_REQUEST)
+            # archived orders keep their ids, look there once the current orders miss
+            for orders in (Orders.objects.all(), ArchivedOrders.objects.all()):
+                order = OrderWithLinesSerializer.prepare_queryset(orders, request).filter(id=pk).first()
+                if order is not None:
+                    serializer = OrderWithLinesSerializer(order, context={"request": request})
+                    return Response(serializer.data, status=status.HTTP_200_OK)
+            return Response({"error": f"You provided an invalid id '{pk}.'"}, status=status.HTTP_400_BAD_REQUEST)
     
     def delete(self, request, pk=None, *args, **kwargs):
         """
@@ -469,35 +871,45 @@ class OrderLinesView(APIView):
     @extend_schema(responses=OrderLinesSerializer, request=None)
     def post(self, request, *args, **kwargs):
         """
-            Added an item to you Order
+            Add an item ("product" title and "quantity") to your latest Order (or the one given as "order"), or several as
+            a list or as "items". A product already in the order has its quantity increased
         """
         
-        try:
-            order = Orders.objects.get(user=request.user)
-        except ObjectDoesNotExist:
+        # the order given as 'order', or the user's latest one
+        orders = Orders.objects.filter(user=request.user)
+        if not isinstance(request.data, list) and request.data.get("order"):
+            try:
+                orders = orders.filter(id=int(request.data["order"]))
+            except (TypeError, ValueError):
+                return Response({"error": "'order' must be an order id"}, status=status.HTTP_400_BAD_REQUEST)
+        order = orders.order_by("-created_at", "-id").first()
+        if order is None:
             return Response({"error": f"Order hasn't been created by user '{request.user}'"}, status=status.HTTP_404_NOT_FOUND)
-        
-        try:
-            product = Products.objects.get(title=request.data["product"])
-        except ObjectDoesNotExist:
-            return Response({"error": f"Product '{request.data['product']}' not found"}, status=status.HTTP_404_NOT_FOUND)
 
         try:
-            orderLine = OrderLines.objects.create(
-                order=order,
-                product=product,
-                price=product.price,
-                quantity=request.data["quantity"]
-            )
-        except KeyError as e:
-            return Response({"error": f"Provide key(s) {e}"}, status=status.HTTP_400_BAD_REQUEST)
-        except IntegrityError:
-            orderLine = OrderLines.objects.get(order=order, product=product)
-            orderLine.quantity += int(request.data["quantity"])
-            orderLine.save()
+            quantities = parse_quantities(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        # the price paid, after discount, like checkout
+        prices = dict(Products.objects.filter(title__in=quantities).values_list("title", "effective_price"))
+        missing = [title for title in quantities if title not in prices]
+        if missing:
+            return Response({"error": f"Product '{missing[0]}' not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        serializer = OrderLinesSerializer(orderLine)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        orderLines = upsert_increment(
+            [
+                OrderLines(order=order, product_id=title, price=prices[title], quantity=quantity)
+                for title, quantity in quantities.items()
+            ],
+            unique_fields=["order", "product"],
+            increment_fields=["quantity"],
+        )
+        # the raw upsert sends no signals
+        refresh_order_totals([order.id])
+        data = serialize_instances(orderLines, OrderLinesSerializer, request)
+        if not isinstance(request.data, list) and "items" not in request.data:
+            data = data[0]
+        return Response(data, status=status.HTTP_201_CREATED)
 
     @extend_schema(responses=OrderLinesSerializer, request=None)
     def get(self, request, *args, **kwargs):
@@ -505,32 +917,30 @@ class OrderLinesView(APIView):
             List or retrieve an Order Item (Line) 
         """
         
-        if request.query_params:
+        if has_filters(request):
             if "product" in request.query_params:
                 product_name = request.query_params['product']
                 
                 try:
                     # product = Products.objects.get(title=product_name).id
-                    orderLines = OrderLines.objects.filter(product=product_name)
-                    
-                    many = orderLines.count() > 1
-                    serializer = OrderLinesSerializer(orderLines, many=many)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
+                    paginator = KeysetPagination()
+                    orderLines = paginator.paginate_queryset(OrderLines.objects.filter(product=product_name), request, view=self)
+                    serializer = OrderLinesSerializer(orderLines, many=True, context={"request": request})
+                    return paginator.get_paginated_response(serializer.data)
 
                 except Products.DoesNotExist:
                     return Response({"error": f"Product with title '{product_name}' does not exist."}, status=status.HTTP_404_NOT_FOUND)
                     
-                serializer = OrderLinesSerializer(product_name)
+                serializer = OrderLinesSerializer(product_name, context={"request": request})
                 return Response(serializer.data, status=status.HTTP_200_OK)
             
             else:
                 keys = [key for key in request.query_params.keys()]
                 return Response({"error": f"Provide key(s) '{keys}'"}, status=status.HTTP_400_BAD_REQUEST)
         else:
-            orderLines = OrderLines.objects.all()
-            serializer = OrderLinesSerializer(orderLines, many=True)
-            
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            paginator = KeysetPagination()
+            data = serialize_page(paginator, OrderLines.objects.all(), OrderLinesSerializer, request, view=self)
+            return paginator.get_paginated_response(data)
         
     def delete(self, request, format=None):
         """
@@ -570,7 +980,7 @@ class CartsView(APIView):
         except IntegrityError:
             return Response({"error": f"Cart already exist for user '{created_by}'"})
         cart.save()
-        serializer = CartsSerializer(cart)
+        serializer = CartsSerializer(cart, context={"request": request})
         return Response(serializer.data, status=status.HTTP_201_CREATED)
     
     @extend_schema(responses=CartsSerializer, request=None)
@@ -578,7 +988,7 @@ class CartsView(APIView):
         """
             List or retrieve a cart by providing the owner's 'username' or the status of the Order Item
         """
-        if request.query_params:
+        if has_filters(request):
             if "username" in request.query_params:
                 username = request.query_params.get("username")
                 try:
@@ -594,13 +1004,14 @@ class CartsView(APIView):
                 except ObjectDoesNotExist:
                     return Response({"error": f"No status '{status_param}' in cart"}, status=status.HTTP_400_BAD_REQUEST)
                 
-            many = cart.count() == 1
-            serializer = CartsSerializer(cart, many=many)
-            return Response(serializer.data, status=status.HTTP_200_OK)
+            paginator = KeysetPagination()
+            cart = paginator.paginate_queryset(cart, request, view=self)
+            serializer = CartsSerializer(cart, many=True, context={"request": request})
+            return paginator.get_paginated_response(serializer.data)
         
-        carts = Carts.objects.all()
-        serializer = CartsSerializer(carts, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, Carts.objects.all(), CartsSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
             
     def delete(self, request, *args, **kwargs):
         """
@@ -609,45 +1020,119 @@ class CartsView(APIView):
         user = request.user
         try:
             cart = Carts.objects.get(created_by=user)
+            store = get_cart_store()
+            if store is not None:
+                store.forget(user.pk)
             cart.delete()
             return Response({"message": "Cart deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
         except ObjectDoesNotExist:
             return Response({"error": f"User '{user}' has no cart"}, status=status.HTTP_400_BAD_REQUEST)
 
 
+class CartSummaryView(APIView):
+    def get(self, request, *args, **kwargs):
+        """
+            Get the item count, subtotal, discount and total of your Cart. Cached until one of its items or a product
+            changes
+        """
+        store = get_cart_store()
+        if store is not None:
+            state = store.get(request.user.pk)
+            cart_id = state["id"] if state is not None else None
+        else:
+            cart_id = Carts.objects.filter(created_by=request.user).values_list("id", flat=True).first()
+        if cart_id is None:
+            return Response({"error": f"User '{request.user}' has no cart"}, status=status.HTTP_404_NOT_FOUND)
+
+        def compute():
+            if store is not None:
+                # the totals are computed from the database, so it must hold the cart's latest items
+                store.flush(request.user.pk)
+            return cart_summary(cart_id)
+
+        summary = cached_value(f"cart-summary:{cart_id}", [(Carts, cart_id), (Products, None)], compute)
+        return Response(summary, status=status.HTTP_200_OK)
+
+
+class CheckoutView(APIView):
+    error_statuses = {
+        "no_cart": status.HTTP_404_NOT_FOUND,
+        "empty": status.HTTP_400_BAD_REQUEST,
+        "ordered": status.HTTP_409_CONFLICT,
+    }
+
+    @extend_schema(responses=OrderLinesSerializer, request=None)
+    def post(self, request, *args, **kwargs):
+        """
+            Check out your Cart: its items become lines of your Order at the products' current prices, and the cart is
+            emptied and marked as ordered
+        """
+        store = get_cart_store()
+        try:
+            if store is not None:
+                order, lines = store.checkout(request.user.pk, lambda: checkout(request.user))
+            else:
+                order, lines = checkout(request.user)
+        except CheckoutError as e:
+            return Response({"error": str(e)}, status=self.error_statuses[e.code])
+
+        data = {
+            "order": OrdersSerializer(order, context={"request": request}).data,
+            "lines": serialize_instances(lines, OrderLinesSerializer, request),
+        }
+        return Response(data, status=status.HTTP_201_CREATED)
+
+
 class CartItemsView(APIView):
     # permission_classes = [AllowAny]
     
     @extend_schema(responses=CartItemsSerializer, request=None)
     def post(self, request, *args, **kwargs):
         """
-            Create a Cart Item.
+            Add an item ("product" title and "quantity") to your Cart, or several as a list or as "items". A product
+            already in the cart has its quantity increased
         """
         
         user = request.user
         try:
-            cart_id = Carts.objects.get(created_by=user)
+            quantities = parse_quantities(request.data)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        prices = dict(Products.objects.filter(title__in=quantities).values_list("title", "price"))
+        missing = [title for title in quantities if title not in prices]
+        if missing:
+            return Response({"error": f"Product '{missing[0]}' not found"}, status=status.HTTP_404_NOT_FOUND)
+        many = isinstance(request.data, list) or "items" in request.data
+
+        store = get_cart_store()
+        if store is not None:
+            # the hot cart takes the write, the items reach the database on its next flush
+            state = store.add_items(user.pk, quantities, prices)
+            if state is None:
+                return Response({"error": f"User '{user}' has no cart"})
+            data = store.render_items(state, quantities)
+            return Response(data if many else data[0], status=status.HTTP_201_CREATED)
+
+        try:
+            cart = Carts.objects.get(created_by=user)
         except ObjectDoesNotExist:
             return Response({"error": f"User '{user}' has no cart"})
-        product_id = Products.objects.get(title=request.data["product"])
-        
-        try:
-            cartItem = CartItems.objects.create(
-                cart_id=cart_id,
-                product_id=product_id,
-                price=product_id.price,
-                quantity=request.data["quantity"],
-            )
-        except KeyError as e:
-            return Response({"error": f"Provide key {e}"}, status=status.HTTP_400_BAD_REQUEST)
-        except IntegrityError:
-            quantity = request.data["quantity"]
-            cartItem = CartItems.objects.get(cart_id=cart_id, product_id=product_id)
-            cartItem.quantity += quantity
-            cartItem.save()
-        cartItem.save()
-        serializer = CartItemsSerializer(cartItem)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        # an item added again takes the current price
+        cartItems = upsert_increment(
+            [
+                CartItems(cart_id=cart, product_id_id=title, price=prices[title], quantity=quantity)
+                for title, quantity in quantities.items()
+            ],
+            unique_fields=["cart_id", "product_id"],
+            increment_fields=["quantity"],
+            update_fields=["price", "created_at"],
+        )
+        # the raw upsert sends no signals; the touch keeps the cart out of the abandoned cart sweeper
+        touch_cart(cart.id)
+        bump_version(Carts, pk=cart.id)
+        data = serialize_instances(cartItems, CartItemsSerializer, request)
+        return Response(data if many else data[0], status=status.HTTP_201_CREATED)
     
     @extend_schema(responses=CartItemsSerializer, request=None)
     def get(self, request, *args, **kwargs):
@@ -656,8 +1141,12 @@ class CartItemsView(APIView):
         """
         
         user = request.user
+        store = get_cart_store()
+        if store is not None and user.is_authenticated:
+            # the caller's latest adds may still be in the store only
+            store.flush(user.pk)
 
-        if request.query_params:
+        if has_filters(request):
             if "product" in request.query_params:
                 product_name = request.query_params.get("product")
                 try:
@@ -666,15 +1155,16 @@ class CartItemsView(APIView):
                 except ObjectDoesNotExist:
                     return Response({"error": f"Product '{product_name}' not found"}, status=status.HTTP_404_NOT_FOUND)
                 
-                many = cartItem.count() >= 1
-                serializer = CartItemsSerializer(cartItem, many=many)
+                paginator = KeysetPagination()
+                cartItem = paginator.paginate_queryset(cartItem, request, view=self)
+                serializer = CartItemsSerializer(cartItem, many=True, context={"request": request})
                 
-                return Response(serializer.data, status=status.HTTP_200_OK)
+                return paginator.get_paginated_response(serializer.data)
 
             else:
                 keys = [key for key in request.query_params.keys()]
                 return Response({"error": f"Provide key(s) '{keys}'"}, status=status.HTTP_400_BAD_REQUEST)
         
-        cartItems = CartItems.objects.all()
-        serializer = CartItemsSerializer(cartItems, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        paginator = KeysetPagination()
+        data = serialize_page(paginator, CartItems.objects.all(), CartItemsSerializer, request, view=self)
+        return paginator.get_paginated_response(data)
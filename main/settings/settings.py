@@ -83,6 +83,46 @@ DATABASES = {
 
 
 
+# Cache
+# local memory unless CACHE_URL points at a shared backend, e.g. rediscache://redis:6379/1
+
+CACHES = {
+    "default": env.cache("CACHE_URL", default="locmemcache://"),
+}
+
+# seconds a cached catalog response lives, entries are invalidated by version bumps long before that
+CATALOG_CACHE_TIMEOUT = env.int("CATALOG_CACHE_TIMEOUT", default=300)
+
+
+# Image derivatives
+# resized renditions of product pictures and avatars, see api/images.py
+
+IMAGE_DERIVATIVES = {
+    "WIDTHS": env.list("IMAGE_DERIVATIVE_WIDTHS", cast=int, default=[160, 320, 640]),
+    "FORMATS": env.list("IMAGE_DERIVATIVE_FORMATS", default=["webp", "jpeg"]),
+    "QUALITY": env.int("IMAGE_DERIVATIVE_QUALITY", default=80),
+    # render on a background thread pool after commit, off renders inline (still after commit)
+    "ASYNC": env.bool("IMAGE_DERIVATIVES_ASYNC", default=True),
+    "MAX_WORKERS": env.int("IMAGE_DERIVATIVE_WORKERS", default=2),
+}
+
+
+# Cart store
+# write-behind cache of hot carts, see api/cart_store.py; no backend writes carts straight through
+
+CART_STORE = {
+    # "api.cart_store.LocalCartStore" (per process) or "api.cart_store.CacheCartStore" (shared cache)
+    "BACKEND": env("CART_STORE_BACKEND", default=None),
+    "CACHE_ALIAS": env("CART_STORE_CACHE_ALIAS", default="default"),
+    # "write-behind" or "write-through"
+    "DURABILITY": env("CART_STORE_DURABILITY", default="write-behind"),
+    # seconds and unflushed items a cart may hold before it is flushed
+    "FLUSH_LAG": env.float("CART_STORE_FLUSH_LAG", default=5),
+    "MAX_PENDING": env.int("CART_STORE_MAX_PENDING", default=50),
+    "ASYNC": env.bool("CART_STORE_ASYNC", default=True),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -134,8 +174,18 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
+    # keyset (cursor) pagination used by every list endpoint, clients may pass ?page_size= up to 200
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "PAGE_SIZE": env.int("API_PAGE_SIZE", default=50),
 }
 
+# serve list endpoints from .values() through precompiled field converters instead of
+# ModelSerializer instances where the serializer allows it, see api/compiled.py
+API_COMPILED_SERIALIZERS = env.bool("API_COMPILED_SERIALIZERS", default=True)
+
+# upper bounds of the price facet buckets on product listings, the last bucket is open-ended
+CATALOG_PRICE_BUCKETS = env.list("CATALOG_PRICE_BUCKETS", cast=float, default=[25, 50, 100, 250, 500, 1000])
+
 
 AUTHENTICATION_BACKENDS = (
    'django.contrib.auth.backends.ModelBackend',
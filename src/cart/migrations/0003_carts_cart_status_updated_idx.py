@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='carts',
+            index=models.Index(fields=['status', 'updated_at', 'id'], name='cart_status_updated_idx'),
+        ),
+    ]
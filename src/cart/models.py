@@ -1,5 +1,7 @@
 from django.db import models
 from django.conf import settings
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from src.product.models import Products
 
@@ -27,6 +29,21 @@ class Carts(models.Model):
             "id",
             "created_by",
         )
+        indexes = [
+            # the abandoned cart sweeper scans idle carts by status, see src/cart/sweeper.py
+            models.Index(fields=["status", "updated_at", "id"], name="cart_status_updated_idx"),
+        ]
+
+
+def touch_cart(cart_id):
+    """
+        Record activity on a cart (see the abandoned cart sweeper), reopening it when it had been
+        ordered or abandoned.
+    """
+    return Carts.objects.filter(id=cart_id).update(
+        updated_at=timezone.now(),
+        status=Case(When(status__in=["ordered", "abandoned"], then=Value("active")), default=F("status")),
+    )
 
 
 class CartItems(models.Model):
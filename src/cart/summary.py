@@ -0,0 +1,45 @@
+"""
+    Cart totals computed by the database.
+
+    A cart's item count, subtotal and total after the products' current discounts come from one
+    aggregate over its items joined to their products; the discount of each line is the same
+    rule as `discounted_price` applied to the price the item was added at.
+"""
+from django.db.models import Case, Count, F, FloatField, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from src.product.models import discounted_price_expression
+
+from .models import CartItems
+
+
+def discounted_item_price():
+    return Case(
+        *[
+            When(
+                product_id__discount_type__iexact=discount_type,
+                then=discounted_price_expression(discount_type, F("product_id__discount_value"), price=F("price")),
+            )
+            for discount_type in ("percent", "amount", "currency")
+        ],
+        default=discounted_price_expression("none", 0, price=F("price")),
+        output_field=FloatField(),
+    )
+
+
+def cart_summary(cart_id):
+    totals = CartItems.objects.filter(cart_id=cart_id).aggregate(
+        lines=Count("id"),
+        items=Coalesce(Sum("quantity"), 0),
+        subtotal=Coalesce(Sum(F("price") * F("quantity"), output_field=FloatField()), Value(0.0)),
+        total=Coalesce(Sum(discounted_item_price() * F("quantity"), output_field=FloatField()), Value(0.0)),
+    )
+    subtotal, total = round(totals["subtotal"], 2), round(totals["total"], 2)
+    return {
+        "cart": cart_id,
+        "lines": totals["lines"],
+        "items": totals["items"],
+        "subtotal": subtotal,
+        "discount": round(subtotal - total, 2),
+        "total": total,
+    }
@@ -0,0 +1,64 @@
+"""
+    Abandoned cart sweeper.
+
+    Carts idle (by `updated_at`) since before a cutoff are moved from an open status to
+    "abandoned", optionally dropping their items. The candidates are read from the
+    (status, updated_at) index in keyset order, and each chunk is updated in its own short
+    transaction, which re-checks the idle condition so a cart touched since it was read stays
+    open. Nothing holds locks on more than one chunk of carts at a time, and the position after
+    every chunk can be saved to resume an interrupted sweep.
+
+    With the write-behind cart store (api/cart_store.py) a chunk's carts are also locked in the
+    store around its transaction: a cart with changes not flushed yet isn't idle and stays open,
+    and the store's copy of a purged cart is dropped before any add can land in it.
+"""
+from contextlib import nullcontext
+from datetime import datetime
+
+from django.db import transaction
+
+from .models import Carts, CartItems
+
+OPEN_STATUSES = ["active", "pending"]
+
+
+def sweep_abandoned_carts(cutoff, statuses=OPEN_STATUSES, purge_items=False, chunk_size=500, position=None, store=None):
+    """
+        Abandon the carts in `statuses` idle since before `cutoff`, one chunk at a time, starting
+        after `position` ((updated_at, id) of the last cart of a previous chunk), holding each
+        chunk's carts in the cart `store` when given. Yields (carts abandoned, items purged,
+        position, ids of the chunk's carts) after each chunk.
+    """
+    candidates = Carts.objects.filter(status__in=statuses, updated_at__lt=cutoff).order_by("updated_at", "id")
+    while True:
+        chunk = candidates
+        if position is not None:
+            updated_at, last_id = position
+            chunk = chunk.filter(updated_at__gte=updated_at).exclude(updated_at=updated_at, id__lte=last_id)
+        rows = list(chunk.values_list("updated_at", "id", "created_by")[:chunk_size])
+        if not rows:
+            return
+        position = rows[-1][:2]
+        ids = [pk for _, pk, _ in rows]
+
+        with store.holding([user_id for _, _, user_id in rows]) if store is not None else nullcontext(set()) as busy:
+            with transaction.atomic():
+                idle = Carts.objects.filter(id__in=ids, status__in=statuses, updated_at__lt=cutoff).exclude(created_by__in=busy)
+                abandoned = idle.update(status="abandoned")
+                purged = 0
+                if purge_items and abandoned:
+                    purged, _ = CartItems.objects.filter(cart_id__in=ids, cart_id__status="abandoned").delete()
+                    if store is not None:
+                        for user_id in Carts.objects.filter(id__in=ids, status="abandoned").values_list("created_by", flat=True):
+                            store.forget(user_id, locked=True)
+        yield abandoned, purged, position, ids
+
+
+def format_position(position):
+    return None if position is None else {"updated_at": position[0].isoformat(), "id": position[1]}
+
+
+def parse_position(data):
+    if not data or "updated_at" not in data:
+        return None
+    return datetime.fromisoformat(data["updated_at"]), data["id"]
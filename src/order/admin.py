@@ -1,15 +1,35 @@
 from django.contrib import admin
 from django.apps import apps
-from src.order.models import OrderLines, Orders
+from src.order.models import ArchivedOrderLines, ArchivedOrders, OrderLines, Orders
 
 
 class OrdersModelAdmin(admin.ModelAdmin):
     list_display = ["id", "user", "created_at"]
-    search_fields = ["user"]
+    search_fields = ["user__username"]
+    list_select_related = ["user"]
+    # counting the whole table on every page gets slow as orders pile up
+    show_full_result_count = False
     
 
 class OrderLinesModelAdmin(admin.ModelAdmin):
     list_display = ["id", "order", "product", "price", "quantity"]
+    list_select_related = ["order__user"]
+    show_full_result_count = False
+
+
+class ArchivedOrdersModelAdmin(admin.ModelAdmin):
+    list_display = ["id", "user", "created_at", "total", "archived_at"]
+    search_fields = ["user__username"]
+    list_select_related = ["user"]
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
     
 admin.site.register(Orders, OrdersModelAdmin)
-admin.site.register(OrderLines, OrderLinesModelAdmin)
\ No newline at end of file
+admin.site.register(OrderLines, OrderLinesModelAdmin)
+admin.site.register(ArchivedOrders, ArchivedOrdersModelAdmin)
+admin.site.register(ArchivedOrderLines)
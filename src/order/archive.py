@@ -0,0 +1,90 @@
+"""
+    Archival of cold orders.
+
+    `Orders` and `OrderLines` only grow, and the storefront, the admin changelist and the jobs
+    reading them mostly want recent orders. Orders created before a cutoff day are moved, with
+    their lines, into `ArchivedOrders` and `ArchivedOrderLines` (same ids and columns), leaving
+    the hot tables and their indexes the size of the recent history. Each batch of the oldest
+    orders is locked with its lines, copied with INSERT ... SELECT and deleted in its own short
+    transaction: no line written meanwhile is deleted uncopied, and the move can run on a live
+    database and be interrupted anywhere, the next run picks up the oldest orders left. The deletes are plain SQL, bypassing the order totals signals and the
+    per-row cascade, since the archived copies already hold the totals.
+
+    Cutoffs fall on midnight (TIME_ZONE) so a day's orders are archived together; the sales
+    rollups of archived days are left alone (see src/order/rollups.py).
+"""
+from datetime import datetime, time
+
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ArchivedOrderLines, ArchivedOrders, OrderLines, Orders
+
+
+def archive_cutoff(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def archived_until():
+    """
+        The last day holding archived orders, None when nothing was archived.
+    """
+    last = ArchivedOrders.objects.aggregate(last=Max("created_at"))["last"]
+    return None if last is None else timezone.localtime(last).date()
+
+
+def copy_rows(cursor, connection, source, target, column, ids, archived_at=None):
+    quote = connection.ops.quote_name
+    names = [field.name for field in target._meta.concrete_fields if field.name != "archived_at"]
+    target_columns = [quote(target._meta.get_field(name).column) for name in names]
+    source_columns = [quote(source._meta.get_field(name).column) for name in names]
+    params = []
+    if archived_at is not None:
+        target_columns.append(quote(target._meta.get_field("archived_at").column))
+        source_columns.append("%s")
+        params.append(target._meta.get_field("archived_at").get_db_prep_save(archived_at, connection))
+    cursor.execute(
+        f"INSERT INTO {quote(target._meta.db_table)} ({', '.join(target_columns)}) "
+        f"SELECT {', '.join(source_columns)} FROM {quote(source._meta.db_table)} "
+        f"WHERE {quote(column)} IN ({', '.join(['%s'] * len(ids))})",
+        params + ids,
+    )
+    return cursor.rowcount
+
+
+def delete_rows(cursor, connection, model, column, ids):
+    quote = connection.ops.quote_name
+    cursor.execute(f"DELETE FROM {quote(model._meta.db_table)} WHERE {quote(column)} IN ({', '.join(['%s'] * len(ids))})", ids)
+    return cursor.rowcount
+
+
+def archive_orders(before, batch_size=1000):
+    """
+        Move the orders created before the day `before`, and their lines, to the archive tables,
+        `batch_size` orders per transaction. Yields (orders moved, lines moved) after each batch.
+    """
+    cutoff = archive_cutoff(before)
+    using = router.db_for_write(Orders)
+    connection = connections[using]
+    order_column = OrderLines._meta.get_field("order").column
+    while True:
+        with transaction.atomic(using=using):
+            # locking the orders keeps new lines out of them (inserting a line takes a key share lock
+            # on its order) and locking their lines keeps those from changing before they're copied
+            ids = list(
+                Orders.objects.using(using)
+                .filter(created_at__lt=cutoff)
+                .order_by("created_at", "id")
+                .select_for_update()
+                .values_list("id", flat=True)[:batch_size]
+            )
+            if not ids:
+                return
+            list(OrderLines.objects.using(using).filter(order_id__in=ids).select_for_update().values_list("id", flat=True))
+            with connection.cursor() as cursor:
+                orders = copy_rows(cursor, connection, Orders, ArchivedOrders, "id", ids, timezone.now())
+                lines = copy_rows(cursor, connection, OrderLines, ArchivedOrderLines, order_column, ids)
+                delete_rows(cursor, connection, OrderLines, order_column, ids)
+                delete_rows(cursor, connection, Orders, "id", ids)
+        yield orders, lines
@@ -0,0 +1,29 @@
+# Orders were one per user, keyed by username (Orders.user a one-to-one on username, OrderLines.order
+# pointing at it through to_field="user"). Users now have many orders and lines point at the order id.
+# Split in three migrations (add the new keys, fill them, swap them in) so that on PostgreSQL the
+# rows updated by the data migration are committed before the tables are altered.
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0003_orders_order_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='owner',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='orderlines',
+            name='new_order',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='order.orders'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def rekey_orders(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split("."))
+    Orders = apps.get_model("order", "Orders")
+    OrderLines = apps.get_model("order", "OrderLines")
+    Orders.objects.update(owner=Subquery(User.objects.filter(username=OuterRef("user_id")).values("pk")[:1]))
+    OrderLines.objects.update(new_order=Subquery(Orders.objects.filter(user_id=OuterRef("order_id")).values("pk")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0004_orders_per_user'),
+    ]
+
+    operations = [
+        migrations.RunPython(rekey_orders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0005_orders_per_user_rekey'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='orderlines',
+            unique_together=set(),
+        ),
+        migrations.RemoveField(
+            model_name='orderlines',
+            name='order',
+        ),
+        migrations.RemoveField(
+            model_name='orders',
+            name='user',
+        ),
+        migrations.RenameField(
+            model_name='orders',
+            old_name='owner',
+            new_name='user',
+        ),
+        migrations.RenameField(
+            model_name='orderlines',
+            old_name='new_order',
+            new_name='order',
+        ),
+        migrations.AlterField(
+            model_name='orders',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='orders', to=settings.AUTH_USER_MODEL, verbose_name='user_id'),
+        ),
+        migrations.AlterField(
+            model_name='orderlines',
+            name='order',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='order.orders'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='orderlines',
+            unique_together={('order', 'product')},
+        ),
+        migrations.AddIndex(
+            model_name='orders',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='order_user_created_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:13
+
+from django.db import migrations, models
+from django.db.models import F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_totals(apps, schema_editor):
+    Orders = apps.get_model("order", "Orders")
+    OrderLines = apps.get_model("order", "OrderLines")
+    lines = OrderLines.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    total = lines.annotate(value=Sum(F("price") * F("quantity"), output_field=FloatField())).values("value")
+    item_count = lines.annotate(value=Sum("quantity", output_field=IntegerField())).values("value")
+    Orders.objects.update(
+        total=Coalesce(Subquery(total, output_field=FloatField()), Value(0.0)),
+        item_count=Coalesce(Subquery(item_count, output_field=IntegerField()), Value(0)),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('order', '0006_orders_per_user_swap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orders',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='item count'),
+        ),
+        migrations.AddField(
+            model_name='orders',
+            name='total',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='order total (GH)'),
+        ),
+        migrations.RunPython(fill_totals, migrations.RunPython.noop),
+    ]
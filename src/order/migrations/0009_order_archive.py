@@ -0,0 +1,56 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:20
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0014_related_products'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('order', '0008_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedOrders',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('total', models.FloatField(default=0.0, verbose_name='order total (GH)')),
+                ('item_count', models.PositiveIntegerField(default=0, verbose_name='item count')),
+                ('archived_at', models.DateTimeField()),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_orders', to=settings.AUTH_USER_MODEL, verbose_name='user_id')),
+            ],
+            options={
+                'verbose_name': 'Archived order',
+                'verbose_name_plural': 'Archived orders',
+                'ordering': ('-created_at',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedOrderLines',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('price', models.FloatField(default=0.0, verbose_name='product price (GH)')),
+                ('quantity', models.IntegerField(default=0, verbose_name='quantity')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lines', to='order.archivedorders')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='product.products', to_field='title')),
+            ],
+            options={
+                'verbose_name': 'Archived order lines',
+                'verbose_name_plural': 'Archived order lines',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='archivedorders',
+            index=models.Index(fields=['-created_at', '-id'], name='archived_order_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedorders',
+            index=models.Index(fields=['user', '-created_at', '-id'], name='archived_order_user_idx'),
+        ),
+    ]
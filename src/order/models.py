@@ -1,17 +1,22 @@
 from django.db import models
 from django.conf import settings
-from src.product.models import Products
+from src.product.models import Categories, Products
 from django.utils.translation import gettext_lazy as _
 
 
 class Orders(models.Model):
-    user = models.OneToOneField(
+    user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         verbose_name="user_id",
         on_delete=models.CASCADE,
-        to_field="username"
+        related_name="orders",
     )
     created_at = models.DateTimeField(auto_now_add=True)
+    # bumped with the totals whenever the lines change, the sales rollups refresh from it
+    updated_at = models.DateTimeField(auto_now=True)
+    # sums of the lines, refreshed whenever they change (see src/order/totals.py)
+    total = models.FloatField(_("order total (GH)"), default=0.0, editable=False)
+    item_count = models.PositiveIntegerField(_("item count"), default=0, editable=False)
 
     def __str__(self):
         return str(self.user)
@@ -20,10 +25,18 @@ class Orders(models.Model):
         ordering = ("-created_at",)
         verbose_name = "Order"
         verbose_name_plural = "Orders"
+        indexes = [
+            # keyset pagination scans on (-created_at, -id)
+            models.Index(fields=["-created_at", "-id"], name="order_created_id_idx"),
+            # a customer's order history, newest first
+            models.Index(fields=["user", "-created_at", "-id"], name="order_user_created_idx"),
+            # orders changed since the sales rollups' watermark
+            models.Index(fields=["updated_at"], name="order_updated_idx"),
+        ]
 
 
 class OrderLines(models.Model):
-    order = models.ForeignKey(Orders, to_field="user", on_delete=models.CASCADE)
+    order = models.ForeignKey(Orders, on_delete=models.CASCADE, related_name="lines")
     product = models.ForeignKey(Products, to_field="title", on_delete=models.CASCADE)
     price = models.FloatField(_("product price (GH)"), default=0.0)
     quantity = models.IntegerField(_("quantity"), default=0)
@@ -35,3 +48,115 @@ class OrderLines(models.Model):
         verbose_name = "Order Lines"
         verbose_name_plural = "Order Lines"
         unique_together = ("order", "product")
+
+
+class DailySales(models.Model):
+    """
+        Sales of one day (in TIME_ZONE), maintained by src/order/rollups.py.
+    """
+
+    day = models.DateField(unique=True)
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0.0)
+    orders = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return str(self.day)
+
+    class Meta:
+        verbose_name = "Daily sales"
+        verbose_name_plural = "Daily sales"
+
+
+class ProductDailySales(models.Model):
+    """
+        Sales of one product on one day, maintained by src/order/rollups.py.
+    """
+
+    day = models.DateField()
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="+")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0.0)
+    orders = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.product_id}"
+
+    class Meta:
+        verbose_name = "Product daily sales"
+        verbose_name_plural = "Product daily sales"
+        unique_together = ("day", "product")
+        indexes = [
+            # one product's sales over a date range
+            models.Index(fields=["product", "day"], name="product_sales_day_idx"),
+        ]
+
+
+class CategoryDailySales(models.Model):
+    """
+        Sales of the products of one category (not its subcategories) on one day, maintained by
+        src/order/rollups.py.
+    """
+
+    day = models.DateField()
+    category = models.ForeignKey(Categories, on_delete=models.CASCADE, related_name="+")
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.FloatField(default=0.0)
+    orders = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} - {self.category_id}"
+
+    class Meta:
+        verbose_name = "Category daily sales"
+        verbose_name_plural = "Category daily sales"
+        unique_together = ("day", "category")
+        indexes = [
+            models.Index(fields=["category", "day"], name="category_sales_day_idx"),
+        ]
+
+
+class ArchivedOrders(models.Model):
+    """
+        Orders moved out of `Orders` by src/order/archive.py, keeping their ids.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        verbose_name="user_id",
+        on_delete=models.CASCADE,
+        related_name="archived_orders",
+    )
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    total = models.FloatField(_("order total (GH)"), default=0.0)
+    item_count = models.PositiveIntegerField(_("item count"), default=0)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return str(self.user)
+
+    class Meta:
+        ordering = ("-created_at",)
+        verbose_name = "Archived order"
+        verbose_name_plural = "Archived orders"
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="archived_order_created_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="archived_order_user_idx"),
+        ]
+
+
+class ArchivedOrderLines(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    order = models.ForeignKey(ArchivedOrders, on_delete=models.CASCADE, related_name="lines")
+    product = models.ForeignKey(Products, to_field="title", on_delete=models.CASCADE, related_name="+")
+    price = models.FloatField(_("product price (GH)"), default=0.0)
+    quantity = models.IntegerField(_("quantity"), default=0)
+
+    def __str__(self):
+        return str(self.product)
+
+    class Meta:
+        verbose_name = "Archived order lines"
+        verbose_name_plural = "Archived order lines"
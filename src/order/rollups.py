@@ -0,0 +1,107 @@
+"""
+    Daily sales rollups.
+
+    `DailySales`, `ProductDailySales` and `CategoryDailySales` hold units, revenue and distinct
+    orders per day (in TIME_ZONE), so sales reports read a few rows per day instead of scanning
+    `OrderLines`. Distinct order counts don't add up across lines, so a day is never patched:
+    every day holding an order created or changed since the watermark (`Orders.updated_at`, bumped
+    whenever an order's lines change) is recomputed whole from that day's orders, which the
+    created_at index bounds. Days of orders deleted since are only corrected by a full refresh.
+    The days holding archived orders (see src/order/archive.py) are never recomputed: their lines
+    are no longer all in `OrderLines`, so their rollups stay as computed before the archiving.
+"""
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, Max, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .archive import archived_until
+from .models import CategoryDailySales, DailySales, OrderLines, Orders, ProductDailySales
+
+
+# how far the watermark stays behind now, longer than any transaction writing orders
+WATERMARK_LAG = timedelta(minutes=5)
+
+
+def day_range(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def changed_days(since=None, until=None):
+    """
+        The days of the orders updated after `since` and up to `until` (every day with orders when
+        `since` is None).
+    """
+    orders = Orders.objects.all()
+    if since is not None:
+        orders = orders.filter(updated_at__gt=since)
+    if until is not None:
+        orders = orders.filter(updated_at__lte=until)
+    tzinfo = timezone.get_current_timezone()
+    return sorted(orders.order_by().annotate(day=TruncDate("created_at", tzinfo=tzinfo)).values_list("day", flat=True).distinct())
+
+
+def rollup_day(day):
+    """
+        Recompute the rollups of one day, returns the number of rows written. The day must not hold
+        archived orders.
+    """
+    start, end = day_range(day)
+    lines = OrderLines.objects.filter(order__created_at__gte=start, order__created_at__lt=end).order_by()
+    totals = {
+        "units": Sum("quantity"),
+        "revenue": Sum(F("price") * F("quantity"), output_field=FloatField()),
+        "orders": Count("order", distinct=True),
+    }
+    day_totals = lines.aggregate(**totals)
+    products = lines.values("product__pk").annotate(**totals)
+    categories = lines.values("product__category_id").annotate(**totals)
+
+    with transaction.atomic():
+        DailySales.objects.filter(day=day).delete()
+        ProductDailySales.objects.filter(day=day).delete()
+        CategoryDailySales.objects.filter(day=day).delete()
+        if not day_totals["orders"]:
+            return 0
+        DailySales.objects.create(day=day, **day_totals)
+        written = 1
+        written += len(ProductDailySales.objects.bulk_create(
+            [ProductDailySales(day=day, product_id=row.pop("product__pk"), **row) for row in products]
+        ))
+        written += len(CategoryDailySales.objects.bulk_create(
+            [CategoryDailySales(day=day, category_id=row.pop("product__category_id"), **row) for row in categories]
+        ))
+    return written
+
+
+def refresh_sales_rollups(since=None, lag=WATERMARK_LAG):
+    """
+        Recompute the days changed after the watermark `since` (all of them when None). Returns
+        (new watermark, days refreshed, rows written).
+
+        `updated_at` is stamped when a statement runs, not when its transaction commits, so an
+        order stamped before the newest one may only become visible after this run. The new
+        watermark therefore stays `lag` behind now: orders changed within it are read again by
+        the next run.
+    """
+    last = Orders.objects.aggregate(last=Max("updated_at"))["last"]
+    if last is None or (since is not None and last <= since):
+        return since, 0, 0
+    last_archived = archived_until()
+    # an archive run interrupted mid-day leaves part of that day's orders in OrderLines too
+    days = [day for day in changed_days(since) if last_archived is None or day > last_archived]
+    if since is None:
+        # a full refresh also drops the days whose orders are all gone, but not archived
+        for model in (DailySales, ProductDailySales, CategoryDailySales):
+            stale = model.objects.exclude(day__in=days)
+            if last_archived is not None:
+                stale = stale.filter(day__gt=last_archived)
+            stale.delete()
+    written = sum(rollup_day(day) for day in days)
+    until = min(last, timezone.now() - lag)
+    if since is not None:
+        until = max(until, since)
+    return until, len(days), written
@@ -0,0 +1,34 @@
+import threading
+
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Orders, OrderLines
+from .totals import refresh_order_totals
+
+# ids of the orders whose deletion is in progress in this thread: their lines are deleted first
+# (and signalled one by one), there's no total left to refresh
+_deleting = threading.local()
+
+
+def deleting_orders():
+    if not hasattr(_deleting, "ids"):
+        _deleting.ids = set()
+    return _deleting.ids
+
+
+@receiver(pre_delete, sender=Orders)
+def mark_order_deleting(sender, instance, **kwargs):
+    deleting_orders().add(instance.pk)
+
+
+@receiver(post_delete, sender=Orders)
+def unmark_order_deleting(sender, instance, **kwargs):
+    deleting_orders().discard(instance.pk)
+
+
+@receiver(post_save, sender=OrderLines)
+@receiver(post_delete, sender=OrderLines)
+def refresh_order_total(sender, instance, raw=False, **kwargs):
+    if not raw and instance.order_id not in deleting_orders():
+        refresh_order_totals([instance.order_id])
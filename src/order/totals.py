@@ -0,0 +1,32 @@
+"""
+    Stored order totals.
+
+    `Orders.total` and `Orders.item_count` are the sums of the order's lines, written when the
+    lines change rather than summed on every read. `refresh_order_totals` recomputes them for any
+    number of orders with a single UPDATE of correlated subqueries; the OrderLines signals call it
+    for single-line writes and the set-based writers (checkout, the order lines upsert) call it
+    directly.
+"""
+from django.db.models import F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Orders, OrderLines
+
+
+def line_sum(expression, output_field):
+    lines = OrderLines.objects.filter(order=OuterRef("pk")).order_by().values("order")
+    return Subquery(lines.annotate(value=Sum(expression, output_field=output_field)).values("value"), output_field=output_field)
+
+
+def refresh_order_totals(order_ids=None):
+    """
+        Recompute the totals of `order_ids` (every order when None) and mark them updated, returns
+        the number of orders updated.
+    """
+    orders = Orders.objects.all() if order_ids is None else Orders.objects.filter(id__in=order_ids)
+    return orders.update(
+        total=Coalesce(line_sum(F("price") * F("quantity"), FloatField()), Value(0.0)),
+        item_count=Coalesce(line_sum(F("quantity"), IntegerField()), Value(0)),
+        updated_at=timezone.now(),
+    )
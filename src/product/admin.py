@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.admin import ModelAdmin
 from django.apps import apps
-from .models import Categories, Products, Reviews
+from .models import Categories, Products, Reviews, Tags
 
 
 class CategoriesModelAdmin(ModelAdmin):
@@ -24,6 +24,11 @@ class ProductsModelAdmin(ModelAdmin):
     search_fields = ["category", "title", "price", "discount_type", "tags"]
 
 
+class TagsModelAdmin(ModelAdmin):
+    list_display = ["id", "name"]
+    search_fields = ["name"]
+
+
 class ReviewModelAdmin(ModelAdmin):
     list_display = ["id", "user_id", "product", "comments", "created_at"]
 
@@ -31,3 +36,4 @@ class ReviewModelAdmin(ModelAdmin):
 admin.site.register(Categories, CategoriesModelAdmin)
 admin.site.register(Products, ProductsModelAdmin)
 admin.site.register(Reviews, ReviewModelAdmin)
+admin.site.register(Tags, TagsModelAdmin)
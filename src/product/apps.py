@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class ProductConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'src.product'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        from .search import drop_search_triggers_before_migrate, install_search_triggers_after_migrate
+
+        pre_migrate.connect(drop_search_triggers_before_migrate, sender=self)
+        post_migrate.connect(install_search_triggers_after_migrate, sender=self)
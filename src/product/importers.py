@@ -0,0 +1,183 @@
+"""
+    Streaming bulk import of products from CSV or JSON Lines.
+
+    Rows are read one at a time, validated, and written in batches with a single upsert
+    (INSERT ... ON CONFLICT (title) DO UPDATE) per batch, so memory stays bounded by the batch size
+    whatever the size of the input. Tag links are synced per batch as well. Categories are resolved
+    from one query made up front. Invalid rows are reported by line number and skipped; they never
+    abort the rest of the import.
+"""
+import csv
+import json
+
+from django.db import DatabaseError, transaction
+
+from .models import Categories, Products, discounted_price
+from .tags import sync_tags
+
+IMPORT_FORMATS = ("csv", "jsonl")
+
+UPDATE_FIELDS = [
+    "category",
+    "summary",
+    "description",
+    "price",
+    "discount_type",
+    "discount_value",
+    "effective_price",
+    "tags",
+    "updated_at",
+]
+
+
+def read_rows(stream, input_format):
+    """
+        Yield (line number, row, error) for every record of a text stream.
+    """
+    if input_format == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row, None
+    elif input_format == "jsonl":
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield line_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None, "Each line must be a JSON object"
+                continue
+            yield line_number, row, None
+    else:
+        raise ValueError(f"Unsupported format '{input_format}', use one of {', '.join(IMPORT_FORMATS)}")
+
+
+class ImportReport:
+    def __init__(self, max_errors=1000):
+        self.max_errors = max_errors
+        self.rows = 0
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, line, error):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "error": str(error)})
+
+    def as_dict(self):
+        return {
+            "rows": self.rows,
+            "imported": self.imported,
+            "failed": self.failed,
+            "errors": self.errors,
+            "errors_truncated": self.failed > len(self.errors),
+        }
+
+
+class ProductImporter:
+    def __init__(self, batch_size=1000, max_errors=1000):
+        self.batch_size = batch_size
+        self.report = ImportReport(max_errors=max_errors)
+        self.discount_types = dict(Products.discount_type_options)
+        self.categories_by_name = {}
+        self.category_ids = set()
+
+    def run(self, stream, input_format):
+        for category_id, name in Categories.objects.values_list("id", "name"):
+            self.categories_by_name[name] = category_id
+            self.category_ids.add(category_id)
+
+        batch = {}
+        for line, row, error in read_rows(stream, input_format):
+            self.report.rows += 1
+            if error is None:
+                try:
+                    product = self.build_product(row)
+                except ValueError as e:
+                    error = e
+            if error is not None:
+                self.report.add_error(line, error)
+                continue
+
+            # a title repeated within one batch can't be upserted twice by one statement, the last row wins
+            batch.pop(product.title, None)
+            batch[product.title] = (line, product)
+            if len(batch) >= self.batch_size:
+                self.write_batch(list(batch.values()))
+                batch = {}
+        if batch:
+            self.write_batch(list(batch.values()))
+        return self.report
+
+    def resolve_category(self, value):
+        value = str(value or "").strip()
+        if value.isdigit() and int(value) in self.category_ids:
+            return int(value)
+        if value in self.categories_by_name:
+            return self.categories_by_name[value]
+        raise ValueError(f"Unknown category '{value}'")
+
+    def build_product(self, row):
+        title = str(row.get("title") or "").strip()
+        if not title:
+            raise ValueError("'title' is required")
+        if len(title) > 200:
+            raise ValueError("'title' is longer than 200 characters")
+
+        tags = str(row.get("tags") or "")
+        if len(tags) > 100:
+            raise ValueError("'tags' is longer than 100 characters")
+
+        discount_type = str(row.get("discount_type") or "none").lower()
+        if discount_type not in self.discount_types:
+            raise ValueError(f"'discount_type' must be one of {', '.join(self.discount_types)}")
+
+        try:
+            price = float(row.get("price") or 0)
+            discount_value = float(row.get("discount_value") or 0)
+        except (TypeError, ValueError):
+            raise ValueError("'price' and 'discount_value' must be numbers")
+        if price < 0:
+            raise ValueError("'price' can't be negative")
+
+        return Products(
+            title=title,
+            category_id=self.resolve_category(row.get("category")),
+            summary=str(row.get("summary") or ""),
+            description=str(row.get("description") or ""),
+            price=price,
+            discount_type=discount_type,
+            discount_value=discount_value,
+            effective_price=discounted_price(price, discount_type, discount_value),
+            tags=tags,
+        )
+
+    def upsert(self, products):
+        with transaction.atomic():
+            Products.objects.bulk_create(
+                products,
+                update_conflicts=True,
+                unique_fields=["title"],
+                update_fields=UPDATE_FIELDS,
+            )
+            # bulk_create skips save(), link the tags of the whole batch in bulk instead
+            tags = {product.title: product.tags for product in products}
+            ids = Products.objects.filter(title__in=list(tags)).values_list("title", "id")
+            sync_tags(Products, {pk: tags[title] for title, pk in ids})
+
+    def write_batch(self, batch):
+        try:
+            self.upsert([product for _, product in batch])
+            self.report.imported += len(batch)
+        except DatabaseError:
+            # something validation didn't catch, retry row by row to pin it down
+            for line, product in batch:
+                try:
+                    self.upsert([product])
+                    self.report.imported += 1
+                except DatabaseError as e:
+                    self.report.add_error(line, e)
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:32
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from src.product import search
+
+
+def install_search_index(apps, schema_editor):
+    search.install_search_index(schema_editor.connection)
+    search.rebuild_search_index(schema_editor.connection)
+
+
+def drop_search_index(apps, schema_editor):
+    search.drop_search_index(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0005_reviews_review_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(install_search_index, drop_search_index),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:33
+
+from django.db import migrations, models
+
+
+def build_paths(apps, schema_editor):
+    Categories = apps.get_model("product", "Categories")
+    parents = dict(Categories.objects.values_list("id", "parent_category_id"))
+    paths = {}
+    for pk in parents:
+        # walk up to the first ancestor with a known path (or a root), then fill in on the way back down
+        chain = [pk]
+        while parents.get(chain[-1]) is not None and chain[-1] not in paths:
+            parent = parents[chain[-1]]
+            if parent in chain:
+                break
+            chain.append(parent)
+        prefix = paths.get(chain[-1], "")
+        if chain[-1] in paths:
+            chain.pop()
+        for category in reversed(chain):
+            prefix = paths[category] = prefix + f"{category:010d}/"
+
+    categories = list(Categories.objects.only("id"))
+    for category in categories:
+        category.path = paths[category.id]
+        category.depth = category.path.count("/") - 1
+    Categories.objects.bulk_update(categories, ["path", "depth"], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0006_products_search_vector'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categories',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='categories',
+            name='path',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=512),
+        ),
+        migrations.RunPython(build_paths, migrations.RunPython.noop),
+    ]
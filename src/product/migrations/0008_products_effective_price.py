@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:35
+
+from django.db import migrations, models
+
+from src.product.models import effective_price_expression
+
+
+def fill_effective_price(apps, schema_editor):
+    Products = apps.get_model("product", "Products")
+    Products.objects.update(effective_price=effective_price_expression())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0007_categories_path'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='effective_price',
+            field=models.FloatField(default=0.0, editable=False, verbose_name='price after discount'),
+        ),
+        migrations.AddIndex(
+            model_name='products',
+            index=models.Index(fields=['effective_price', 'id'], name='product_price_id_idx'),
+        ),
+        migrations.RunPython(fill_effective_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0008_products_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='products',
+            name='picture_derivatives',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
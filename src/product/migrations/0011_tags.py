@@ -0,0 +1,62 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:52
+
+from django.db import migrations, models
+
+from src.product.tags import parse_tags
+
+
+def parse_existing_tags(apps, schema_editor):
+    Tags = apps.get_model("product", "Tags")
+    tag_ids = {}
+    for model_name in ("Categories", "Products"):
+        model = apps.get_model("product", model_name)
+        through = model.tag_set.through
+        source = f"{model._meta.model_name}_id"
+        last_pk = 0
+        while True:
+            rows = list(model.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", "tags")[:2000])
+            if not rows:
+                break
+            last_pk = rows[-1][0]
+            parsed = [(pk, parse_tags(text)) for pk, text in rows]
+            missing = {name for _, names in parsed for name in names} - set(tag_ids)
+            if missing:
+                Tags.objects.bulk_create([Tags(name=name) for name in missing], ignore_conflicts=True)
+                tag_ids.update(Tags.objects.filter(name__in=missing).values_list("name", "id"))
+            through.objects.bulk_create(
+                [through(**{source: pk, "tags_id": tag_ids[name]}) for pk, names in parsed for name in names],
+                ignore_conflicts=True,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0010_products_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tags',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='tag')),
+            ],
+            options={
+                'verbose_name': 'Tag',
+                'verbose_name_plural': 'Tags',
+                'ordering': ('name',),
+            },
+        ),
+        migrations.AddField(
+            model_name='categories',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='categories', to='product.tags'),
+        ),
+        migrations.AddField(
+            model_name='products',
+            name='tag_set',
+            field=models.ManyToManyField(blank=True, editable=False, related_name='products', to='product.tags'),
+        ),
+        migrations.RunPython(parse_existing_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:54
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+import django.db.models.deletion
+
+RATINGS = ["poor", "unsatisfactory", "satisfactory", "very satisfactory", "outstanding"]
+
+
+def build_summaries(apps, schema_editor):
+    Reviews = apps.get_model("product", "Reviews")
+    ReviewSummary = apps.get_model("product", "ReviewSummary")
+    counts = {rating.replace(" ", "_"): Count("pk", filter=Q(rating__iexact=rating)) for rating in RATINGS}
+    rows = Reviews.objects.order_by().values("product__pk").annotate(**counts)
+    summaries = []
+    for row in rows:
+        histogram = {name: row[name] for name in counts}
+        summaries.append(
+            ReviewSummary(
+                product_id=row["product__pk"],
+                count=sum(histogram.values()),
+                rating_total=sum(score * histogram[name] for score, name in enumerate(counts, start=1)),
+                **histogram,
+            )
+        )
+    ReviewSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0011_tags'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReviewSummary',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='review_summary', serialize=False, to='product.products')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('poor', models.PositiveIntegerField(default=0)),
+                ('unsatisfactory', models.PositiveIntegerField(default=0)),
+                ('satisfactory', models.PositiveIntegerField(default=0)),
+                ('very_satisfactory', models.PositiveIntegerField(default=0)),
+                ('outstanding', models.PositiveIntegerField(default=0)),
+                ('rating_total', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Review summary',
+                'verbose_name_plural': 'Review summaries',
+            },
+        ),
+        migrations.RunPython(build_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0014_related_products'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountedBasket',
+            fields=[
+                ('order_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('products', models.JSONField(default=list)),
+            ],
+            options={
+                'verbose_name': 'Counted basket',
+                'verbose_name_plural': 'Counted baskets',
+            },
+        ),
+    ]
@@ -1,11 +1,34 @@
 from django.db import models
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
+from django.db.models import Case, ExpressionWrapper, F, FloatField, Value, When
+from django.db.models.functions import Concat, Greatest, Round, Substr
 from django.utils.translation import gettext_lazy as _
 from django.utils.text import slugify
 from django.utils import timezone
 
+from .tags import TAG_MAX_LENGTH, TaggedModel
 
-class Categories(models.Model):
+
+def category_path_segment(pk):
+    # zero-padded so that ordering by path lists every category right after its ancestors
+    return f"{pk:010d}/"
+
+
+class Tags(models.Model):
+    # normalized (lowercased) name, see src/product/tags.py
+    name = models.CharField(_("tag"), max_length=TAG_MAX_LENGTH, unique=True)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ("name",)
+        verbose_name = "Tag"
+        verbose_name_plural = "Tags"
+
+
+class Categories(TaggedModel, models.Model):
     parent_category = models.ForeignKey(
         "self",  # References the same model
         on_delete=models.SET_NULL,  # What to do when the parent category is deleted
@@ -17,16 +40,68 @@ class Categories(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True)
     tags = models.TextField(blank=True)
+    # `tags` parsed into indexed links, kept in sync on save
+    tag_set = models.ManyToManyField(Tags, related_name="categories", blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True, null=True, blank=True)
+    # materialized path of ancestor ids ("0000000001/0000000004/"), kept in sync on save and delete
+    path = models.CharField(max_length=512, db_index=True, blank=True, default="", editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     def save(self, *args, **kwargs):
         # Automatically set the slug based on the name
         if not self.slug:
             self.slug = slugify(self.name)
             self.updated_at = timezone.now()
+
+        parent_path = self.get_parent_path()
+        if self.path and parent_path.startswith(self.path):
+            raise ValueError("A category can't be moved under itself or one of its subcategories")
         super(Categories, self).save(*args, **kwargs)
 
+        path = parent_path + category_path_segment(self.pk)
+        if path != self.path:
+            self.move_subtree(path)
+        self.sync_tags_if_changed(kwargs.get("update_fields"))
+
+    def get_parent_path(self):
+        if self.parent_category_id is None:
+            return ""
+        # read it fresh, a cached parent instance may predate a move of one of its ancestors
+        return Categories.objects.filter(pk=self.parent_category_id).values_list("path", flat=True).first() or ""
+
+    def move_subtree(self, path):
+        """
+            Re-root this category and all of its descendants under `path` in a single UPDATE
+        """
+        depth = path.count("/") - 1
+        if self.path:
+            # the descendants' ancestry changed: move their updated_at too, it keys their validators
+            self.updated_at = timezone.now()
+            Categories.objects.filter(path__startswith=self.path).update(
+                path=Concat(Value(path), Substr("path", len(self.path) + 1)),
+                depth=F("depth") + (depth - self.depth),
+                updated_at=self.updated_at,
+            )
+        else:
+            Categories.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        self.path, self.depth = path, depth
+
+    def get_ancestors(self, include_self=False):
+        """
+            Breadcrumbs from the root down, in one query
+        """
+        ids = [int(segment) for segment in self.path.split("/") if segment]
+        if not include_self:
+            ids = ids[:-1]
+        return Categories.objects.filter(pk__in=ids).order_by("depth")
+
+    def get_descendants(self, include_self=False):
+        descendants = Categories.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
     def __str__(self):
         return self.name
 
@@ -36,7 +111,73 @@ class Categories(models.Model):
         verbose_name_plural = "Categories"
 
 
-class Products(models.Model):
+def discounted_price(price, discount_type, discount_value):
+    """
+        The price a customer pays: 'percent' takes a percentage off, 'amount' and 'currency' take a
+        fixed sum off. Never negative, rounded to cents.
+    """
+    price, discount_value = float(price or 0), float(discount_value or 0)
+    discount_type = (discount_type or "none").lower()
+    if discount_type == "percent":
+        price = price * (1 - discount_value / 100)
+    elif discount_type in ("amount", "currency"):
+        price = price - discount_value
+    return round(max(price, 0.0), 2)
+
+
+def discounted_price_expression(discount_type, discount_value, price=None):
+    """
+        SQL equivalent of discounted_price() computed from the 'price' column (or the `price`
+        expression). `discount_value` may be a number or an expression such as F("discount_value").
+    """
+    discount_type = (discount_type or "none").lower()
+    if not hasattr(discount_value, "resolve_expression"):
+        discount_value = Value(float(discount_value or 0))
+    base = F("price") if price is None else price
+
+    if discount_type == "percent":
+        price = base * (Value(1.0) - discount_value / Value(100.0))
+    elif discount_type in ("amount", "currency"):
+        price = base - discount_value
+    else:
+        price = base
+    return Greatest(Round(ExpressionWrapper(price, output_field=FloatField()), 2), Value(0.0))
+
+
+def effective_price_expression():
+    """
+        discounted_price() of every row from its own discount columns
+    """
+    return Case(
+        *[
+            When(discount_type__iexact=discount_type, then=discounted_price_expression(discount_type, F("discount_value")))
+            for discount_type in ("percent", "amount", "currency")
+        ],
+        default=discounted_price_expression("none", 0),
+        output_field=FloatField(),
+    )
+
+
+class ProductsQuerySet(models.QuerySet):
+    def reprice(self, discount_type, discount_value):
+        """
+            Apply one discount rule to every selected product with a single set-based UPDATE
+        """
+        return self.update(
+            discount_type=discount_type,
+            discount_value=discount_value,
+            effective_price=discounted_price_expression(discount_type, discount_value),
+            updated_at=timezone.now(),
+        )
+
+
+class ProductsManager(models.Manager.from_queryset(ProductsQuerySet)):
+    def get_queryset(self):
+        # the search vector is only ever read by the database, don't ship it to Python
+        return super().get_queryset().defer("search_vector")
+
+
+class Products(TaggedModel, models.Model):
     discount_type_options = (
         ("none", "None"),
         ("percent", "Percent"),
@@ -50,6 +191,8 @@ class Products(models.Model):
     )
     title = models.CharField(_("product title"), max_length=200, unique=True)
     picture = models.ImageField(_("image of product"), upload_to="assets/products/", null=True, blank=True)
+    # resized renditions of `picture`, filled in off the request path by api/images.py
+    picture_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     summary = models.TextField(_("product summary"), max_length=200)
     description = models.TextField(_("product description"), max_length=200)
     price = models.FloatField(_("product price (GH)"), default=0.0)
@@ -57,9 +200,25 @@ class Products(models.Model):
         _("discount type"), max_length=10, choices=discount_type_options, default="none"
     )
     discount_value = models.FloatField(_("discount value"), default=0.0)
+    # price after discount, denormalized so listings can sort and filter on it
+    effective_price = models.FloatField(_("price after discount"), default=0.0, editable=False)
     tags = models.CharField(_("tags"), max_length=100)
+    # `tags` parsed into indexed links, kept in sync on save
+    tag_set = models.ManyToManyField(Tags, related_name="products", blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # maintained by a database trigger, see src/product/search.py
+    search_vector = SearchVectorField(null=True, blank=True, editable=False)
+
+    objects = ProductsManager()
+
+    def save(self, *args, **kwargs):
+        self.effective_price = discounted_price(self.price, self.discount_type, self.discount_value)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"price", "discount_type", "discount_value"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "effective_price"}
+        super(Products, self).save(*args, **kwargs)
+        self.sync_tags_if_changed(update_fields)
 
     def __str__(self):
         return self.title
@@ -68,6 +227,14 @@ class Products(models.Model):
         ordering = ("title",)
         verbose_name = "Product"
         verbose_name_plural = "Products"
+        indexes = [
+            # price-sorted listings and price-range filters
+            models.Index(fields=["effective_price", "id"], name="product_price_id_idx"),
+            # the same listings narrowed to categories or discount types, see api/filters.py
+            models.Index(fields=["category", "title"], name="product_category_title_idx"),
+            models.Index(fields=["category", "effective_price", "id"], name="product_category_price_idx"),
+            models.Index(fields=["discount_type", "effective_price", "id"], name="product_discount_price_idx"),
+        ]
 
 
 class Reviews(models.Model):
@@ -78,6 +245,9 @@ class Reviews(models.Model):
         ("very satisfactory", "Very Satisfactory"),
         ("outstanding", "Outstanding"),
     )
+    # ordinal value of each rating, 1 (poor) to 5 (outstanding)
+    rating_scale = {value: score for score, (value, _) in enumerate(rating_options, start=1)}
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         verbose_name="user",
@@ -100,3 +270,110 @@ class Reviews(models.Model):
         ordering = ("-created_at",)
         verbose_name = "Review"
         verbose_name_plural = "Reviews"
+        indexes = [
+            # keyset pagination scans on (-created_at, -id)
+            models.Index(fields=["-created_at", "-id"], name="review_created_id_idx"),
+            # per-product review feeds, unfiltered and filtered by rating
+            models.Index(fields=["product", "-created_at", "-id"], name="review_product_created_idx"),
+            models.Index(fields=["product", "rating", "-created_at", "-id"], name="review_product_rating_idx"),
+        ]
+
+
+class ReviewSummary(models.Model):
+    """
+        Per-product review count, rating histogram and rating total, maintained incrementally by the
+        Reviews signals (see src/product/summaries.py) so listings never aggregate reviews.
+    """
+
+    product = models.OneToOneField(
+        Products,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="review_summary",
+    )
+    count = models.PositiveIntegerField(default=0)
+    poor = models.PositiveIntegerField(default=0)
+    unsatisfactory = models.PositiveIntegerField(default=0)
+    satisfactory = models.PositiveIntegerField(default=0)
+    very_satisfactory = models.PositiveIntegerField(default=0)
+    outstanding = models.PositiveIntegerField(default=0)
+    # sum of the ratings on Reviews.rating_scale
+    rating_total = models.PositiveIntegerField(default=0)
+
+    @property
+    def mean(self):
+        return round(self.rating_total / self.count, 2) if self.count else None
+
+    @property
+    def histogram(self):
+        return {value: getattr(self, histogram_field(value)) for value, _ in Reviews.rating_options}
+
+    def __str__(self):
+        return str(self.product_id)
+
+    class Meta:
+        verbose_name = "Review summary"
+        verbose_name_plural = "Review summaries"
+
+
+def histogram_field(rating):
+    return rating.replace(" ", "_")
+
+
+class ProductCooccurrence(models.Model):
+    """
+        How many baskets (orders and carts) hold both `product` and `other`, stored in both directions.
+        The diagonal (`product` == `other`) counts the baskets holding the product. Accumulated by the
+        related products job (src/product/related.py) so incremental runs only add new baskets.
+    """
+
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="+")
+    other = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.product_id} - {self.other_id}"
+
+    class Meta:
+        verbose_name = "Product co-occurrence"
+        verbose_name_plural = "Product co-occurrences"
+        unique_together = ("product", "other")
+
+
+class CountedBasket(models.Model):
+    """
+        The products of an order as last counted into `ProductCooccurrence`, so the related products
+        job can take a changed order's old basket out of the matrix before adding its new one. Keyed
+        on the order id without a foreign key: archived orders stay counted.
+    """
+
+    order_id = models.BigIntegerField(primary_key=True)
+    products = models.JSONField(default=list)
+
+    def __str__(self):
+        return str(self.order_id)
+
+    class Meta:
+        verbose_name = "Counted basket"
+        verbose_name_plural = "Counted baskets"
+
+
+class RelatedProducts(models.Model):
+    """
+        Serving table of the top-K products frequently bought together with `product`, rebuilt by the
+        related products job and read in `rank` order.
+    """
+
+    product = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="related_products")
+    related = models.ForeignKey(Products, on_delete=models.CASCADE, related_name="related_to")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField(default=0.0)
+
+    def __str__(self):
+        return f"{self.product_id} - {self.related_id}"
+
+    class Meta:
+        verbose_name = "Related product"
+        verbose_name_plural = "Related products"
+        # also the index the related endpoint reads in rank order
+        unique_together = ("product", "rank")
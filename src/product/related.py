@@ -0,0 +1,248 @@
+"""
+    "Frequently bought together" recommendations.
+
+    Baskets are the products of an order (its order lines) or of a cart (its items). The job counts,
+    for every pair of products, the baskets holding both into a sparse co-occurrence matrix kept in
+    `ProductCooccurrence` (one row per non-zero cell, the diagonal holding each product's basket
+    count), then ranks each product's row by cosine similarity, count(a, b) / sqrt(count(a) * count(b)),
+    so best sellers don't top every list, and writes the top K into the `RelatedProducts` serving
+    table. Serving a product's related products is then one read of the (product, rank) index.
+
+    Baskets are counted `chunk_size` at a time and each chunk's pairs added to the stored matrix, so
+    a run holds one chunk of pairs in memory, not the whole matrix. `refresh_related_products`
+    re-counts the orders changed since the previous run (`Orders.updated_at`, bumped whenever an
+    order's lines change): each one's basket as last counted (kept in `CountedBasket`) is taken out
+    of the matrix before its current basket is added, and the products touched are re-ranked.
+    Carts, and orders deleted since, are only picked up by a full `rebuild_related_products`.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from functools import reduce
+from itertools import combinations, islice
+from operator import or_
+
+from django.db import transaction
+from django.db.models import F, Max, Q
+from django.utils import timezone
+
+from .models import CountedBasket, ProductCooccurrence, RelatedProducts
+
+# how far the watermark stays behind now, longer than any transaction writing orders (as for the
+# sales rollups, see src/order/rollups.py)
+WATERMARK_LAG = timedelta(minutes=5)
+
+
+def iter_baskets(rows):
+    """
+        Group (basket, product id) rows, sorted by basket, into (basket, set of product ids).
+    """
+    current, basket = None, set()
+    for key, product_id in rows:
+        if key != current:
+            if basket:
+                yield current, basket
+            current, basket = key, set()
+        basket.add(product_id)
+    if basket:
+        yield current, basket
+
+
+def order_baskets(order_ids=None, chunk_size=2000):
+    """
+        The baskets of the orders `order_ids` (of every order when None).
+    """
+    from src.order.models import OrderLines
+
+    lines = OrderLines.objects.all()
+    if order_ids is not None:
+        lines = lines.filter(order_id__in=order_ids)
+    return iter_baskets(lines.order_by("order_id").values_list("order_id", "product__pk").iterator(chunk_size=chunk_size))
+
+
+def cart_baskets(chunk_size=2000):
+    from src.cart.models import CartItems
+
+    items = CartItems.objects.order_by("cart_id").values_list("cart_id", "product_id__pk")
+    return iter_baskets(items.iterator(chunk_size=chunk_size))
+
+
+def chunked(items, size):
+    items = iter(items)
+    while chunk := list(islice(items, size)):
+        yield chunk
+
+
+def count_pairs(baskets, max_basket_size=50, counts=None, sign=1):
+    """
+        Add (or with `sign` -1, take out) every basket's pairs to the sparse matrix `counts`
+        ({product id: Counter}, both directions plus the diagonal). Baskets larger than
+        `max_basket_size` are skipped: bulk purchases relate everything to everything and cost
+        O(n^2) pairs.
+    """
+    counts = defaultdict(Counter) if counts is None else counts
+    for basket in baskets:
+        if max_basket_size is not None and len(basket) > max_basket_size:
+            continue
+        for product_id in basket:
+            counts[product_id][product_id] += sign
+        for first, second in combinations(basket, 2):
+            counts[first][second] += sign
+            counts[second][first] += sign
+    return counts
+
+
+def apply_counts(deltas, batch_size):
+    """
+        Add the sparse matrix `deltas` (whose counts may be negative) to the stored one, dropping
+        the cells that fall to zero. Returns the ids of the products whose row changed.
+    """
+    product_ids = sorted(product_id for product_id, row in deltas.items() if any(row.values()))
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        stored = {
+            (product_id, other): count
+            for product_id, other, count in ProductCooccurrence.objects.filter(product_id__in=batch).values_list(
+                "product_id", "other_id", "count"
+            )
+        }
+        cells, emptied = [], defaultdict(list)
+        for product_id in batch:
+            for other, delta in deltas[product_id].items():
+                if not delta:
+                    continue
+                count = stored.get((product_id, other), 0) + delta
+                if count > 0:
+                    cells.append(ProductCooccurrence(product_id=product_id, other_id=other, count=count))
+                else:
+                    emptied[product_id].append(other)
+        ProductCooccurrence.objects.bulk_create(
+            cells,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["product", "other"],
+            update_fields=["count"],
+        )
+        if emptied:
+            ProductCooccurrence.objects.filter(
+                reduce(or_, (Q(product_id=product_id, other_id__in=others) for product_id, others in emptied.items()))
+            ).delete()
+    return product_ids
+
+
+def record_baskets(baskets, max_basket_size, batch_size):
+    """
+        Remember the (order id, basket) just counted, the skipped large ones aren't.
+    """
+    CountedBasket.objects.bulk_create(
+        [
+            CountedBasket(order_id=order_id, products=sorted(basket))
+            for order_id, basket in baskets
+            if max_basket_size is None or len(basket) <= max_basket_size
+        ],
+        batch_size=batch_size,
+    )
+
+
+def rank_related(product_id, row, diagonal, top_k):
+    """
+        The `top_k` (other id, score) of a matrix row, by cosine similarity then count.
+    """
+    own = row.get(product_id) or 1
+    scored = (
+        (other, count / math.sqrt(own * (diagonal.get(other) or count)), count)
+        for other, count in row.items()
+        if other != product_id
+    )
+    best = heapq.nlargest(top_k, scored, key=lambda item: (item[1], item[2], -item[0]))
+    return [(other, round(score, 6)) for other, score, _ in best]
+
+
+def write_related(counts, diagonal, product_ids, top_k, batch_size):
+    """
+        Replace the serving rows of `product_ids` with their top K from `counts`.
+    """
+    RelatedProducts.objects.filter(product_id__in=product_ids).delete()
+    related = [
+        RelatedProducts(product_id=product_id, related_id=other, rank=rank, score=score)
+        for product_id in product_ids
+        for rank, (other, score) in enumerate(rank_related(product_id, counts[product_id], diagonal, top_k), start=1)
+    ]
+    RelatedProducts.objects.bulk_create(related, batch_size=batch_size)
+    return len(related)
+
+
+def rank_products(product_ids, top_k, batch_size):
+    """
+        Re-rank `product_ids` from the stored matrix, `batch_size` rows at a time. Returns the
+        number of serving rows written.
+    """
+    written = 0
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        counts = defaultdict(Counter)
+        stored = ProductCooccurrence.objects.filter(product_id__in=batch).values_list("product_id", "other_id", "count")
+        for product_id, other, count in stored:
+            counts[product_id][other] = count
+        others = {other for product_id in batch for other in counts[product_id]}
+        diagonal = dict(
+            ProductCooccurrence.objects.filter(product_id__in=others, other_id=F("product_id")).values_list("product_id", "count")
+        )
+        written += write_related(counts, diagonal, batch, top_k, batch_size)
+    return written
+
+
+def rebuild_related_products(top_k=10, max_basket_size=50, batch_size=1000, chunk_size=10000, lag=WATERMARK_LAG):
+    """
+        Recount every order and cart and rewrite the whole matrix and serving table.
+        Returns (watermark, serving rows written).
+    """
+    until = timezone.now() - lag
+    with transaction.atomic():
+        ProductCooccurrence.objects.all().delete()
+        CountedBasket.objects.all().delete()
+        for baskets in chunked(order_baskets(), chunk_size):
+            apply_counts(count_pairs((basket for _, basket in baskets), max_basket_size), batch_size)
+            record_baskets(baskets, max_basket_size, batch_size)
+        for baskets in chunked(cart_baskets(), chunk_size):
+            apply_counts(count_pairs((basket for _, basket in baskets), max_basket_size), batch_size)
+
+        RelatedProducts.objects.all().delete()
+        product_ids = list(
+            ProductCooccurrence.objects.filter(other_id=F("product_id")).order_by("product_id").values_list("product_id", flat=True)
+        )
+        written = rank_products(product_ids, top_k, batch_size)
+    return until, written
+
+
+def refresh_related_products(since, top_k=10, max_basket_size=50, batch_size=1000, chunk_size=10000, lag=WATERMARK_LAG):
+    """
+        Re-count the orders changed after the watermark `since`: take each one's basket as last
+        counted out of the matrix, add its current basket and re-rank the products whose rows
+        changed. Returns (new watermark, serving rows written).
+
+        `updated_at` is stamped when a statement runs, not when its transaction commits, so the new
+        watermark stays `lag` behind now and the orders changed within it are re-counted by the next
+        run, which leaves the matrix as it was when they didn't change again.
+    """
+    from src.order.models import Orders
+
+    last = Orders.objects.aggregate(last=Max("updated_at"))["last"]
+    if last is None or last <= since:
+        return since, 0
+    changed = Orders.objects.filter(updated_at__gt=since).order_by("id").values_list("id", flat=True)
+
+    touched = set()
+    with transaction.atomic():
+        for order_ids in chunked(changed.iterator(chunk_size=chunk_size), chunk_size):
+            counted = CountedBasket.objects.filter(order_id__in=order_ids)
+            # the counted baskets were within the size limit then, take them out whatever it is now
+            deltas = count_pairs((set(products) for products in counted.values_list("products", flat=True)), None, sign=-1)
+            baskets = list(order_baskets(order_ids))
+            count_pairs((basket for _, basket in baskets), max_basket_size, deltas)
+            touched.update(apply_counts(deltas, batch_size))
+            counted.delete()
+            record_baskets(baskets, max_basket_size, batch_size)
+        written = rank_products(sorted(touched), top_k, batch_size)
+    return max(min(last, timezone.now() - lag), since), written
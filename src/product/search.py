@@ -0,0 +1,226 @@
+"""
+    Full-text search over the product catalog.
+
+    PostgreSQL keeps a weighted tsvector in `Products.search_vector`, maintained by a trigger and
+    served from a GIN index. SQLite keeps an FTS5 inverted index in a shadow table maintained by
+    triggers. Any other backend falls back to a LIKE scan. The triggers also pick up the category
+    name, so renaming a category re-indexes its products.
+
+    SQLite migrations rebuild tables by copy-and-rename, which trips over triggers that reference
+    them, so on SQLite the triggers are dropped before `migrate` and re-installed (with a full
+    re-index) after it.
+"""
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, connections
+from django.db.models import Case, F, FloatField, Q, Value, When
+
+SEARCH_CONFIG = "english"
+FTS_TABLE = "product_products_fts"
+
+POSTGRES_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION product_products_search_update() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.title, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.tags, '')), 'B') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(
+                (SELECT name FROM product_categories WHERE id = NEW.category_id), '')), 'B') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.summary, '')), 'C') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.description, '')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS product_products_search_trigger ON product_products",
+    """
+    CREATE TRIGGER product_products_search_trigger
+    BEFORE INSERT OR UPDATE OF title, tags, summary, description, category_id ON product_products
+    FOR EACH ROW EXECUTE FUNCTION product_products_search_update()
+    """,
+    """
+    CREATE OR REPLACE FUNCTION product_categories_search_update() RETURNS trigger AS $$
+    BEGIN
+        UPDATE product_products SET category_id = category_id WHERE category_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    "DROP TRIGGER IF EXISTS product_categories_search_trigger ON product_categories",
+    """
+    CREATE TRIGGER product_categories_search_trigger
+    AFTER UPDATE OF name ON product_categories
+    FOR EACH ROW WHEN (OLD.name IS DISTINCT FROM NEW.name)
+    EXECUTE FUNCTION product_categories_search_update()
+    """,
+    "CREATE INDEX IF NOT EXISTS product_products_search_idx ON product_products USING GIN (search_vector)",
+]
+
+POSTGRES_DROP_SQL = [
+    "DROP INDEX IF EXISTS product_products_search_idx",
+    "DROP TRIGGER IF EXISTS product_categories_search_trigger ON product_categories",
+    "DROP FUNCTION IF EXISTS product_categories_search_update()",
+    "DROP TRIGGER IF EXISTS product_products_search_trigger ON product_products",
+    "DROP FUNCTION IF EXISTS product_products_search_update()",
+]
+
+SQLITE_INSERT_ROW = f"""
+    INSERT INTO {FTS_TABLE} (rowid, title, tags, category, summary, description)
+    VALUES (new.id, new.title, new.tags,
+            (SELECT name FROM product_categories WHERE id = new.category_id),
+            new.summary, new.description);
+"""
+
+SQLITE_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(title, tags, category, summary, description, tokenize = 'porter unicode61')
+    """,
+]
+
+SQLITE_TRIGGER_SQL = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_products_fts_insert AFTER INSERT ON product_products BEGIN
+        {SQLITE_INSERT_ROW}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_products_fts_update AFTER UPDATE ON product_products BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        {SQLITE_INSERT_ROW}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_products_fts_delete AFTER DELETE ON product_products BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_categories_fts_update AFTER UPDATE OF name ON product_categories BEGIN
+        UPDATE {FTS_TABLE} SET category = new.name
+        WHERE rowid IN (SELECT id FROM product_products WHERE category_id = new.id);
+    END
+    """,
+]
+
+SQLITE_DROP_TRIGGER_SQL = [
+    "DROP TRIGGER IF EXISTS product_categories_fts_update",
+    "DROP TRIGGER IF EXISTS product_products_fts_delete",
+    "DROP TRIGGER IF EXISTS product_products_fts_update",
+    "DROP TRIGGER IF EXISTS product_products_fts_insert",
+]
+
+SQLITE_DROP_SQL = SQLITE_DROP_TRIGGER_SQL + [f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+
+def execute_all(connection, statements):
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def install_search_index(connection):
+    """
+        Create the search index (and on PostgreSQL the triggers that maintain it). Idempotent.
+    """
+    execute_all(connection, {"postgresql": POSTGRES_SQL, "sqlite": SQLITE_SQL}.get(connection.vendor, []))
+
+
+def drop_search_index(connection):
+    execute_all(connection, {"postgresql": POSTGRES_DROP_SQL, "sqlite": SQLITE_DROP_SQL}.get(connection.vendor, []))
+
+
+def rebuild_search_index(connection):
+    """
+        Re-index every product from scratch.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute("UPDATE product_products SET title = title")
+        elif connection.vendor == "sqlite":
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"""
+                INSERT INTO {FTS_TABLE} (rowid, title, tags, category, summary, description)
+                SELECT p.id, p.title, p.tags, c.name, p.summary, p.description
+                FROM product_products p LEFT JOIN product_categories c ON c.id = p.category_id
+                """
+            )
+
+
+def drop_search_triggers_before_migrate(sender, using="default", **kwargs):
+    """
+        pre_migrate receiver, see the module docstring.
+    """
+    conn = connections[using]
+    if conn.vendor == "sqlite":
+        execute_all(conn, SQLITE_DROP_TRIGGER_SQL)
+
+
+def install_search_triggers_after_migrate(sender, using="default", **kwargs):
+    """
+        post_migrate receiver, see the module docstring.
+    """
+    conn = connections[using]
+    if conn.vendor != "sqlite":
+        return
+    with conn.cursor() as cursor:
+        if FTS_TABLE not in conn.introspection.table_names(cursor):
+            return
+    execute_all(conn, SQLITE_TRIGGER_SQL)
+    rebuild_search_index(conn)
+
+
+def search_terms(query):
+    return re.findall(r"\w+", query.lower())
+
+
+def search_products(query, limit=20):
+    """
+        Return the best `limit` products matching `query`, most relevant first, annotated with `rank`.
+    """
+    from .models import Products
+
+    terms = search_terms(query)
+    if not terms:
+        return Products.objects.none()
+
+    if connection.vendor == "postgresql":
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
+        return (
+            Products.objects.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "title")[:limit]
+        )
+
+    if connection.vendor == "sqlite":
+        # every term is quoted so user input can't inject FTS syntax; the last one matches as a prefix
+        match = " ".join('"%s"' % term.replace('"', '""') for term in terms) + "*"
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT rowid, bm25({FTS_TABLE}, 10.0, 4.0, 4.0, 2.0, 1.0) AS score
+                FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+                ORDER BY score LIMIT %s
+                """,
+                [match, limit],
+            )
+            ranked = cursor.fetchall()
+        if not ranked:
+            return Products.objects.none()
+        # bm25() is lower-is-better, flip it so `rank` reads the same as on PostgreSQL
+        rank = Case(*[When(pk=pk, then=Value(-score)) for pk, score in ranked], output_field=FloatField())
+        return Products.objects.filter(pk__in=[pk for pk, _ in ranked]).annotate(rank=rank).order_by("-rank", "title")
+
+    condition = Q()
+    for term in terms:
+        condition &= (
+            Q(title__icontains=term)
+            | Q(tags__icontains=term)
+            | Q(category__name__icontains=term)
+            | Q(summary__icontains=term)
+            | Q(description__icontains=term)
+        )
+    return Products.objects.filter(condition).annotate(rank=Value(0.0)).order_by("title")[:limit]
@@ -0,0 +1,48 @@
+from django.db.models import F
+from django.db.models.functions import Substr
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Categories, Reviews
+from .summaries import apply_review, get_product_id
+
+
+@receiver(post_delete, sender=Categories)
+def detach_subcategories(sender, instance, **kwargs):
+    """
+        Subcategories of a deleted category become top-level (parent_category is SET_NULL), so cut
+        the deleted category's prefix off the paths of its whole subtree (and move their
+        updated_at, which keys their validators).
+    """
+    if instance.path:
+        Categories.objects.filter(path__startswith=instance.path).update(
+            path=Substr("path", len(instance.path) + 1),
+            depth=F("depth") - (instance.depth + 1),
+            updated_at=timezone.now(),
+        )
+
+
+@receiver(pre_save, sender=Reviews)
+def remember_review_rating(sender, instance, raw=False, **kwargs):
+    # what the row held before this save, so post_save can move it between histogram buckets
+    instance._previous_review = None
+    if instance.pk is not None and not raw:
+        instance._previous_review = Reviews.objects.filter(pk=instance.pk).values_list("product_id", "rating").first()
+
+
+@receiver(post_save, sender=Reviews)
+def count_review(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, "_previous_review", None)
+    if previous == (instance.product_id, instance.rating):
+        return
+    if previous is not None:
+        apply_review(get_product_id(previous[0]), previous[1], -1)
+    apply_review(get_product_id(instance.product_id), instance.rating, 1)
+
+
+@receiver(post_delete, sender=Reviews)
+def uncount_review(sender, instance, **kwargs):
+    apply_review(get_product_id(instance.product_id), instance.rating, -1)
@@ -0,0 +1,89 @@
+"""
+    Incremental maintenance of `ReviewSummary`.
+
+    Every review create, update and delete applies a +1/-1 delta to its product's summary with a
+    single UPDATE of F() expressions, so concurrent reviews never lose counts and nothing is ever
+    re-aggregated on the write path. `rebuild_review_summaries` recomputes them from scratch with
+    grouped queries, to repair drift (e.g. after raw SQL or bulk writes that skip the signals).
+"""
+from django.db import transaction
+from django.db.models import Case, Count, Exists, F, IntegerField, OuterRef, Q, Sum, Value, When
+
+from .models import Products, ReviewSummary, Reviews, histogram_field
+
+
+def normalize_rating(rating):
+    rating = (rating or "").strip().lower()
+    return rating if rating in Reviews.rating_scale else None
+
+
+def get_product_id(title):
+    # Reviews point at products by title
+    return Products.objects.filter(title=title).values_list("pk", flat=True).first()
+
+
+def apply_review(product_id, rating, delta):
+    """
+        Count (delta=1) or uncount (delta=-1) one review of `rating` in the summary of `product_id`.
+    """
+    rating = normalize_rating(rating)
+    if product_id is None or rating is None:
+        return
+    if delta > 0:
+        ReviewSummary.objects.get_or_create(product_id=product_id)
+    # decrements never create a summary: the product may be mid-deletion
+    ReviewSummary.objects.filter(product_id=product_id).update(
+        count=F("count") + delta,
+        rating_total=F("rating_total") + delta * Reviews.rating_scale[rating],
+        **{histogram_field(rating): F(histogram_field(rating)) + delta},
+    )
+
+
+def rebuild_review_summaries(product_ids=None, batch_size=1000):
+    """
+        Recompute the summaries of `product_ids` (every product when None) from the reviews, one
+        grouped query per batch of products, and drop those of products left without reviews.
+        Returns the number of summaries written.
+    """
+    reviews = Reviews.objects.all()
+    summaries = ReviewSummary.objects.all()
+    if product_ids is not None:
+        reviews = reviews.filter(product__pk__in=product_ids)
+        summaries = summaries.filter(product_id__in=product_ids)
+
+    counts = {
+        histogram_field(value): Count("pk", filter=Q(rating__iexact=value)) for value, _ in Reviews.rating_options
+    }
+    score = Case(
+        *[When(rating__iexact=value, then=Value(points)) for value, points in Reviews.rating_scale.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+    rows = reviews.values("product__pk").annotate(rating_total=Sum(score), **counts).order_by("product__pk")
+    fields = ["count", "rating_total", *counts]
+
+    written = 0
+    last_pk = 0
+    with transaction.atomic():
+        while True:
+            batch = list(rows.filter(product__pk__gt=last_pk)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1]["product__pk"]
+            ReviewSummary.objects.bulk_create(
+                [
+                    ReviewSummary(
+                        product_id=row["product__pk"],
+                        count=sum(row[name] for name in counts),
+                        rating_total=row["rating_total"] or 0,
+                        **{name: row[name] for name in counts},
+                    )
+                    for row in batch
+                ],
+                update_conflicts=True,
+                unique_fields=["product"],
+                update_fields=fields,
+            )
+            written += len(batch)
+        summaries.filter(~Exists(Reviews.objects.filter(product=OuterRef("product__title")))).delete()
+    return written
@@ -0,0 +1,168 @@
+"""
+    Normalized tags for products and categories.
+
+    The free-text `tags` column stays what clients read and write; every save that changes it
+    parses it into `Tags` rows linked through the `tag_set` many-to-many, whose join table is
+    indexed on both sides. "Tagged X" and "tagged X and Y" are then index lookups instead of LIKE scans over the
+    whole catalog. Set-based writes that bypass save() (the importer, `retag`) sync the links in
+    bulk with `sync_tags`.
+"""
+import re
+
+from django.db import transaction
+from django.utils import timezone
+
+TAG_MAX_LENGTH = 50
+TAG_SEPARATORS = re.compile(r"[\s,;]+")
+
+
+def normalize_tag(value):
+    return value.strip().lstrip("#").lower()[:TAG_MAX_LENGTH]
+
+
+def parse_tags(text):
+    """
+        Split a free-text tags value into unique normalized names, in order of appearance.
+    """
+    names = []
+    for value in TAG_SEPARATORS.split(text or ""):
+        name = normalize_tag(value)
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def format_tags(names):
+    return " ".join(names)
+
+
+def get_tag_ids(names):
+    """
+        Return {name: id} for `names`, creating the missing tags.
+    """
+    from .models import Tags
+
+    names = set(names)
+    if not names:
+        return {}
+    ids = dict(Tags.objects.filter(name__in=names).values_list("name", "id"))
+    missing = names - set(ids)
+    if missing:
+        Tags.objects.bulk_create([Tags(name=name) for name in missing], ignore_conflicts=True)
+        ids.update(Tags.objects.filter(name__in=missing).values_list("name", "id"))
+    return ids
+
+
+def sync_tags(model, tags_by_pk):
+    """
+        Point the `tag_set` of every row in {pk: tags text} at the tags parsed from its text,
+        adding and removing only the links that changed.
+    """
+    if not tags_by_pk:
+        return
+    field = model._meta.get_field("tag_set")
+    through = field.remote_field.through
+    source, target = f"{field.m2m_field_name()}_id", f"{field.m2m_reverse_field_name()}_id"
+
+    parsed = {pk: parse_tags(text) for pk, text in tags_by_pk.items()}
+    tag_ids = get_tag_ids({name for names in parsed.values() for name in names})
+    wanted = {(pk, tag_ids[name]) for pk, names in parsed.items() for name in names}
+
+    with transaction.atomic():
+        links = through.objects.filter(**{f"{source}__in": list(parsed)}).values_list("id", source, target)
+        current = set()
+        stale = []
+        for link, pk, tag in links:
+            current.add((pk, tag))
+            if (pk, tag) not in wanted:
+                stale.append(link)
+        if stale:
+            through.objects.filter(id__in=stale).delete()
+        through.objects.bulk_create(
+            [through(**{source: pk, target: tag}) for pk, tag in wanted - current], ignore_conflicts=True
+        )
+
+
+class TaggedModel:
+    """
+        Model mixin remembering the `tags` a row was loaded with, so save() only syncs the links
+        when the text changed.
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if "tags" in field_names:
+            instance._loaded_tags = instance.tags
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        if fields is None or "tags" in fields:
+            self._loaded_tags = self.tags
+
+    def sync_tags_if_changed(self, update_fields=None):
+        if update_fields is not None and "tags" not in update_fields:
+            return
+        # unsaved instances, and rows loaded without the column, have nothing to compare with
+        if getattr(self, "_loaded_tags", None) == self.tags:
+            return
+        sync_tags(type(self), {self.pk: self.tags})
+        self._loaded_tags = self.tags
+
+
+def filter_tagged(queryset, names):
+    """
+        Rows tagged with every one of `names` (one indexed join per tag).
+    """
+    for name in names:
+        queryset = queryset.filter(tag_set__name=normalize_tag(name))
+    return queryset
+
+
+def retag(queryset, add=(), remove=(), batch_size=1000):
+    """
+        Add and/or remove tags on every row of `queryset`, rewriting both the tags text and the
+        tag links, in batches walked by primary key. Returns the number of rows changed.
+
+        Raises ValueError when a row's tags would outgrow the column; batches written before it
+        stay written.
+    """
+    model = queryset.model
+    add, remove = parse_tags(" ".join(add)), set(parse_tags(" ".join(remove)))
+    max_length = model._meta.get_field("tags").max_length
+    has_updated_at = any(field.name == "updated_at" for field in model._meta.concrete_fields)
+
+    changed = 0
+    last_pk = None
+    while True:
+        rows = queryset.order_by("pk")
+        if last_pk is not None:
+            rows = rows.filter(pk__gt=last_pk)
+        rows = list(rows.values_list("pk", "tags")[:batch_size])
+        if not rows:
+            return changed
+        last_pk = rows[-1][0]
+
+        updates = {}
+        for pk, text in rows:
+            names = parse_tags(text)
+            retagged = [name for name in names if name not in remove] + [name for name in add if name not in names]
+            if retagged != names:
+                updates[pk] = format_tags(retagged)
+                if max_length is not None and len(updates[pk]) > max_length:
+                    raise ValueError(f"Tags of {model._meta.verbose_name} {pk} would be longer than {max_length} characters")
+        if not updates:
+            continue
+
+        now = timezone.now()
+        instances = []
+        for pk, text in updates.items():
+            instance = model(pk=pk, tags=text)
+            if has_updated_at:
+                instance.updated_at = now
+            instances.append(instance)
+        with transaction.atomic():
+            model.objects.bulk_update(instances, ["tags", "updated_at"] if has_updated_at else ["tags"])
+            sync_tags(model, updates)
+        changed += len(updates)
@@ -80,6 +80,8 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         max_length=100,
         blank=True,
     )
+    # resized renditions of `avatar`, filled in off the request path by api/images.py
+    avatar_derivatives = models.JSONField(default=dict, blank=True, editable=False)
     locale = models.CharField(_("locale setting"), choices=locale_options)
     date_joined = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now_add=True, blank=True)
@@ -110,3 +112,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         verbose_name = "User"
         verbose_name_plural = "Users"
         ordering = ("-date_joined",)
+        indexes = [
+            # keyset pagination scans on (-date_joined, -id)
+            models.Index(fields=["-date_joined", "-id"], name="user_joined_id_idx"),
+        ]
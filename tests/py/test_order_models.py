@@ -4,13 +4,18 @@ from rest_framework.test import APIClient, APITestCase
 from django.urls import reverse
 from src.order.models import Orders, OrderLines
 from src.user.models import CustomUser
-from src.product.models import Products, Categories
+from src.product.models import Products, Categories, ProductCooccurrence, RelatedProducts
 from urllib.parse import urlencode
 from rest_framework import status
 from api.serializers import ProductsSerializer, OrdersSerializer, CustomUserSerializer, CategoriesSerializer
 from django.contrib.auth import get_user_model
 from django.contrib.auth import get_user_model
 from api.serializers import CustomUserSerializer, OrdersSerializer, OrderLinesSerializer
+from django.core.management import call_command
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from api.models import JobState
+import io
 
 
 class TestOrderModels(APITestCase):
@@ -27,6 +32,23 @@ class TestOrderModels(APITestCase):
         )
         self.client.login(username="testuser1", password="test123")
         self.order1 = Orders.objects.create(user=self.user1)
+        self.category1, self.category2, self.category3 = [
+            Categories.objects.create(name=f"test category {n}", description="test description", tags="test1 test2")
+            for n in (1, 2, 3)
+        ]
+        self.product1, self.product2, self.product3 = [
+            Products.objects.create(
+                title=f"test product {n}",
+                description="test description",
+                price=100.0,
+                category=category,
+                summary="test summary",
+                tags="test1 test2",
+                discount_type="None",
+                discount_value=0,
+            )
+            for n, category in ((1, self.category1), (2, self.category2), (3, self.category3))
+        ]
         self.user1_data_serialized = CustomUserSerializer(self.user1).data
         # self.user1_data = CustomUserSerializer(self.user1).data
         self.order_data1 = {"user": self.user1_data_serialized}
@@ -89,6 +111,18 @@ class TestOrderModels(APITestCase):
         #     "order": self.order_line1_serialized.get("order")
         # }
         
+    def login_admin(self):
+        admin = self.User.objects.create_superuser(
+            username="admin1",
+            password="admin123",
+            first_name="Ada",
+            last_name="Admin",
+            email="admin@wo.me",
+            phone="+542070809527",
+        )
+        self.client.login(username=admin.username, password="admin123")
+        return admin
+
     # def test_order_creation(self):
     #     order_url = reverse("ecommerce_api:order-list")
     #     response = self.client.post(order_url, self.order_data1, format="json")
@@ -143,4 +177,223 @@ class TestOrderModels(APITestCase):
     #     order_line_url = reverse("ecommerce_api:order-lines")
     #     response = self.client.delete(order_line_url, self.order_line_to_delete)
     #     self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
-        
\ No newline at end of file
+        
+
+    def test_related_products(self):
+        def place_order(username, phone, *products):
+            user = self.User.objects.create_user(
+                username=username,
+                password="test123",
+                first_name="Test",
+                last_name="Buyer",
+                email=f"{username}@wo.me",
+                phone=phone,
+            )
+            order = Orders.objects.create(user=user)
+            for product in products:
+                OrderLines.objects.create(order=order, product=product, quantity=1)
+            return order
+
+        def related(product):
+            url = reverse("ecommerce_api:product-related", kwargs={"pk": product.id})
+            return [item["id"] for item in self.client.get(url).data["results"]]
+
+        order1 = place_order("buyer1", "+542070809001", self.product1, self.product2)
+        order2 = place_order("buyer2", "+542070809002", self.product1, self.product2, self.product3)
+        call_command("build_related_products", stdout=io.StringIO())
+        self.assertEqual(related(self.product1), [self.product2.id, self.product3.id])
+        self.assertEqual(related(self.product3), [self.product1.id, self.product2.id])
+
+        # only the new order is counted, and the products it holds re-ranked
+        place_order("buyer3", "+542070809003", self.product3, self.product2)
+        call_command("build_related_products", stdout=io.StringIO())
+        self.assertEqual(related(self.product3), [self.product2.id, self.product1.id])
+
+        # lines added to or removed from counted orders are re-counted, to what a full rebuild counts
+        def matrix():
+            return (
+                sorted(ProductCooccurrence.objects.values_list("product_id", "other_id", "count")),
+                sorted(RelatedProducts.objects.values_list("product_id", "related_id", "rank")),
+            )
+
+        OrderLines.objects.create(order=order1, product=self.product3, quantity=1)
+        OrderLines.objects.filter(order=order2, product=self.product1).delete()
+        call_command("build_related_products", stdout=io.StringIO())
+        self.assertIn((self.product1.id, self.product1.id, 1), matrix()[0])
+        self.assertIn((self.product3.id, self.product2.id, 3), matrix()[0])
+        incremental = matrix()
+        call_command("build_related_products", stdout=io.StringIO())
+        self.assertEqual(matrix(), incremental)
+        call_command("build_related_products", "--full", "--chunk-size", "1", stdout=io.StringIO())
+        self.assertEqual(matrix(), incremental)
+        call_command("build_related_products", "--full", "--top-k", "1", stdout=io.StringIO())
+        self.assertEqual(related(self.product3), [self.product2.id])
+
+        # the cached page embeds the related products: saving one of them evicts it
+        url = reverse("ecommerce_api:product-related", kwargs={"pk": self.product3.id})
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.product2.price = 120
+        self.product2.save()
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["results"][0]["price"], 120.0)
+
+        url = reverse("ecommerce_api:product-related", kwargs={"pk": 999999})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_order_history(self):
+        for products in ([self.product1], [self.product1, self.product2], [self.product3]):
+            order = Orders.objects.create(user=self.user1)
+            OrderLines.objects.bulk_create([OrderLines(order=order, product=product, quantity=1) for product in products])
+        history_url = reverse("ecommerce_api:order-history")
+
+        with self.assertNumQueries(4):  # session, user, a page of orders, their lines
+            response = self.client.get(history_url, {"page_size": 2})
+        self.assertEqual([len(order["lines"]) for order in response.data["results"]], [1, 2])
+        response = self.client.get(response.data["next"])
+        self.assertEqual([line["product"] for line in response.data["results"][0]["lines"]], [self.product1.title])
+
+        self.client.post(reverse("ecommerce_api:order-lines"), {"product": self.product2.title, "quantity": 2}, format="json")
+        self.assertEqual(OrderLines.objects.get(order=Orders.objects.latest("id"), product=self.product2).quantity, 2)
+        response = self.client.post(reverse("ecommerce_api:order-lines"), {"order": "abc", "product": self.product2.title, "quantity": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_order_totals(self):
+        order = self.order1
+        items = [{"product": self.product1.title, "quantity": 2}, {"product": self.product2.title, "quantity": 1}]
+        self.client.post(reverse("ecommerce_api:order-lines"), items, format="json")
+        order.refresh_from_db()
+        self.assertEqual((order.total, order.item_count), (300.0, 3))
+
+        line = OrderLines.objects.get(order=order, product=self.product2)
+        line.quantity = 3
+        line.save()
+        line = OrderLines.objects.get(order=order, product=self.product1)
+        line.delete()
+        order.refresh_from_db()
+        self.assertEqual((order.total, order.item_count), (300.0, 3))
+
+        Orders.objects.create(user=self.user1)
+        with self.assertNumQueries(4):  # session, user, a page of orders, their lines
+            response = self.client.get(reverse("ecommerce_api:order-list"))
+        self.assertEqual([(item["total"], len(item["lines"])) for item in response.data["results"]], [(0.0, 0), (300.0, 1)])
+        response = self.client.get(reverse("ecommerce_api:order-detail", kwargs={"pk": order.pk}))
+        self.assertEqual(response.data["lines"][0]["quantity"], 3)
+
+        # deleting an order deletes its lines without refreshing its total line by line
+        OrderLines.objects.create(order=order, product=self.product1, quantity=1)
+        with self.assertNumQueries(3):  # its lines, line delete, order delete: no total refresh
+            order.delete()
+
+    def test_sales_rollups(self):
+        from src.order.models import DailySales, ProductDailySales, CategoryDailySales
+
+        yesterday = timezone.now() - timezone.timedelta(days=1)
+        for products, created_at in (([self.product1, self.product2], yesterday), ([self.product1], timezone.now())):
+            order = Orders.objects.create(user=self.user1)
+            Orders.objects.filter(pk=order.pk).update(created_at=created_at)
+            OrderLines.objects.bulk_create([OrderLines(order=order, product=product, price=100.0, quantity=2) for product in products])
+        call_command("refresh_sales_rollups", "--full", stdout=io.StringIO())
+        self.assertEqual(list(DailySales.objects.order_by("day").values_list("units", "revenue", "orders")), [(4, 400.0, 1), (2, 200.0, 1)])
+        self.assertEqual(ProductDailySales.objects.get(day=timezone.localdate(), product=self.product1).units, 2)
+
+        # only the day of the changed order is recomputed
+        self.client.post(reverse("ecommerce_api:order-lines"), {"product": self.product3.title, "quantity": 1}, format="json")
+        call_command("refresh_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(DailySales.objects.get(day=timezone.localdate()).units, 3)
+        self.assertTrue(CategoryDailySales.objects.filter(day=timezone.localdate(), category=self.category3).exists())
+        # the watermark lags, an order stamped before it but committed late is read again next time
+        watermark = JobState.get("sales_rollups").watermark["updated_at"]
+        self.assertLess(parse_datetime(watermark), Orders.objects.latest("updated_at").updated_at)
+
+        url = reverse("ecommerce_api:sales-report")
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.login_admin()
+        response = self.client.get(url, {"by": "product"})
+        self.assertEqual([(row["product"], row["units"], row["orders"]) for row in response.data["results"]][0], (self.product1.pk, 4, 2))
+        response = self.client.get(url, {"from": timezone.localdate().isoformat()})
+        self.assertEqual([row["revenue"] for row in response.data["results"]], [300.0])
+        response = self.client.get(url, {"by": "day", "product": self.product1.pk})
+        self.assertEqual([row["units"] for row in response.data["results"]], [2, 2])
+        for params in ({"product": "abc"}, {"category": "x"}, {"from": "garbage"}, {"by": "product", "category": self.category1.pk}):
+            self.assertEqual(self.client.get(url, params).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_exports(self):
+        import gzip
+        import json
+        import tempfile
+
+        for products in ([self.product1, self.product2], [self.product3]):
+            order = Orders.objects.create(user=self.user1)
+            OrderLines.objects.bulk_create([OrderLines(order=order, product=product, price=100.0, quantity=1) for product in products])
+        url = reverse("ecommerce_api:export", kwargs={"name": "order-lines"})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_403_FORBIDDEN)
+        self.login_admin()
+
+        response = self.client.get(url)
+        rows = b"".join(response.streaming_content).decode().splitlines()
+        self.assertEqual(rows[0], "id,order_id,order_created_at,product_id,price,quantity")
+        self.assertEqual([row.split(",")[3] for row in rows[1:]], [self.product1.title, self.product2.title, self.product3.title])
+
+        response = self.client.get(reverse("ecommerce_api:export", kwargs={"name": "orders"}), {"as": "ndjson", "gzip": "1"})
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="orders.ndjson.gz"')
+        orders = [json.loads(line) for line in gzip.decompress(b"".join(response.streaming_content)).splitlines()]
+        self.assertEqual([order["user_username"] for order in orders], [self.user1.username] * 3)
+        tomorrow = (timezone.localdate() + timezone.timedelta(days=1)).isoformat()
+        response = self.client.get(reverse("ecommerce_api:export", kwargs={"name": "orders"}), {"from": tomorrow})
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 1)
+        response = self.client.get(reverse("ecommerce_api:export", kwargs={"name": "orders"}), {"to": "garbage"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        with tempfile.NamedTemporaryFile(suffix=".csv.gz") as output:
+            call_command("export_data", "products", "--gzip", "--output", output.name, stdout=io.StringIO())
+            self.assertEqual(len(gzip.decompress(output.read()).splitlines()), 4)
+
+    def test_archive_orders(self):
+        from src.order.models import ArchivedOrders, ArchivedOrderLines, DailySales
+        from src.order.totals import refresh_order_totals
+
+        old = timezone.now() - timezone.timedelta(days=400)
+        for products in ([self.product1, self.product2], [self.product3], [self.product1]):
+            order = Orders.objects.create(user=self.user1)
+            OrderLines.objects.bulk_create([OrderLines(order=order, product=product, price=100.0, quantity=1) for product in products])
+        refresh_order_totals()
+        first_two = Orders.objects.exclude(pk=self.order1.pk).order_by("id").values_list("id", flat=True)[:2]
+        Orders.objects.filter(pk__in=list(first_two)).update(created_at=old)
+        call_command("refresh_sales_rollups", "--full", stdout=io.StringIO())
+
+        call_command("archive_orders", "--batch-size", "1", stdout=io.StringIO())
+        self.assertEqual((Orders.objects.count(), OrderLines.objects.count()), (2, 1))
+        self.assertEqual(list(ArchivedOrders.objects.order_by("id").values_list("total", "item_count")), [(200.0, 2), (100.0, 1)])
+        self.assertEqual(ArchivedOrderLines.objects.filter(order__user=self.user1).count(), 3)
+        # the history goes on into the archive, a page at a time, and back
+        history_url = reverse("ecommerce_api:order-history")
+        response = self.client.get(history_url, {"page_size": 3})
+        self.assertEqual([order["total"] for order in response.data["results"]], [100.0, 0.0, 100.0])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(([order["item_count"] for order in response.data["results"]], response.data["next"]), ([2], None))
+        response = self.client.get(response.data["previous"])
+        self.assertEqual(len(response.data["results"]), 3)
+        archived = ArchivedOrders.objects.order_by("id").first()
+        response = self.client.get(reverse("ecommerce_api:order-detail", kwargs={"pk": archived.pk}))
+        self.assertEqual(sorted(line["product"] for line in response.data["lines"]), [self.product1.title, self.product2.title])
+
+        # the archived days keep their sales
+        call_command("refresh_sales_rollups", "--full", stdout=io.StringIO())
+        self.assertEqual(DailySales.objects.get(day=timezone.localtime(old).date()).orders, 2)
+        # nor are they recomputed from the orders an interrupted archive run left on them
+        left = Orders.objects.create(user=self.user1)
+        OrderLines.objects.create(order=left, product=self.product2, price=100.0, quantity=1)
+        Orders.objects.filter(pk=left.pk).update(created_at=old)
+        call_command("refresh_sales_rollups", stdout=io.StringIO())
+        self.assertEqual(DailySales.objects.get(day=timezone.localtime(old).date()).orders, 2)
+
+        # the exports of archived days read the archive, then the orders left
+        self.login_admin()
+        day = timezone.localtime(old).date().isoformat()
+        response = self.client.get(reverse("ecommerce_api:export", kwargs={"name": "order-lines"}), {"from": day, "to": day})
+        rows = b"".join(response.streaming_content).decode().splitlines()[1:]
+        titles = [self.product1.title, self.product2.title, self.product3.title, self.product2.title]
+        self.assertEqual([row.split(",")[3] for row in rows], titles)
+        response = self.client.get(reverse("ecommerce_api:export", kwargs={"name": "orders"}), {"from": day, "to": day})
+        self.assertEqual(len(b"".join(response.streaming_content).splitlines()), 4)
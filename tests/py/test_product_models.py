@@ -4,12 +4,21 @@ from rest_framework.test import APIClient, APITestCase
 from django.urls import reverse
 from rest_framework import status
 from src.user.models import CustomUser
-from src.product.models import Products, Categories, Reviews
+from src.product.models import Products, Categories, Reviews, ReviewSummary
 from django.utils import timezone
+from django.core.files.uploadedfile import SimpleUploadedFile
 import json
 import ast
 from urllib.parse import urlencode
 from api.serializers import CategoriesSerializer, CustomUserSerializer, ProductsSerializer
+from api.cache import bump_version
+from api.compiled import compile_serializer
+from api.images import generate_derivatives
+from django.test import RequestFactory, override_settings
+from PIL import Image
+import io
+import tempfile
+from django.core.management import call_command
 
 
 class TestProduct(APITestCase):
@@ -113,6 +122,18 @@ class TestProduct(APITestCase):
             "comments": "test commets"
         }
     
+    def login_admin(self):
+        admin = CustomUser.objects.create_superuser(
+            username="admin1",
+            password="admin123",
+            first_name="Ada",
+            last_name="Admin",
+            email="admin@wo.me",
+            phone="+542070809527",
+        )
+        self.client.login(username=admin.username, password="admin123")
+        return admin
+    
     # def test_product_creation(self):        
     #     response = self.client.post(self.product_url, self.product_data1, format="json")
     #     self.assertEqual(response.status_code, status.HTTP_201_CREATED)
@@ -188,4 +209,403 @@ class TestProduct(APITestCase):
         response = self.client.get(review_url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
-    
\ No newline at end of file
+    
+    def test_products_are_cursor_paginated(self):
+        response = self.client.get(self.product_url + "?" + urlencode({"page_size": 2}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p["title"] for p in response.data["results"]], ["test product 1", "test product 2"])
+        self.assertIsNone(response.data["previous"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([p["title"] for p in response.data["results"]], ["test product 3"])
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(response.data["previous"])
+        self.assertEqual([p["title"] for p in response.data["results"]], ["test product 1", "test product 2"])
+        
+        
+    def test_invalid_cursor(self):
+        response = self.client.get(self.product_url + "?" + urlencode({"cursor": "not-a-cursor"}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        
+        
+    def test_product_search(self):
+        self.product2.summary = "handmade leather wallet"
+        self.product2.save()
+        self.category3.name = "kitchenware"
+        self.category3.save()
+
+        search_url = reverse("ecommerce_api:product-search")
+        response = self.client.get(search_url + "?" + urlencode({"q": "leather"}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p["title"] for p in response.data["results"]], ["test product 2"])
+
+        response = self.client.get(search_url + "?" + urlencode({"q": "kitchen"}))
+        self.assertEqual([p["title"] for p in response.data["results"]], ["test product 3"])
+
+        response = self.client.get(search_url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        
+        
+    def test_category_tree(self):
+        self.category2.parent_category = self.category1
+        self.category2.save()
+        self.category3.parent_category = self.category2
+        self.category3.save()
+        self.category3.refresh_from_db()
+        self.assertEqual(self.category3.depth, 2)
+        self.assertEqual(list(self.category3.get_ancestors()), [self.category1, self.category2])
+
+        category_list_url = reverse("ecommerce_api:category-list")
+        response = self.client.get(category_list_url + "?" + urlencode({"subtree": self.category1.name}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+
+        response = self.client.get(category_list_url + "?" + urlencode({"tree": "true", "name": self.category1.name}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0]["subcategories"][0]["subcategories"][0]["name"], self.category3.name)
+
+        # moving a category re-roots its whole subtree, and a subcategory's old ETag no longer matches
+        category3_url = reverse("ecommerce_api:category-detail", kwargs={"pk": self.category3.pk})
+        etag = self.client.get(category3_url)["ETag"]
+        self.category2.parent_category = None
+        self.category2.save()
+        self.category3.refresh_from_db()
+        self.assertEqual(self.category3.depth, 1)
+        self.assertEqual(list(self.category3.get_ancestors()), [self.category2])
+        self.assertEqual(self.client.get(category3_url, HTTP_IF_NONE_MATCH=etag).status_code, status.HTTP_200_OK)
+
+        # deleting a category turns its subcategories into top-level categories
+        etag = self.client.get(category3_url)["ETag"]
+        self.category2.delete()
+        self.category3.refresh_from_db()
+        self.assertEqual((self.category3.parent_category, self.category3.depth), (None, 0))
+        response = self.client.get(category3_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.data["parent_category"]), (status.HTTP_200_OK, None))
+        with self.assertRaises(ValueError):
+            self.category3.parent_category = self.category3
+            self.category3.save()
+        
+        
+    def test_effective_price(self):
+        self.product1.discount_type = "percent"
+        self.product1.discount_value = 25
+        self.product1.save()
+        self.assertEqual(self.product1.effective_price, 75.0)
+        self.product2.discount_type = "amount"
+        self.product2.discount_value = 40
+        self.product2.save()
+
+        response = self.client.get(self.product_url + "?" + urlencode({"ordering": "price", "max_price": 80}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([p["title"] for p in response.data["results"]], ["test product 2", "test product 1"])
+        self.assertEqual(response.data["results"][0]["effective_price"], 60.0)
+        
+        
+    def test_bulk_reprice(self):
+        self.category2.parent_category = self.category1
+        self.category2.save()
+        self.login_admin()
+        reprice_url = reverse("ecommerce_api:product-reprice")
+        response = self.client.post(
+            reprice_url,
+            {"category": self.category1.id, "discount_type": "percent", "discount_value": 10},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated"], 2)
+        self.assertEqual(
+            list(Products.objects.values_list("title", "effective_price")),
+            [("test product 1", 90.0), ("test product 2", 90.0), ("test product 3", 100.0)],
+        )
+        
+        
+    def test_catalog_response_cache(self):
+        detail_url = reverse("ecommerce_api:products", kwargs={"pk": self.product1.id})
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "HIT")
+        self.assertEqual(response.data["title"], "test product 1")
+
+        # an unrelated product doesn't evict the detail, but does evict the list
+        list_response = self.client.get(self.product_url)
+        self.product2.price = 50
+        self.product2.save()
+        self.assertEqual(self.client.get(detail_url)["X-Cache"], "HIT")
+        list_response = self.client.get(self.product_url)
+        self.assertEqual(list_response["X-Cache"], "MISS")
+        self.assertEqual(list_response.data["results"][1]["price"], 50)
+
+        self.product1.summary = "new summary"
+        self.product1.save()
+        response = self.client.get(detail_url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["summary"], "new summary")
+
+        # set-based updates bypass the signals and bump the bulk version instead
+        Products.objects.filter(pk=self.product1.pk).reprice("percent", 50)
+        bump_version(Products)
+        self.assertEqual(self.client.get(detail_url).data["effective_price"], 50.0)
+        
+        
+    def test_conditional_get(self):
+        response = self.client.get(self.product_url)
+        etag = response["ETag"]
+        response = self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+
+        self.product3.delete()
+        response = self.client.get(self.product_url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        category_detail_url = reverse("ecommerce_api:category-detail", kwargs={"pk": self.category1.id})
+        response = self.client.get(category_detail_url)
+        response = self.client.get(category_detail_url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        
+        
+    def test_bulk_import(self):
+        self.login_admin()
+        rows = (
+            "title,category,summary,description,price,discount_type,discount_value,tags\n"
+            "test product 1,test category 2,updated,updated,80,none,0,test1\n"
+            "imported product,test category 1,new,new,50,percent,10,test3\n"
+            "broken product,no such category,x,x,10,none,0,\n"
+            "priceless product,1,x,x,free,none,0,\n"
+        )
+        upload = SimpleUploadedFile("products.csv", rows.encode("utf-8"), content_type="text/csv")
+        import_url = reverse("ecommerce_api:product-import")
+        response = self.client.post(import_url, {"file": upload, "batch_size": 2}, format="multipart")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data["rows"], response.data["imported"], response.data["failed"]), (4, 2, 2))
+        self.assertEqual([error["line"] for error in response.data["errors"]], [4, 5])
+
+        self.product1.refresh_from_db()
+        self.assertEqual((self.product1.category, self.product1.price), (self.category2, 80.0))
+        self.assertEqual(Products.objects.get(title="imported product").effective_price, 45.0)
+        
+        
+    def test_picture_derivatives(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (400, 200), "red").save(buffer, format="PNG")
+        upload = SimpleUploadedFile("red.png", buffer.getvalue(), content_type="image/png")
+        derivatives = {"WIDTHS": [100, 800], "FORMATS": ["jpeg"], "ASYNC": False}
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root, IMAGE_DERIVATIVES=derivatives):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.product1.picture = upload
+                self.product1.save()
+            self.product1.refresh_from_db()
+            formats = self.product1.picture_derivatives["formats"]
+            self.assertEqual(self.product1.picture_derivatives["source"], self.product1.picture.name)
+            self.assertEqual(list(formats["jpeg"]), ["100", "800"])
+            with Image.open(self.product1.picture.storage.path(formats["jpeg"]["100"])) as thumbnail:
+                self.assertEqual(thumbnail.size, (100, 50))
+            # never upscaled
+            with Image.open(self.product1.picture.storage.path(formats["jpeg"]["800"])) as thumbnail:
+                self.assertEqual(thumbnail.size, (400, 200))
+
+            detail_url = reverse("ecommerce_api:products", kwargs={"pk": self.product1.id})
+            response = self.client.get(detail_url)
+            self.assertTrue(response.data["picture_derivatives"]["jpeg"]["100"].endswith(formats["jpeg"]["100"]))
+
+            # a new render moves updated_at, so a client holding the old ETag gets the new URLs
+            Products.objects.filter(pk=self.product1.pk).update(picture_derivatives={})
+            etag = self.client.get(detail_url)["ETag"]
+            generate_derivatives(Products._meta.label, self.product1.pk, "picture", "picture_derivatives")
+            response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIn("jpeg", response.data["picture_derivatives"])
+
+            # saving again without a new picture doesn't re-render
+            with self.captureOnCommitCallbacks(execute=False) as callbacks:
+                self.product1.save()
+            self.assertEqual([callback for callback in callbacks if callback.__module__ == "api.images"], [])
+        
+        
+    def test_sparse_fieldsets(self):
+        response = self.client.get(self.product_url, {"fields": "id,title,effective_price", "ordering": "-price", "page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([list(product) for product in response.data["results"]], [["id", "title", "effective_price"]] * 2)
+        # the cursor still works on a sparse selection
+        response = self.client.get(response.data["next"])
+        self.assertEqual(list(response.data["results"][0]), ["id", "title", "effective_price"])
+
+        detail_url = reverse("ecommerce_api:products", kwargs={"pk": self.product1.id})
+        response = self.client.get(detail_url, {"exclude": "description,summary"})
+        self.assertNotIn("description", response.data)
+        self.assertIn("title", response.data)
+
+        request = RequestFactory().get(self.product_url, {"fields": "title,category"})
+        products = ProductsSerializer.prepare_queryset(Products.objects.all(), request)
+        self.assertEqual(products.query.deferred_loading, ({"id", "title", "category"}, False))
+        
+        
+    def test_compiled_serializers_match(self):
+        Products.objects.filter(pk=self.product1.pk).update(picture="assets/products/test.png")
+        self.assertIsNotNone(compile_serializer(ProductsSerializer, RequestFactory().get(self.product_url)))
+        category_url = reverse("ecommerce_api:category-list")
+        for url, params in (
+            (self.product_url, {}),
+            (self.product_url, {"fields": "id,picture,created_at", "ordering": "-price"}),
+            (category_url, {}),
+            (reverse("ecommerce_api:review"), {}),
+        ):
+            with override_settings(API_COMPILED_SERIALIZERS=False):
+                expected = self.client.get(url, params)
+            bump_version(Products)
+            bump_version(Categories)
+            bump_version(Reviews)
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected.content)
+        
+        
+    def test_catalog_filters_and_facets(self):
+        self.category2.parent_category = self.category1
+        self.category2.save()
+        self.product2.discount_type, self.product2.discount_value = "percent", 80
+        self.product2.save()
+
+        response = self.client.get(self.product_url, {"category": "test category 1"})
+        self.assertEqual([product["title"] for product in response.data["results"]], ["test product 1", "test product 2"])
+        facets = response.data["facets"]
+        self.assertEqual(
+            [(category["name"], category["count"]) for category in facets["category"]],
+            [("test category 1", 1), ("test category 2", 1)],
+        )
+        self.assertIn({"value": "percent", "count": 1}, facets["discount_type"])
+        self.assertEqual([bucket["count"] for bucket in facets["price"] if bucket["count"]], [1, 1])
+
+        response = self.client.get(self.product_url, {"category": self.category1.id, "discount_type": "percent", "max_price": 50})
+        self.assertEqual([product["title"] for product in response.data["results"]], ["test product 2"])
+
+        response = self.client.get(self.product_url, {"category": "no such category"})
+        self.assertEqual((response.data["results"], response.data["facets"]["category"]), ([], []))
+
+        response = self.client.get(self.product_url, {"discount_type": "bogus"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        # renaming a category reaches the facets, neither the cache nor a 304 keeps the old name
+        response = self.client.get(self.product_url)
+        self.category1.name = "renamed category"
+        self.category1.save()
+        response = self.client.get(self.product_url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("renamed category", [category["name"] for category in response.data["facets"]["category"]])
+
+        # facets ride on the first page only
+        response = self.client.get(self.product_url, {"page_size": 1})
+        self.assertIn("facets", response.data)
+        self.assertNotIn("facets", self.client.get(response.data["next"]).data)
+        
+        
+    def test_tags(self):
+        self.product2.tags = "Test2, sale"
+        self.product2.save()
+        self.assertEqual(list(self.product2.tag_set.values_list("name", flat=True)), ["sale", "test2"])
+        # saves that leave the tags alone don't touch the links
+        self.product2.description = "new description"
+        with self.assertNumQueries(1):
+            self.product2.save()
+        self.assertEqual(list(self.category1.tag_set.values_list("name", flat=True)), ["test1", "test2"])
+
+        response = self.client.get(self.product_url, {"tag": "test2,SALE"})
+        self.assertEqual([product["title"] for product in response.data["results"]], ["test product 2"])
+        response = self.client.get(reverse("ecommerce_api:tags"), {"q": "te"})
+        self.assertEqual([tag["name"] for tag in response.data["results"]], ["test1", "test2", "test3", "test4", "test5"])
+
+        self.login_admin()
+        retag_url = reverse("ecommerce_api:product-retag")
+        response = self.client.post(retag_url, {"tag": "test1", "add": ["clearance"], "remove": "test2"}, format="json")
+        self.assertEqual(response.data["updated"], 2)
+        self.product1.refresh_from_db()
+        self.assertEqual(self.product1.tags, "test1 clearance")
+        self.assertEqual(
+            set(Products.objects.filter(tag_set__name="clearance").values_list("title", flat=True)),
+            {"test product 1", "test product 3"},
+        )
+        self.assertEqual(list(Products.objects.filter(tag_set__name="test2")), [self.product2])
+        self.assertEqual(self.client.post(retag_url, {"tag": "test1"}, format="json").status_code, status.HTTP_400_BAD_REQUEST)
+        
+        
+    def test_review_summary(self):
+        review2 = Reviews.objects.create(user=self.user1, product=self.product1, rating="poor")
+        summary = ReviewSummary.objects.get(product=self.product1)
+        self.assertEqual((summary.count, summary.outstanding, summary.poor, summary.mean), (2, 1, 1, 3.0))
+
+        review2.rating = "satisfactory"
+        review2.save()
+        summary.refresh_from_db()
+        self.assertEqual((summary.count, summary.poor, summary.satisfactory, summary.mean), (2, 0, 1, 4.0))
+        self.review1.delete()
+        summary.refresh_from_db()
+        self.assertEqual((summary.count, summary.mean), (1, 3.0))
+
+        response = self.client.get(self.product_url, {"expand": "review_summary", "fields": "id,title"})
+        self.assertEqual(list(response.data["results"][0]), ["id", "title", "review_summary"])
+        self.assertEqual(response.data["results"][0]["review_summary"]["histogram"]["satisfactory"], 1)
+        self.assertIsNone(response.data["results"][1]["review_summary"])
+
+        ReviewSummary.objects.filter(product=self.product1).update(count=99)
+        ReviewSummary.objects.create(product=self.product2, count=5)
+        call_command("rebuild_review_summaries", stdout=io.StringIO())
+        self.assertEqual(list(ReviewSummary.objects.values_list("product", "count", "rating_total")), [(self.product1.pk, 1, 3)])
+        
+        
+    def test_product_review_feed(self):
+        for rating in ("poor", "outstanding", "poor"):
+            Reviews.objects.create(user=self.user1, product=self.product1, rating=rating)
+        Reviews.objects.create(user=self.user1, product=self.product2, rating="poor")
+        feed_url = reverse("ecommerce_api:product-reviews", kwargs={"pk": self.product1.id})
+
+        with self.assertNumQueries(4):  # session, user, product, one page of reviews with their reviewers
+            response = self.client.get(feed_url, {"page_size": 3})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+        self.assertEqual(response.data["results"][0]["user"]["username"], "testuser10")
+        response = self.client.get(response.data["next"])
+        self.assertEqual([review["id"] for review in response.data["results"]], [self.review1.id])
+
+        response = self.client.get(feed_url, {"rating": "poor"})
+        self.assertEqual([review["rating"] for review in response.data["results"]], ["poor", "poor"])
+        self.assertEqual(self.client.get(feed_url, {"rating": "meh"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse("ecommerce_api:review"), {"product": self.product1.title})
+        self.assertEqual(len(response.data["results"]), 4)
+
+    def test_cart_item_and_order_line_upserts(self):
+        from src.cart.models import Carts, CartItems
+        from src.order.models import Orders, OrderLines
+
+        Carts.objects.create(created_by=self.user1, status="active")
+        cart_items_url = reverse("ecommerce_api:cart-items")
+        response = self.client.post(cart_items_url, {"product": self.product1.title, "quantity": "2"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["quantity"], 2)
+
+        items = [{"product": self.product1.title, "quantity": 3}, {"product": self.product2.title, "quantity": 1}]
+        with self.assertNumQueries(6):  # session, user, cart, prices, one upsert, cart touch
+            response = self.client.post(cart_items_url, items, format="json")
+        self.assertEqual([item["quantity"] for item in response.data], [5, 1])
+        self.assertEqual(CartItems.objects.get(product_id=self.product1.title).quantity, 5)
+        for quantity in ("two", 2.7, True):
+            response = self.client.post(cart_items_url, {"product": self.product1.title, "quantity": quantity}, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        for body in ({"product": [self.product1.title], "quantity": 1}, {"product": {}, "quantity": 1}, [self.product1.title], "items"):
+            response = self.client.post(cart_items_url, body, format="json")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(cart_items_url, {"product": "no such product", "quantity": 1}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        Orders.objects.create(user=self.user1)
+        Products.objects.filter(pk=self.product2.pk).reprice("percent", 50)
+        order_lines_url = reverse("ecommerce_api:order-lines")
+        self.client.post(order_lines_url, {"items": items}, format="json")
+        response = self.client.post(order_lines_url, {"product": self.product2.title, "quantity": 4}, format="json")
+        self.assertEqual(response.data["quantity"], 5)
+        self.assertEqual(OrderLines.objects.get(product=self.product1).quantity, 3)
+        # lines snapshot the discounted price, as checkout does
+        self.assertEqual(OrderLines.objects.get(product=self.product2).price, 50.0)